@@ -0,0 +1,210 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict
+
+from fastapi.responses import JSONResponse
+
+from logging_config import parse_logger_map
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first. Each class may only start a request while the
+# total number of requests in flight is below its limit, so the gap between one
+# class's limit and the next is capacity reserved for the more important paths.
+PRIORITY_CLASSES = ("critical", "high", "normal", "low")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "false").lower() == "true"
+# Defaults sized against AnyIO's 40-thread pool that runs the sync endpoints
+ADMISSION_LIMITS = {"critical": 40, "high": 32, "normal": 24, "low": 12}
+ADMISSION_LIMITS.update({k: int(v) for k, v in parse_logger_map(os.getenv("ADMISSION_LIMITS", "")).items()})
+# How many requests of each class may wait for a slot; 0 rejects immediately
+ADMISSION_QUEUE_LIMITS = {"critical": 200, "high": 50, "normal": 20, "low": 0}
+ADMISSION_QUEUE_LIMITS.update({k: int(v) for k, v in parse_logger_map(os.getenv("ADMISSION_QUEUE_LIMITS", "")).items()})
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", "2000"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+
+# Path -> priority class; unlisted paths are "normal". Override with
+# ADMISSION_ROUTE_PRIORITIES="/path/=class,...".
+ROUTE_PRIORITIES = {
+    "/event-registration-webhook/": "critical",
+    "/create-order/": "critical",
+    "/auth": "high",
+    "/auth/google": "high",
+    "/post-login-registration/": "high",
+    "/fetch-logged-in-user/": "high",
+    "/apply": "normal",
+    "/check-account/": "normal",
+    "/contact-messages/": "low",
+    "/speaker-applications/": "low",
+    "/sponsorship-inquiries/": "low",
+    "/partnership-proposals/": "low",
+    "/volunteer-applications/": "low",
+    "/waitlist-registrations/": "low",
+    "/membership-applications/": "low",
+    "/test-email": "low",
+}
+for _item in os.getenv("ADMISSION_ROUTE_PRIORITIES", "").split(","):
+    _path, _, _priority = _item.partition("=")
+    if _priority.strip() in PRIORITY_CLASSES:
+        ROUTE_PRIORITIES[_path.strip()] = _priority.strip()
+
+# Never queued or shed: admin endpoints must stay reachable during overload
+EXEMPT_PREFIXES = ("/admin/",)
+
+
+class AdmissionController:
+    """Bounded in-flight limits per priority class with short, bounded waiting queues"""
+
+    def __init__(self, limits: Dict[str, int], queue_limits: Dict[str, int], max_wait_ms: float):
+        self.limits = limits
+        self.queue_limits = queue_limits
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.in_flight_total = 0
+        self.in_flight = {name: 0 for name in PRIORITY_CLASSES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {name: deque() for name in PRIORITY_CLASSES}
+        self.counters = {name: {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0, "waits": 0, "wait_seconds": 0.0}
+                         for name in PRIORITY_CLASSES}
+
+    async def acquire(self, priority: str) -> bool:
+        """Take a slot for `priority`; False means the request should be shed"""
+        counters = self.counters[priority]
+        if self._can_start(priority) and not self._waiting_at_or_above(priority):
+            self._start(priority)
+            return True
+
+        if len(self.waiters[priority]) >= self.queue_limits[priority]:
+            counters["rejected"] += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(waiter)
+        counters["queued"] += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            counters["timed_out"] += 1
+            self._discard(priority, waiter)
+            return False
+        except asyncio.CancelledError:
+            # The client went away; hand back a slot that was granted in the meantime
+            if waiter.done() and not waiter.cancelled():
+                self.release(priority)
+            self._discard(priority, waiter)
+            raise
+        finally:
+            counters["waits"] += 1
+            counters["wait_seconds"] += time.perf_counter() - started
+        return True
+
+    def release(self, priority: str):
+        self.in_flight[priority] -= 1
+        self.in_flight_total -= 1
+        # Wake waiters highest class first, as far as their limits allow
+        for name in PRIORITY_CLASSES:
+            waiters = self.waiters[name]
+            while waiters and self._can_start(name):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self._start(name)
+                    waiter.set_result(True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Live queue-depth gauges and counters per priority class"""
+        classes = {}
+        for name in PRIORITY_CLASSES:
+            counters = self.counters[name]
+            waits = counters["waits"]
+            classes[name] = {
+                "limit": self.limits[name],
+                "in_flight": self.in_flight[name],
+                "queue_depth": sum(1 for waiter in self.waiters[name] if not waiter.done()),
+                "queue_limit": self.queue_limits[name],
+                "admitted": counters["admitted"],
+                "queued": counters["queued"],
+                "rejected": counters["rejected"],
+                "timed_out": counters["timed_out"],
+                "avg_wait_ms": round(counters["wait_seconds"] / waits * 1000, 2) if waits else None,
+            }
+        return {"in_flight": self.in_flight_total, "classes": classes}
+
+    def _can_start(self, priority: str) -> bool:
+        return self.in_flight_total < self.limits[priority]
+
+    def _waiting_at_or_above(self, priority: str) -> bool:
+        # Newcomers must not overtake requests already queued at the same or a higher priority
+        for name in PRIORITY_CLASSES:
+            if any(not waiter.done() for waiter in self.waiters[name]):
+                return True
+            if name == priority:
+                return False
+        return False
+
+    def _start(self, priority: str):
+        self.in_flight[priority] += 1
+        self.in_flight_total += 1
+        self.counters[priority]["admitted"] += 1
+
+    def _discard(self, priority: str, waiter: asyncio.Future):
+        try:
+            self.waiters[priority].remove(waiter)
+        except ValueError:
+            pass
+
+
+admission_controller = AdmissionController(ADMISSION_LIMITS, ADMISSION_QUEUE_LIMITS, ADMISSION_MAX_WAIT_MS)
+
+
+def route_priority(path: str) -> str:
+    return ROUTE_PRIORITIES.get(path, "normal")
+
+
+class AdmissionMiddleware:
+    """Shed or briefly queue requests by route priority before they reach a handler.
+
+    The slot is held until the last response body chunk is sent, so background
+    tasks (emails) that run after the response do not count against capacity.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not ADMISSION_ENABLED or scope["method"] == "OPTIONS"
+                or scope["path"].startswith(EXEMPT_PREFIXES)):
+            await self.app(scope, receive, send)
+            return
+
+        priority = route_priority(scope["path"])
+        if not await self.controller.acquire(priority):
+            logger.warning("Shedding %s %s (priority %s, %d in flight)",
+                           scope["method"], scope["path"], priority, self.controller.in_flight_total)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry shortly"},
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.controller.release(priority)
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release()
@@ -0,0 +1,259 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+from sqlalchemy import event, func, insert, select, delete
+
+logger = logging.getLogger(__name__)
+
+# Cross-worker cache invalidation through MySQL only. Writes append (entity, key) rows
+# to cache_changes in their own transaction; every worker tails the table from a cursor
+# and drops the matching entries from its in-process caches.
+CACHE_BUS_ENABLED = os.getenv("CACHE_BUS_ENABLED", "false").lower() == "true"
+CACHE_BUS_POLL_MS = float(os.getenv("CACHE_BUS_POLL_MS", "200"))
+# Caches are bypassed when the tail has not succeeded for this long, so a broken
+# tail costs DB reads, never stale data
+CACHE_BUS_MAX_STALENESS_MS = float(os.getenv("CACHE_BUS_MAX_STALENESS_MS", "1000"))
+CACHE_BUS_BATCH = int(os.getenv("CACHE_BUS_BATCH", "1000"))
+# Auto-increment ids become visible out of order when transactions commit out of
+# order; a missing id is re-checked for this long before it is taken as rolled back
+CACHE_BUS_GAP_SECONDS = float(os.getenv("CACHE_BUS_GAP_SECONDS", "30"))
+CACHE_BUS_RETENTION_SECONDS = float(os.getenv("CACHE_BUS_RETENTION_SECONDS", "3600"))
+# Safety net for rows changed outside the app (manual SQL, imports)
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+_MISSING = object()
+
+
+def cache_key(value: str) -> str:
+    """Cache key for an email or code; MySQL compares them case-insensitively"""
+    return value.strip().lower()
+
+
+class CacheBus:
+    """Tails the cache_changes table and fans invalidations out to subscribers"""
+
+    def __init__(self):
+        self.engine = None
+        self.table = None
+        self.cursor: Optional[int] = None
+        self._gaps: Dict[int, float] = {}  # missing id -> when it was first missed
+        self._prune_marks: deque = deque()  # (monotonic time, cursor)
+        self._subscribers: Dict[str, List[Callable[[Set[str]], None]]] = {}
+        self._last_ok: Optional[float] = None
+        self._task = None
+        self.counters = {"polls": 0, "poll_errors": 0, "changes": 0, "invalidations": 0, "expired_gaps": 0}
+
+    def subscribe(self, entity: str, callback: Callable[[Set[str]], None]):
+        """Call callback(keys) with the changed keys of entity, local writes included"""
+        self._subscribers.setdefault(entity, []).append(callback)
+
+    def fresh(self) -> bool:
+        """Whether caches may be used: the tail is running and recently caught up"""
+        last_ok = self._last_ok
+        return last_ok is not None and time.monotonic() - last_ok <= CACHE_BUS_MAX_STALENESS_MS / 1000
+
+    def record(self, db, entity: str, key: str):
+        """Log a change in db's current transaction; other workers see it once that commits"""
+        if self.table is None:
+            return
+        db.execute(insert(self.table).values(entity=entity, entity_key=key[:320]))
+        db.info.setdefault("cache_changes", set()).add((entity, key))
+
+    def _after_commit(self, session):
+        # this worker's own writes are invalidated right away, not one poll later
+        changes = session.info.pop("cache_changes", None)
+        if changes:
+            self._dispatch(changes)
+
+    def _after_rollback(self, session):
+        session.info.pop("cache_changes", None)
+
+    def _dispatch(self, changes):
+        by_entity: Dict[str, Set[str]] = {}
+        for entity, key in changes:
+            by_entity.setdefault(entity, set()).add(key)
+        for entity, keys in by_entity.items():
+            for callback in self._subscribers.get(entity, ()):
+                try:
+                    callback(keys)
+                except Exception:
+                    logger.exception("Cache invalidation callback for %s failed", entity)
+            self.counters["invalidations"] += len(keys)
+
+    def configure(self, engine, table, sessionmaker):
+        self.engine = engine
+        self.table = table
+        event.listen(sessionmaker, "after_commit", self._after_commit)
+        event.listen(sessionmaker, "after_rollback", self._after_rollback)
+
+    async def start(self):
+        started = time.monotonic()
+        self.cursor = await asyncio.to_thread(self._max_id)
+        self._last_ok = started
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._last_ok = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CACHE_BUS_POLL_MS / 1000)
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception:
+                self.counters["poll_errors"] += 1
+                logger.exception("Cache bus poll failed")
+
+    def _max_id(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.max(self.table.c.id))).scalar() or 0
+
+    def poll(self):
+        """Read every change after the cursor (and any late gap ids), then invalidate"""
+        # a change is guaranteed visible to this poll only if it committed before it began
+        started = time.monotonic()
+        table = self.table
+        columns = (table.c.id, table.c.entity, table.c.entity_key)
+        rows = []
+        with self.engine.connect() as conn:
+            if self._gaps:
+                rows += conn.execute(select(*columns).where(table.c.id.in_(list(self._gaps)))).all()
+            while True:
+                batch = conn.execute(
+                    select(*columns).where(table.c.id > self.cursor).order_by(table.c.id).limit(CACHE_BUS_BATCH)
+                ).all()
+                rows += batch
+                for row in batch:
+                    self._note_gaps(self.cursor, row.id)
+                    self.cursor = row.id
+                if len(batch) < CACHE_BUS_BATCH:
+                    break
+            self._prune(conn)
+
+        now = time.monotonic()
+        for row in rows:
+            self._gaps.pop(row.id, None)
+        expired = [gap for gap, seen in self._gaps.items() if now - seen > CACHE_BUS_GAP_SECONDS]
+        for gap in expired:
+            del self._gaps[gap]
+        self.counters["expired_gaps"] += len(expired)
+
+        if rows:
+            self.counters["changes"] += len(rows)
+            self._dispatch({(row.entity, row.entity_key) for row in rows})
+        self.counters["polls"] += 1
+        self._last_ok = started
+
+    def _note_gaps(self, previous: int, current: int):
+        if current - previous > 1:
+            now = time.monotonic()
+            # bounded: a huge jump is an auto-increment reset, not in-flight transactions
+            for missing in range(max(previous + 1, current - 1000), current):
+                self._gaps.setdefault(missing, now)
+
+    def _prune(self, conn):
+        """Delete changes older than the retention, by id so it is a primary key range"""
+        now = time.monotonic()
+        marks = self._prune_marks
+        if not marks or now - marks[-1][0] >= 60:
+            marks.append((now, self.cursor))
+        if now - marks[0][0] < CACHE_BUS_RETENTION_SECONDS:
+            return
+        _, old_cursor = marks.popleft()
+        result = conn.execute(delete(self.table).where(self.table.c.id <= old_cursor))
+        conn.commit()
+        if result.rowcount:
+            logger.info("Cache bus pruned %d changes up to id %d", result.rowcount, old_cursor)
+
+    def snapshot(self) -> Dict[str, Any]:
+        last_ok = self._last_ok
+        return {
+            **self.counters,
+            "cursor": self.cursor,
+            "pending_gaps": len(self._gaps),
+            "fresh": self.fresh(),
+            "ms_since_last_poll": round((time.monotonic() - last_ok) * 1000) if last_ok else None,
+            "caches": {cache.name: cache.snapshot() for cache in caches},
+        }
+
+
+cache_bus = CacheBus()
+caches: List["InvalidatingCache"] = []
+
+
+class InvalidatingCache:
+    """In-process LRU cache of one entity, invalidated through the cache bus.
+
+    Only used while the bus is fresh; otherwise every lookup goes to the loader.
+    """
+
+    def __init__(self, name: str, entity: str, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        # bumped on every invalidation, so a load that raced one is not stored
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        cache_bus.subscribe(entity, self.invalidate)
+        caches.append(self)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        if not cache_bus.fresh():
+            return loader()
+        now = time.monotonic()
+        with self._lock:
+            expires_at, value = self._entries.get(key, (0.0, _MISSING))
+            if value is not _MISSING and expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            version = self._version
+
+        value = loader()
+        with self._lock:
+            if self._version == version:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, keys):
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def configure_cache_bus(engine, table, sessionmaker):
+    if CACHE_BUS_ENABLED:
+        cache_bus.configure(engine, table, sessionmaker)
+
+
+async def start_cache_bus():
+    if cache_bus.table is not None:
+        await cache_bus.start()
+
+
+async def stop_cache_bus():
+    await cache_bus.stop()
@@ -0,0 +1,355 @@
+import os
+import hmac
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.exc import DataError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+logger = logging.getLogger(__name__)
+
+# Event-day check-in. Each worker keeps the attendees of every open venue in memory,
+# so a scan is an HMAC check and a dict lookup, with no database round trip; check-ins
+# are written back in batches. The earliest scan of a registration wins, wherever it
+# was made, so scans replayed by offline scanners merge without conflicts.
+# Signs the QR tokens; no tokens are issued or accepted while neither is set, since an
+# empty HMAC key would let anyone forge them
+CHECKIN_SECRET = os.getenv("CHECKIN_SECRET") or os.getenv("JWT_SECRET_KEY")
+CHECKIN_FLUSH_MS = float(os.getenv("CHECKIN_FLUSH_MS", "500"))
+CHECKIN_FLUSH_BATCH = int(os.getenv("CHECKIN_FLUSH_BATCH", "1000"))
+# Picks up check-ins made through other workers and registrations made after opening
+CHECKIN_REFRESH_SECONDS = float(os.getenv("CHECKIN_REFRESH_SECONDS", "5"))
+# Venues loaded at startup; others are loaded on their first scan
+CHECKIN_VENUES = [venue.strip() for venue in os.getenv("CHECKIN_VENUES", "").split(",") if venue.strip()]
+# Scanners authenticate with this; the scan endpoints are disabled while it is unset
+CHECKIN_SCANNER_TOKEN = os.getenv("CHECKIN_SCANNER_TOKEN")
+# Scanner clocks ahead of ours by more than this are clamped to our time
+CHECKIN_MAX_CLOCK_SKEW_SECONDS = float(os.getenv("CHECKIN_MAX_CLOCK_SKEW_SECONDS", "300"))
+
+SIGNATURE_BYTES = 12  # 96-bit truncated HMAC-SHA256 keeps the QR code small
+
+
+class CheckinNotConfigured(Exception):
+    """Neither CHECKIN_SECRET nor JWT_SECRET_KEY is set, so tokens cannot be signed"""
+
+
+def _signature(registration_id: int, venue: str) -> str:
+    if not CHECKIN_SECRET:
+        raise CheckinNotConfigured("CHECKIN_SECRET is not set; refusing to sign check-in tokens with an empty key")
+    digest = hmac.new(CHECKIN_SECRET.encode(), f"{registration_id}:{venue}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).decode().rstrip("=")
+
+
+def issue_token(registration_id: int, venue: str) -> str:
+    """QR payload for a registration: "<registration_id>.<venue>.<signature>" """
+    return f"{registration_id}.{venue}.{_signature(registration_id, venue)}"
+
+
+def parse_token(token: str) -> Optional[Tuple[int, str]]:
+    """(registration_id, venue) of a genuine token, None if malformed or forged"""
+    registration_id, _, rest = (token or "").strip().partition(".")
+    venue, _, signature = rest.rpartition(".")
+    if not registration_id.isdigit() or not venue or not signature:
+        return None
+    registration_id = int(registration_id)
+    if not hmac.compare_digest(signature, _signature(registration_id, venue)):
+        return None
+    return registration_id, venue
+
+
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC, as the rest of the schema stores timestamps"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class VenueClosed(Exception):
+    """Check-in has not been opened for this venue in this worker"""
+
+
+class Attendee:
+    __slots__ = ("registration_id", "name", "checked_in_at", "scanner_id")
+
+    def __init__(self, registration_id: int, name: str):
+        self.registration_id = registration_id
+        self.name = name
+        self.checked_in_at: Optional[datetime] = None
+        self.scanner_id: Optional[str] = None
+
+    def merge(self, checked_in_at: datetime, scanner_id: Optional[str]) -> bool:
+        """Keep the earliest check-in; True if this one is it"""
+        if self.checked_in_at is not None and self.checked_in_at <= checked_in_at:
+            return False
+        self.checked_in_at = checked_in_at
+        self.scanner_id = scanner_id
+        return True
+
+
+class VenueIndex:
+    def __init__(self, venue: str):
+        self.venue = venue
+        self.attendees: Dict[int, Attendee] = {}
+        self.max_registration_id = 0
+        self.opened_at = time.time()
+        self.counters = {"checked_in": 0, "duplicates": 0, "unknown": 0, "wrong_venue": 0, "invalid": 0}
+
+    def add_registrations(self, rows: Iterable[Any]):
+        for registration_id, first_name, last_name in rows:
+            if registration_id not in self.attendees:
+                self.attendees[registration_id] = Attendee(registration_id, f"{first_name} {last_name}".strip())
+            self.max_registration_id = max(self.max_registration_id, registration_id)
+
+    def merge_checkins(self, rows: Iterable[Any]):
+        for registration_id, checked_in_at, scanner_id in rows:
+            attendee = self.attendees.get(registration_id)
+            if attendee is not None:
+                attendee.merge(checked_in_at, scanner_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "attendees": len(self.attendees),
+            "checked_in": sum(1 for attendee in self.attendees.values() if attendee.checked_in_at is not None),
+            "opened_at": self.opened_at,
+            "scans": self.counters,
+        }
+
+
+class CheckinService:
+    """Attendee indexes of the open venues plus the write-back queue.
+
+    The indexes are only touched on the event loop, so scans need no locks; the
+    loading, refreshing and writing happen in worker threads.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.registrations = None
+        self.checkins = None
+        self.venues: Dict[str, VenueIndex] = {}
+        self._pending: Dict[int, Tuple[str, datetime, Optional[str]]] = {}  # registration_id -> check-in
+        self._loading: Dict[str, asyncio.Lock] = {}
+        self._task = None
+        self._last_refresh = 0.0
+        self.counters = {"flushes": 0, "flushed": 0, "flush_errors": 0, "rejected": 0, "refresh_errors": 0}
+
+    def configure(self, engine, registrations, checkins):
+        self.engine = engine
+        self.registrations = registrations
+        self.checkins = checkins
+
+    # --- loading ---
+
+    def _read_registrations(self, venue: str, after_id: int = 0) -> List[Any]:
+        table = self.registrations
+        query = select(table.c.registration_id, table.c.first_name, table.c.last_name).where(table.c.Venue == venue)
+        if after_id:
+            query = query.where(table.c.registration_id > after_id)
+        with self.engine.connect() as conn:
+            return conn.execute(query).all()
+
+    def _read_checkins(self, venue: str) -> List[Any]:
+        table = self.checkins
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(table.c.registration_id, table.c.checked_in_at, table.c.scanner_id)
+                .where(table.c.venue == venue)
+            ).all()
+
+    async def open_venue(self, venue: str) -> Dict[str, Any]:
+        """Load (or reload) a venue's attendees and existing check-ins into memory"""
+        index = VenueIndex(venue)
+        index.add_registrations(await asyncio.to_thread(self._read_registrations, venue))
+        index.merge_checkins(await asyncio.to_thread(self._read_checkins, venue))
+        # scans of this worker not yet written must survive a reload
+        for registration_id, (pending_venue, checked_in_at, scanner_id) in self._pending.items():
+            if pending_venue == venue and registration_id in index.attendees:
+                index.attendees[registration_id].merge(checked_in_at, scanner_id)
+        self.venues[venue] = index
+        logger.info("Check-in opened for %s with %d attendees", venue, len(index.attendees))
+        return index.snapshot()
+
+    async def ensure_venue(self, venue: str) -> VenueIndex:
+        """The venue's index, loading it first if this worker has not yet"""
+        index = self.venues.get(venue)
+        if index is None:
+            lock = self._loading.setdefault(venue, asyncio.Lock())
+            async with lock:
+                if venue not in self.venues:
+                    await self.open_venue(venue)
+            index = self.venues[venue]
+        return index
+
+    async def _refresh(self):
+        for venue, index in list(self.venues.items()):
+            registrations = await asyncio.to_thread(self._read_registrations, venue, index.max_registration_id)
+            checkins = await asyncio.to_thread(self._read_checkins, venue)
+            index.add_registrations(registrations)
+            index.merge_checkins(checkins)
+
+    # --- scanning ---
+
+    def scan(self, token: str, venue: str, scanner_id: Optional[str],
+             scanned_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Validate one scan against the venue's index and queue the check-in"""
+        index = self.venues.get(venue)
+        if index is None:
+            raise VenueClosed(venue)
+        parsed = parse_token(token)
+        if parsed is None:
+            index.counters["invalid"] += 1
+            return {"status": "invalid"}
+        registration_id, token_venue = parsed
+        if token_venue != venue:
+            index.counters["wrong_venue"] += 1
+            return {"status": "wrong_venue", "registration_id": registration_id, "venue": token_venue}
+        attendee = index.attendees.get(registration_id)
+        if attendee is None:
+            index.counters["unknown"] += 1
+            return {"status": "unknown", "registration_id": registration_id}
+
+        now = datetime.utcnow()
+        scanned_at = utc_naive(scanned_at) or now
+        if scanned_at > now + timedelta(seconds=CHECKIN_MAX_CLOCK_SKEW_SECONDS):
+            scanned_at = now
+        result = {"registration_id": registration_id, "name": attendee.name}
+        if attendee.merge(scanned_at, scanner_id):
+            self._pending[registration_id] = (venue, scanned_at, scanner_id)
+            index.counters["checked_in"] += 1
+            return {**result, "status": "checked_in", "checked_in_at": scanned_at}
+        if attendee.checked_in_at == scanned_at and attendee.scanner_id == scanner_id:
+            # the same scan synced again after a lost response
+            return {**result, "status": "checked_in", "checked_in_at": scanned_at}
+        index.counters["duplicates"] += 1
+        return {**result, "status": "duplicate", "checked_in_at": attendee.checked_in_at,
+                "scanner_id": attendee.scanner_id}
+
+    def sync(self, venue: str, scanner_id: Optional[str], scans: List[Tuple[str, datetime]]) -> List[Dict[str, Any]]:
+        """Apply scans buffered offline, oldest first; results are in the order given"""
+        order = sorted(range(len(scans)), key=lambda i: utc_naive(scans[i][1]))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(scans)
+        for i in order:
+            token, scanned_at = scans[i]
+            results[i] = self.scan(token, venue, scanner_id, scanned_at)
+        return results
+
+    # --- write-back ---
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        table = self.checkins
+        upsert = mysql_insert(table).values(rows)
+        earlier = upsert.inserted.checked_in_at < table.c.checked_in_at
+        # ordered: scanner_id must be compared against the old checked_in_at
+        upsert = upsert.on_duplicate_key_update([
+            ("scanner_id", case((earlier, upsert.inserted.scanner_id), else_=table.c.scanner_id)),
+            ("checked_in_at", func.least(table.c.checked_in_at, upsert.inserted.checked_in_at)),
+        ])
+        with self.engine.begin() as conn:
+            conn.execute(upsert)
+
+    def _write_each(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write rows one at a time; returns the ones the database refuses as invalid data"""
+        rejected = []
+        for row in rows:
+            try:
+                self._write([row])
+            except DataError:
+                rejected.append(row)
+        return rejected
+
+    def _requeue(self, batch: Dict[int, Tuple[str, datetime, Optional[str]]]):
+        # put them back unless a newer scan replaced them meanwhile
+        for registration_id, checkin in batch.items():
+            current = self._pending.get(registration_id)
+            if current is None or checkin[1] < current[1]:
+                self._pending[registration_id] = checkin
+
+    async def flush(self):
+        while self._pending:
+            batch = dict(list(self._pending.items())[:CHECKIN_FLUSH_BATCH])
+            for registration_id in batch:
+                del self._pending[registration_id]
+            rows = [{"registration_id": registration_id, "venue": venue, "checked_in_at": checked_in_at,
+                     "scanner_id": scanner_id}
+                    for registration_id, (venue, checked_in_at, scanner_id) in batch.items()]
+            rejected = []
+            try:
+                try:
+                    await asyncio.to_thread(self._write, rows)
+                except DataError:
+                    # one bad row fails the whole statement; retrying it would block the queue
+                    # forever, so write the rows singly and drop the ones refused
+                    rejected = await asyncio.to_thread(self._write_each, rows)
+                    if rejected:
+                        self.counters["rejected"] += len(rejected)
+                        logger.error("Dropped %d check-ins the database rejected: %s", len(rejected), rejected[:5])
+            except BaseException as e:
+                # also when cancelled mid-write on shutdown, so the final flush writes them
+                # again (the upsert is idempotent if the cancelled write got through)
+                self._requeue(batch)
+                if not isinstance(e, Exception):
+                    raise
+                self.counters["flush_errors"] += 1
+                logger.exception("Writing %d check-ins failed; retrying", len(rows))
+                return
+            self.counters["flushes"] += 1
+            self.counters["flushed"] += len(rows) - len(rejected)
+
+    async def start(self):
+        for venue in CHECKIN_VENUES:
+            await self.open_venue(venue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error("%d check-ins could not be written on shutdown", len(self._pending))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CHECKIN_FLUSH_MS / 1000)
+            await self.flush()
+            if self.venues and time.monotonic() - self._last_refresh >= CHECKIN_REFRESH_SECONDS:
+                self._last_refresh = time.monotonic()
+                try:
+                    await self._refresh()
+                except Exception:
+                    self.counters["refresh_errors"] += 1
+                    logger.exception("Refreshing the check-in indexes failed")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "pending": len(self._pending),
+            "venues": {venue: index.snapshot() for venue, index in self.venues.items()},
+        }
+
+
+checkin_service = CheckinService()
+
+
+def configure_checkin(engine, registrations, checkins):
+    if not CHECKIN_SECRET:
+        logger.warning("Neither CHECKIN_SECRET nor JWT_SECRET_KEY is set: check-in tokens and scans are disabled")
+    checkin_service.configure(engine, registrations, checkins)
+
+
+async def start_checkin():
+    await checkin_service.start()
+
+
+async def stop_checkin():
+    await checkin_service.stop()
@@ -0,0 +1,180 @@
+import os
+import time
+import logging
+import contextvars
+from collections import Counter
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Every request gets a time budget; DB statements, pool checkout, SMTP sends and
+# outbound HTTP calls only get what is left of it.
+DEADLINES_ENABLED = os.getenv("DEADLINES_ENABLED", "true").lower() == "true"
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "10000"))
+# Background tasks (emails) start with a fresh budget once the response is sent
+BACKGROUND_DEADLINE_MS = float(os.getenv("BACKGROUND_DEADLINE_MS", "60000"))
+ROUTE_DEADLINES_MS = {
+    "/auth/google": 5000,
+    "/create-order/": 8000,
+    "/event-registration-webhook/": 10000,
+}
+for _item in os.getenv("ROUTE_DEADLINES_MS", "").split(","):
+    _path, _, _ms = _item.partition("=")
+    if _path.strip() and _ms.strip():
+        ROUTE_DEADLINES_MS[_path.strip()] = float(_ms)
+
+# No deadline: admin endpoints may legitimately run for a long time (profiling)
+EXEMPT_PREFIXES = ("/admin/",)
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+deadline_exceeded_counts: Counter = Counter()
+
+
+class Deadline:
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before or while calling `dependency`"""
+
+    def __init__(self, dependency: str):
+        super().__init__(f"Request deadline exceeded waiting for {dependency}")
+        self.dependency = dependency
+        deadline_exceeded_counts[dependency] += 1
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current deadline, or None outside one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.expires_at - time.monotonic()
+
+
+def timeout_for(dependency: str, cap: float) -> float:
+    """The timeout to give one call: its own cap, cut down to the remaining budget"""
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded(dependency)
+    return min(cap, left)
+
+
+def raise_if_expired(dependency: str):
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(dependency)
+
+
+async def deadline_exceeded_handler(request, e: DeadlineExceeded):
+    logger.warning("%s %s: %s", request.method, request.url.path, e)
+    return JSONResponse(status_code=504, content={"detail": str(e)})
+
+
+class DeadlineMiddleware:
+    """Start each request's deadline, and a fresh one for its background tasks"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not DEADLINES_ENABLED or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(ROUTE_DEADLINES_MS.get(scope["path"], REQUEST_DEADLINE_MS) / 1000)
+        token = _deadline.set(deadline)
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # background tasks run next in this same context
+                deadline.expires_at = time.monotonic() + BACKGROUND_DEADLINE_MS / 1000
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _deadline.reset(token)
+
+
+class DeadlineQueuePool(QueuePool):
+    """QueuePool whose checkout never waits past the request deadline"""
+
+    @property
+    def _timeout(self) -> float:
+        left = remaining()
+        if left is None:
+            return self._pool_timeout
+        return max(min(self._pool_timeout, left), 0.001)
+
+    @_timeout.setter
+    def _timeout(self, value: float):
+        self._pool_timeout = value
+
+    def _do_get(self):
+        raise_if_expired("db_pool")
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            raise_if_expired("db_pool")
+            raise
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._timeout = self._pool_timeout
+        return pool
+
+
+def apply_statement_deadlines(engine):
+    """Bound each statement by the remaining budget.
+
+    MySQL SELECTs get a MAX_EXECUTION_TIME hint so the server stops them, and the
+    pymysql socket read timeout is set so every statement also fails client-side.
+    """
+    is_mysql = engine.dialect.name == "mysql"
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        left = remaining()
+        if left is None:
+            return statement, parameters
+        if left <= 0:
+            raise DeadlineExceeded("db")
+        if is_mysql:
+            dbapi_connection = cursor.connection
+            if hasattr(dbapi_connection, "_read_timeout"):
+                dbapi_connection._mmml_read_timeout = getattr(
+                    dbapi_connection, "_mmml_read_timeout", dbapi_connection._read_timeout)
+                dbapi_connection._read_timeout = left
+            stripped = statement.lstrip()
+            if stripped[:6].upper() == "SELECT":
+                statement = f"SELECT /*+ MAX_EXECUTION_TIME({max(int(left * 1000), 1)}) */{stripped[6:]}"
+        return statement, parameters
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _restore_read_timeout(cursor.connection)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        execution_context = context.execution_context
+        if execution_context is not None and execution_context.cursor is not None:
+            _restore_read_timeout(execution_context.cursor.connection)
+        if isinstance(context.original_exception, DeadlineExceeded):
+            return None
+        left = remaining()
+        if left is not None and left <= 0:
+            # a read timeout or MAX_EXECUTION_TIME abort caused by the deadline
+            return DeadlineExceeded("db")
+
+
+def _restore_read_timeout(dbapi_connection):
+    if hasattr(dbapi_connection, "_mmml_read_timeout"):
+        dbapi_connection._read_timeout = dbapi_connection._mmml_read_timeout
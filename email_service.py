@@ -1,10 +1,18 @@
 import os
-from typing import Dict, Any
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from jinja2 import Environment, FileSystemLoader
 from pathlib import Path
 from dotenv import load_dotenv
 from email.utils import formataddr
+from tracing import span
+from deadlines import DeadlineExceeded, timeout_for
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -23,10 +31,36 @@ EMAIL_CONFIG = ConnectionConfig(
 
 # Initialize FastMail
 fastmail = FastMail(EMAIL_CONFIG)
+# Upper bound for one send; inside a request the remaining deadline may cut it shorter
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
 
 # Admin email address
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@mmml.com")
 
+# Admin notification mode: "immediate" sends one email per submission,
+# "digest" buffers them and sends one summary per form type
+ADMIN_NOTIFICATION_MODE = os.getenv("ADMIN_NOTIFICATION_MODE", "immediate").lower()
+ADMIN_DIGEST_INTERVAL_SECONDS = float(os.getenv("ADMIN_DIGEST_INTERVAL_SECONDS", "300"))
+ADMIN_DIGEST_MAX_BATCH = int(os.getenv("ADMIN_DIGEST_MAX_BATCH", "25"))
+# While SMTP is failing: at most this many submissions are kept per form type (the
+# oldest are dropped), and retries back off from the interval up to the maximum
+ADMIN_DIGEST_MAX_PENDING = int(os.getenv("ADMIN_DIGEST_MAX_PENDING", "500"))
+ADMIN_DIGEST_MAX_BACKOFF_SECONDS = float(os.getenv("ADMIN_DIGEST_MAX_BACKOFF_SECONDS", "3600"))
+# Comma separated form types that are always sent immediately, e.g. "Sponsorship Inquiry"
+ADMIN_DIGEST_IMMEDIATE_FORMS = {
+    form_type.strip()
+    for form_type in os.getenv("ADMIN_DIGEST_IMMEDIATE_FORMS", "").split(",")
+    if form_type.strip()
+}
+
+async def send_message(message: MessageSchema):
+    """Send a message through FastMail, recorded as an SMTP span of the current request"""
+    with span("smtp.send", subject=message.subject, recipients=len(message.recipients)):
+        try:
+            await asyncio.wait_for(fastmail.send_message(message), timeout_for("smtp", SMTP_TIMEOUT_SECONDS))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("smtp")
+
 # Email templates
 def get_email_template(template_name: str, context: Dict[str, Any]) -> str:
     """Render email template with given context"""
@@ -58,7 +92,7 @@ async def send_user_confirmation_email(user_email: str, user_name: str, form_typ
         from_name="MMML"
     )
     
-    await fastmail.send_message(message)
+    await send_message(message)
 
 async def send_admin_notification_email(form_type: str, form_data: Dict[str, Any]):
     """Send notification email to admin"""
@@ -82,7 +116,158 @@ async def send_admin_notification_email(form_type: str, form_data: Dict[str, Any
         from_name="MMML"
     )
     
-    await fastmail.send_message(message)
+    await send_message(message)
+
+async def send_admin_digest_email(form_type: str, submissions: List[Dict[str, Any]], window_start: datetime):
+    """Send one summary email to admin for a batch of submissions"""
+    subject = f"{len(submissions)} new {form_type} submission{'s' if len(submissions) != 1 else ''} received"
+    
+    # Create email context
+    context = {
+        "form_type": form_type,
+        "submissions": submissions,
+        "window_start": window_start.strftime("%Y-%m-%d %H:%M:%S"),
+        "window_end": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    
+    # Render email body
+    html_content = get_email_template("admin_digest", context)
+    
+    message = MessageSchema(
+        subject=subject,
+        recipients=[ADMIN_EMAIL],
+        body=html_content,
+        subtype="html",
+        from_name="MMML"
+    )
+    
+    await send_message(message)
+
+class AdminDigest:
+    """Buffer admin notifications and send one digest per form type per window or batch"""
+
+    def __init__(self, interval_seconds: float, max_batch: int, max_pending: int, max_backoff_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_backoff_seconds = max_backoff_seconds
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._window_starts: Dict[str, datetime] = {}
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._dropping = False
+        self.dropped = 0
+        self._dropping = False
+
+    async def add(self, form_type: str, form_data: Dict[str, Any]):
+        """Buffer a submission, sending the digest right away once the batch is full"""
+        async with self._lock:
+            buffer = self._buffers.setdefault(form_type, [])
+            if not buffer:
+                self._window_starts[form_type] = datetime.now()
+            buffer.append(form_data)
+            self._cap(form_type)
+            if len(buffer) < self.max_batch or self._backing_off():
+                return
+            submissions, window_start = self._take(form_type)
+
+        await self._send(form_type, submissions, window_start)
+
+    async def flush(self, requeue_on_error: bool = True):
+        """Send a digest for every form type that has buffered submissions"""
+        if requeue_on_error and self._backing_off():
+            return
+        async with self._lock:
+            batches = {form_type: self._take(form_type) for form_type in list(self._buffers)}
+
+        for form_type, (submissions, window_start) in batches.items():
+            await self._send(form_type, submissions, window_start, requeue_on_error)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and send whatever is still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(requeue_on_error=False)
+
+    def _take(self, form_type: str):
+        return self._buffers.pop(form_type), self._window_starts.pop(form_type)
+
+    def _backing_off(self) -> bool:
+        return time.monotonic() < self._retry_at
+
+    def _cap(self, form_type: str):
+        """Drop the oldest submissions of form_type beyond max_pending"""
+        buffer = self._buffers[form_type]
+        excess = len(buffer) - self.max_pending
+        if excess > 0:
+            del buffer[:excess]
+            self.dropped += excess
+            if not self._dropping:
+                # once per outage; each failed send reports the running total
+                self._dropping = True
+                logger.warning("Admin digest for %s over %d pending submissions: dropping the oldest",
+                               form_type, self.max_pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.flush()
+
+    async def _send(self, form_type: str, submissions: List[Dict[str, Any]], window_start: datetime,
+                    requeue_on_error: bool = True):
+        try:
+            await send_admin_digest_email(form_type, submissions, window_start)
+        except Exception as e:
+            logger.error("Error sending admin digest for %s (%d submissions, %d dropped so far): %s",
+                         form_type, len(submissions), self.dropped, e)
+            if not requeue_on_error:
+                return
+            self._failures += 1
+            backoff = min(self.interval_seconds * 2 ** (self._failures - 1), self.max_backoff_seconds)
+            self._retry_at = time.monotonic() + backoff
+            # Put the batch back so a flush after the backoff retries it
+            async with self._lock:
+                self._buffers[form_type] = submissions + self._buffers.get(form_type, [])
+                self._window_starts[form_type] = min(window_start, self._window_starts.get(form_type, window_start))
+                self._cap(form_type)
+            return
+        self._failures = 0
+        self._retry_at = 0.0
+        self._dropping = False
+
+admin_digest = (
+    AdminDigest(ADMIN_DIGEST_INTERVAL_SECONDS, ADMIN_DIGEST_MAX_BATCH, ADMIN_DIGEST_MAX_PENDING,
+                ADMIN_DIGEST_MAX_BACKOFF_SECONDS)
+    if ADMIN_NOTIFICATION_MODE == "digest"
+    else None
+)
+
+async def start_admin_digest():
+    """Start the periodic digest flush when digest mode is enabled"""
+    if admin_digest:
+        await admin_digest.start()
+
+async def stop_admin_digest():
+    """Flush buffered admin notifications on shutdown"""
+    if admin_digest:
+        await admin_digest.stop()
+
+async def notify_admin(form_type: str, form_data: Dict[str, Any]):
+    """Send the admin notification now, or buffer it for the next digest"""
+    if admin_digest is None or form_type in ADMIN_DIGEST_IMMEDIATE_FORMS:
+        await send_admin_notification_email(form_type, form_data)
+    else:
+        await admin_digest.add(form_type, form_data)
 
 async def send_registration_acknowledgement_email(user_email: str, first_name: str, event_date: str):
     """Send acknowledgement email after registration submission"""
@@ -105,7 +290,7 @@ async def send_registration_acknowledgement_email(user_email: str, first_name: s
        from_name="MMML"
     )
     
-    await fastmail.send_message(message)
+    await send_message(message)
 
 async def send_registration_approved_email(user_email: str, first_name: str, event_date: str, secure_spot_link: str):
     """Send approval email with secure spot link"""
@@ -129,7 +314,7 @@ async def send_registration_approved_email(user_email: str, first_name: str, eve
        from_name="MMML"
     )
     
-    await fastmail.send_message(message)
+    await send_message(message)
 
 async def send_registration_rejected_email(user_email: str, first_name: str, event_date: str):
     """Send rejection email with reapplication option"""
@@ -152,7 +337,7 @@ async def send_registration_rejected_email(user_email: str, first_name: str, eve
         from_name="MMML"
     )
     
-    await fastmail.send_message(message)
+    await send_message(message)
 
 async def send_form_submission_emails(user_email: str, user_name: str, form_type: str, form_data: Dict[str, Any]):
     """Send emails to both user and admin for form submission"""
@@ -160,12 +345,12 @@ async def send_form_submission_emails(user_email: str, user_name: str, form_type
         # Send confirmation to user
         await send_user_confirmation_email(user_email, user_name, form_type, form_data)
         
-        # Send notification to admin
-        await send_admin_notification_email(form_type, form_data)
+        # Send notification to admin (or buffer it for the digest)
+        await notify_admin(form_type, form_data)
         
         return True
     except Exception as e:
-        print(f"Error sending emails: {e}")
+        logger.error("Error sending emails: %s", e)
         return False
     
 async def send_registration_email(to_email: str, firstname: str = None, fullname: str = None , 
@@ -225,4 +410,4 @@ async def send_registration_email(to_email: str, firstname: str = None, fullname
         from_name="MMML"
     )
 
-    await fastmail.send_message(message)
+    await send_message(message)
@@ -0,0 +1,46 @@
+import os
+from typing import Optional
+
+# Canonical email keys, stored next to every email column as email_normalized and
+# used for all lookups. Changing these rules means re-running
+# scripts/backfill_email_keys.py --recompute.
+#
+# EMAIL_PROVIDER_NORMALIZATION also folds provider-specific aliases, e.g.
+# J.Doe+mmml@googlemail.com -> jdoe@gmail.com
+EMAIL_PROVIDER_NORMALIZATION = os.getenv("EMAIL_PROVIDER_NORMALIZATION", "false").lower() == "true"
+
+DOMAIN_ALIASES = {"googlemail.com": "gmail.com"}
+# domains that ignore dots in the local part
+DOTLESS_DOMAINS = {"gmail.com"}
+# domains that deliver local+tag to local
+PLUS_TAG_DOMAINS = {"gmail.com", "outlook.com", "hotmail.com", "live.com", "icloud.com", "me.com", "protonmail.com",
+                    "proton.me", "fastmail.com"}
+
+
+def normalize_email(email: Optional[str], provider_rules: Optional[bool] = None) -> Optional[str]:
+    """Trimmed, lowercased email, with provider aliases folded when enabled; None if blank"""
+    if email is None:
+        return None
+    email = email.strip().lower()
+    if not email:
+        return None
+    if provider_rules is None:
+        provider_rules = EMAIL_PROVIDER_NORMALIZATION
+    local, at, domain = email.rpartition("@")
+    if not provider_rules or not at or not local:
+        return email
+    domain = DOMAIN_ALIASES.get(domain, domain)
+    if domain in PLUS_TAG_DOMAINS:
+        local = local.split("+", 1)[0]
+    if domain in DOTLESS_DOMAINS:
+        local = local.replace(".", "")
+    return f"{local}@{domain}" if local else email
+
+
+def has_provider_aliases(email: Optional[str]) -> bool:
+    """Whether other spellings of email share its key under the enabled provider rules"""
+    if not EMAIL_PROVIDER_NORMALIZATION or not email:
+        return False
+    domain = email.strip().lower().rpartition("@")[2]
+    domain = DOMAIN_ALIASES.get(domain, domain)
+    return domain in DOTLESS_DOMAINS or domain in PLUS_TAG_DOMAINS
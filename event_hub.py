@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# In-process fan-out of committed submissions to the organiser dashboard's SSE
+# streams. Each event is serialized once, however many viewers are connected.
+EVENT_HUB_HISTORY = int(os.getenv("EVENT_HUB_HISTORY", "1000"))  # kept for Last-Event-ID resume
+EVENT_STREAM_CLIENT_BUFFER = int(os.getenv("EVENT_STREAM_CLIENT_BUFFER", "256"))
+EVENT_STREAM_MAX_CLIENTS = int(os.getenv("EVENT_STREAM_MAX_CLIENTS", "100"))
+EVENT_STREAM_HEARTBEAT_SECONDS = float(os.getenv("EVENT_STREAM_HEARTBEAT_SECONDS", "15"))
+EVENT_STREAM_RETRY_MS = int(os.getenv("EVENT_STREAM_RETRY_MS", "3000"))
+
+EVENT_TYPES = ("registration", "coupon_redemption", "contact_message", "speaker_application", "volunteer_application")
+
+
+class HubEvent:
+    __slots__ = ("seq", "kind", "frame")
+
+    def __init__(self, seq: int, kind: str, frame: bytes):
+        self.seq = seq
+        self.kind = kind
+        self.frame = frame
+
+
+class Subscription:
+    def __init__(self, kinds: Set[str], buffer: int):
+        self.kinds = kinds
+        self.queue: asyncio.Queue = asyncio.Queue(buffer)
+        self.dropped = False
+
+
+class HubFull(Exception):
+    """Too many stream clients are connected to this worker"""
+
+
+class EventHub:
+    """Fans published events out to bounded per-client queues.
+
+    A client that falls a full buffer behind is disconnected rather than slowing
+    everyone else; it reconnects with Last-Event-ID and resumes from the history.
+    Event ids are "<worker epoch>-<sequence>", so a resume against a restarted
+    worker is detected and answered with a reset event.
+    """
+
+    def __init__(self, history: int, client_buffer: int, max_clients: int):
+        self.epoch = format(int(time.time() * 1000), "x")
+        self.client_buffer = client_buffer
+        self.max_clients = max_clients
+        self._seq = 0
+        self._history: deque = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.counters = {"published": 0, "delivered": 0, "dropped_clients": 0, "resumes": 0, "resets": 0}
+
+    def publish(self, kind: str, data: Dict[str, Any]):
+        """Publish an event; safe to call from worker threads and with no clients connected"""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            payload = json.dumps(data, default=str, separators=(",", ":"))
+            event = HubEvent(seq, kind, f"id: {self.epoch}-{seq}\nevent: {kind}\ndata: {payload}\n\n".encode())
+            self._history.append(event)
+            self.counters["published"] += 1
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(event)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, event)
+
+    def _fan_out(self, event: HubEvent):
+        for subscription in list(self._subscribers):
+            if event.kind not in subscription.kinds:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        subscription.dropped = True
+        self.counters["dropped_clients"] += 1
+        queue = subscription.queue
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)  # wakes the stream, which ends it
+        logger.warning("Dropped a slow event stream client (%d events behind)", self.client_buffer)
+
+    def _parse_last_event_id(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Sequence number to resume after, or None when the id is not from this worker"""
+        epoch, _, seq = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    async def stream(self, kinds: Iterable[str], last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """SSE frames: replay after Last-Event-ID, then live events and heartbeats"""
+        kinds = set(kinds)
+        if len(self._subscribers) >= self.max_clients:
+            raise HubFull()
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(kinds, self.client_buffer)
+        # subscribe before copying the history, so nothing published in between is lost
+        self._subscribers.add(subscription)
+        with self._lock:
+            history: List[HubEvent] = list(self._history)
+            last_seq = self._seq
+        return self._frames(subscription, history, last_seq, last_event_id)
+
+    async def _frames(self, subscription: Subscription, history: List[HubEvent], last_seq: int,
+                      last_event_id: Optional[str]) -> AsyncIterator[bytes]:
+        try:
+            yield f"retry: {EVENT_STREAM_RETRY_MS}\n\n".encode()
+            if last_event_id:
+                resume_after = self._parse_last_event_id(last_event_id)
+                oldest = history[0].seq if history else last_seq + 1
+                if resume_after is None or resume_after + 1 < oldest:
+                    # restarted worker or history overflow: the dashboard should reload
+                    self.counters["resets"] += 1
+                    yield b"event: reset\ndata: {}\n\n"
+                    resume_after = 0 if resume_after is None else resume_after
+                else:
+                    self.counters["resumes"] += 1
+                for event in history:
+                    if event.seq > resume_after and event.kind in subscription.kinds:
+                        yield event.frame
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), EVENT_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if event is None:
+                    yield b"event: dropped\ndata: {}\n\n"
+                    return
+                if event.seq <= last_seq:
+                    continue  # already sent from the history
+                self.counters["delivered"] += 1
+                yield event.frame
+        finally:
+            self._subscribers.discard(subscription)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "clients": len(self._subscribers),
+            "history": len(self._history),
+            "last_event_id": f"{self.epoch}-{self._seq}",
+        }
+
+
+event_hub = EventHub(EVENT_HUB_HISTORY, EVENT_STREAM_CLIENT_BUFFER, EVENT_STREAM_MAX_CLIENTS)
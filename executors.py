@@ -0,0 +1,124 @@
+import os
+import time
+import functools
+import logging
+from typing import Any, Callable, Dict
+
+import anyio
+import anyio.to_thread
+from fastapi import HTTPException
+
+from logging_config import parse_logger_map
+from pool_controller import POOL_ADJUST_ENABLED, POOL_MAX_OVERFLOW, POOL_MAX_SIZE, POOL_MIN_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Bulkheads for the sync endpoints. By default FastAPI runs every `def` endpoint on
+# AnyIO's one shared 40-thread limiter, so a slow Google or Razorpay call can use
+# every thread. Each group below has its own thread limit and waiting queue instead.
+EXECUTOR_SIZES = {
+    "external_http": 16,       # Google userinfo
+    # DB-only handlers: one thread per connection the pool can hand out at its largest,
+    # so the adaptive pool sees the checkout waits it grows on
+    "db": (POOL_MAX_SIZE if POOL_ADJUST_ENABLED else POOL_MIN_SIZE) + POOL_MAX_OVERFLOW,
+    "cpu": os.cpu_count() or 2,  # password hashing
+}
+EXECUTOR_SIZES.update({k: int(v) for k, v in parse_logger_map(os.getenv("EXECUTOR_SIZES", "")).items()})
+EXECUTOR_QUEUE_LIMITS = {"external_http": 32, "db": 100, "cpu": 64}
+EXECUTOR_QUEUE_LIMITS.update({k: int(v) for k, v in parse_logger_map(os.getenv("EXECUTOR_QUEUE_LIMITS", "")).items()})
+EXECUTOR_RETRY_AFTER_SECONDS = int(os.getenv("EXECUTOR_RETRY_AFTER_SECONDS", "2"))
+
+
+class Bulkhead:
+    """A named thread limit with a bounded number of waiting calls"""
+
+    def __init__(self, name: str, size: int, queue_limit: int):
+        self.name = name
+        self.size = size
+        self.queue_limit = queue_limit
+        self._limiter = None
+        self.completed = 0
+        self.rejected = 0
+        self.max_waiting = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def limiter(self) -> anyio.CapacityLimiter:
+        # created lazily: a CapacityLimiter must be made inside the running event loop
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.size)
+        return self._limiter
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run func in a worker thread of this bulkhead, or reject with 503 when its queue is full"""
+        statistics = self.limiter.statistics()
+        if statistics.borrowed_tokens >= self.size and statistics.tasks_waiting >= self.queue_limit:
+            self.rejected += 1
+            logger.warning("Executor %s saturated (%d running, %d waiting), rejecting call",
+                           self.name, statistics.borrowed_tokens, statistics.tasks_waiting)
+            raise HTTPException(status_code=503, detail="Server is busy, please retry shortly",
+                                headers={"Retry-After": str(EXECUTOR_RETRY_AFTER_SECONDS)})
+        if statistics.borrowed_tokens >= self.size:
+            self.max_waiting = max(self.max_waiting, statistics.tasks_waiting + 1)
+
+        submitted = time.perf_counter()
+        started = None
+
+        def call():
+            nonlocal started
+            started = time.perf_counter()
+            return func(*args, **kwargs)
+
+        try:
+            return await anyio.to_thread.run_sync(call, limiter=self.limiter)
+        finally:
+            # counters are only updated here, on the event loop, never from worker threads
+            if started is not None:
+                waited = started - submitted
+                self.completed += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def snapshot(self) -> Dict[str, Any]:
+        statistics = self.limiter.statistics() if self._limiter else None
+        running = statistics.borrowed_tokens if statistics else 0
+        return {
+            "size": self.size,
+            "running": running,
+            "waiting": statistics.tasks_waiting if statistics else 0,
+            "queue_limit": self.queue_limit,
+            "saturation": round(running / self.size, 2),
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_seconds / self.completed * 1000, 2) if self.completed else None,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+        }
+
+
+executors = {
+    name: Bulkhead(name, size, EXECUTOR_QUEUE_LIMITS.get(name, 0))
+    for name, size in EXECUTOR_SIZES.items()
+}
+
+
+def bulkhead(group: str):
+    """Run a sync endpoint in the named executor instead of the shared threadpool.
+
+    The wrapper is async, so FastAPI awaits it directly; functools.wraps keeps the
+    original signature for dependency injection and the OpenAPI schema.
+    """
+    executor = executors[group]
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await executor.run(func, *args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def executors_snapshot() -> Dict[str, Any]:
+    return {name: executor.snapshot() for name, executor in executors.items()}
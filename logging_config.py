@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+
+# Logging configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" or "text"
+# Per-logger sampling, e.g. "uvicorn.access=0.1,main=0.5" keeps 10% / 50% of records below WARNING
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# Per-logger rate limits in records per second, e.g. "main=200,uvicorn.access=50"
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+# (uvicorn's "color_message" duplicates the message with ANSI codes)
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "color_message"}
+
+# Set by the tracing middleware so every record carries the request ID
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+
+
+def parse_logger_map(value: str) -> Dict[str, float]:
+    """Parse "name=value,name=value" settings into a dict"""
+    result = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, _, number = item.partition("=")
+        result[name.strip()] = float(number)
+    return result
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID to each record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        if request_id is not None:
+            record.request_id = request_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Drop a share of low-severity records per logger and cap records per second.
+
+    WARNING and above always pass. Settings apply to the logger name and its children.
+    """
+
+    def __init__(self, sampling: Dict[str, float], rate_limits: Dict[str, float]):
+        super().__init__()
+        self.sampling = sampling
+        self.rate_limits = rate_limits
+        self._buckets = {}  # logger prefix -> [tokens, last_refill]
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _lookup(self, settings: Dict[str, float], name: str):
+        while name:
+            if name in settings:
+                return name, settings[name]
+            name = name.rpartition(".")[0]
+        return None, None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        _, rate = self._lookup(self.sampling, record.name)
+        if rate is not None and random.random() >= rate:
+            self.dropped += 1
+            return False
+
+        prefix, limit = self._lookup(self.rate_limits, record.name)
+        if limit is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault(prefix, [limit, now])
+            bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+            if bucket[0] < 1:
+                self.dropped += 1
+                return False
+            bucket[0] -= 1
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves message formatting to the listener thread.
+
+    The stock QueueHandler renders the message on the calling thread; here the
+    record is enqueued as-is, so arguments must not be mutated after logging.
+    Records are dropped (and counted) rather than blocking when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """Route all logging through a queue drained by a background thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(parse_logger_map(LOG_SAMPLING), parse_logger_map(LOG_RATE_LIMITS)))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn installs its own synchronous handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Drain the queue, stop the listener thread and log synchronously from then on"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    # records logged after this (lifespan teardown, scripts importing main) would sit in a
+    # queue nothing drains, so the output handlers take the queue handler's place
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, DeferredQueueHandler)]:
+        root.removeHandler(handler)
+        for output in _listener.handlers:
+            for log_filter in handler.filters:
+                output.addFilter(log_filter)
+            root.addHandler(output)
+    _listener = None
@@ -1,37 +1,85 @@
 import os
 from urllib.parse import quote_plus
-from fastapi import FastAPI, HTTPException, Depends ,  Request, Header
+from fastapi import FastAPI, HTTPException, Depends ,  Request, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 # from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, DateTime
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, Session
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, Session, attribute_keyed_dict, deferred
 # CORRECT 👇
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import uvicorn
-from email_service import send_form_submission_emails , send_registration_email
-import razorpay
+from email_service import send_form_submission_emails , send_registration_email, start_admin_digest, stop_admin_digest
+from razorpay_async import IdempotencyConflict, RazorpayError, RazorpayUnavailable, razorpay_api
 import enum
 import json, hmac, hashlib, os, logging
-from fastapi.responses import JSONResponse
-from sqlalchemy import Column, Integer, String, Enum, DECIMAL, DateTime, Boolean, func , Text ,create_engine
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import Column, Integer, String, Enum, DECIMAL, DateTime, Boolean, BigInteger, func , Text ,create_engine, ForeignKey, Index, and_, select, bindparam, insert, event
+from sqlalchemy.dialects.mysql import DATETIME as MYSQL_DATETIME, DOUBLE, insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
 from zoneinfo import ZoneInfo
 from fastapi import BackgroundTasks
 from jose import jwt
 from passlib.context import CryptContext
 from google.oauth2 import id_token
 from google.auth.transport import requests
-
-
-
-logging.basicConfig(level=logging.INFO)
+from contextlib import asynccontextmanager
+from logging_config import setup_logging, shutdown_logging
+from tracing import TracingMiddleware, instrument_engine, setup_tracing, shutdown_tracing, span, traced_task
+from write_buffer import get_write_buffer, start_write_buffer, stop_write_buffer
+from admission import AdmissionMiddleware, admission_controller
+from rate_limit import configure_rate_limit_store, rate_limited, rate_limiter
+from executors import bulkhead, executors_snapshot
+from cache_bus import (InvalidatingCache, cache_bus, configure_cache_bus, cache_key, start_cache_bus,
+                       stop_cache_bus)
+from event_hub import EVENT_TYPES, HubFull, event_hub
+from profiler import PROFILER_INTERVAL_MS, PROFILER_MAX_SECONDS, ProfilerBusy, endpoint_codes, profiler
+from memory_diagnostics import (GROUP_BY, MEMORY_TRACE_FRAMES, asyncio_tasks, live_objects, rss_bytes, snapshots,
+                                stop_tracing)
+from emails import has_provider_aliases, normalize_email
+from checkin import CHECKIN_SCANNER_TOKEN, CHECKIN_SECRET, checkin_service, configure_checkin, issue_token, start_checkin, stop_checkin
+from pool_controller import (POOL_MAX_OVERFLOW, POOL_MIN_SIZE, AdaptiveQueuePool, pool_snapshot,
+                             start_pool_controller, stop_pool_controller)
+from deadlines import (DeadlineExceeded, DeadlineMiddleware, apply_statement_deadlines,
+                       deadline_exceeded_counts, deadline_exceeded_handler, timeout_for)
+import secrets
+import gc
+import tracemalloc
+import asyncio
+import threading
+
+
+
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_tracing()
+    await start_admin_digest()
+    await start_write_buffer(engine)
+    await start_pool_controller(engine)
+    await start_cache_bus()
+    await start_checkin()
+    yield
+    # write queued form rows and flush buffered admin notifications so nothing is lost on shutdown
+    await stop_checkin()
+    await stop_cache_bus()
+    await stop_pool_controller()
+    await stop_write_buffer()
+    await stop_admin_digest()
+    await razorpay_api.aclose()
+    shutdown_tracing()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+# Added first so it sits inside CORS: shed responses still carry the CORS headers
+app.add_middleware(AdmissionMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -48,7 +96,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Outside admission, so time spent queued counts against the request's deadline
+app.add_middleware(DeadlineMiddleware)
+app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+# Added last so it wraps everything else: assigns the request ID and the root span
+app.add_middleware(TracingMiddleware)
 GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
 
 # Database Configuration (MySQL)
@@ -65,7 +119,7 @@ def build_mysql_url_from_env() -> str:
     safe_password = quote_plus(db_password)
     return f"mysql+pymysql://{db_user}:{safe_password}@{db_host}:{db_port}/{db_name}"
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", build_mysql_url_from_env())
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or build_mysql_url_from_env()
 
 connect_args = {}
 db_ssl_ca = os.getenv("DB_SSL_CA") 
@@ -74,21 +128,45 @@ if db_ssl_ca:
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL, 
                         connect_args=connect_args,
+                        poolclass=AdaptiveQueuePool,  # resized by pool_controller, checkout cut to the deadline
                         pool_pre_ping=True,
                         pool_recycle=900,       # refresh before MySQL / NAT timeout
-                        pool_size=5,
-                        max_overflow=10,
+                        pool_size=POOL_MIN_SIZE,
+                        max_overflow=POOL_MAX_OVERFLOW,
                         pool_timeout=30,)
+instrument_engine(engine)
+apply_statement_deadlines(engine)
+
+if engine.dialect.name == "sqlite":
+    # pysqlite sends no BEGIN before a SAVEPOINT, so begin_nested() would commit on release
+    # and a later rollback undo nothing; begin explicitly so SQLite (the test database)
+    # rolls back like MySQL
+    @event.listens_for(engine, "connect")
+    def _sqlite_manual_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _sqlite_begin(conn):
+        conn.exec_driver_sql("BEGIN")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 IST = ZoneInfo("Asia/Kolkata")
+
+def _normalized_email_default(context):
+    return normalize_email(context.get_current_parameters().get("email"))
+
+def email_normalized_column():
+    """Indexed canonical email (emails.normalize_email), filled in from `email` on every insert"""
+    return Column(String(255), default=_normalized_email_default, index=True)
+
 # Database Models
 class User(Base):
     __tablename__ = "users"
 
     user_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     email = Column(String(255), unique=True, nullable=False)
+    email_normalized = email_normalized_column()
     password = Column(String(255), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -100,6 +178,7 @@ class EventRegistration(Base):
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
     email = Column(String(255), nullable=False)
+    email_normalized = email_normalized_column()
     phone_number = Column(String(20), nullable=False)
     company = Column(String(255))
     job_title = Column(String(255))
@@ -119,6 +198,7 @@ class ContactMessage(Base):
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
     email = Column(String(255), nullable=False)
+    email_normalized = email_normalized_column()
     company_organization = Column(String(255))
     message = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -128,13 +208,14 @@ class SpeakerApplication(Base):
     application_id = Column(Integer, primary_key=True, index=True)
     salutation = Column(String(10))
     full_name = Column(String(100), nullable=False)
-    email = Column(String(255), nullable=False)
+    email = Column(String(255), nullable=False, unique=True)
+    email_normalized = email_normalized_column()
     company = Column(String(255), nullable=False)
     job_title = Column(String(255), nullable=False)
     linkedin_profile = Column(String(255))
     area_of_expertise = Column(String(100), nullable=False)
     proposed_topic_title = Column(String(255), nullable=False)
-    topic_description = Column(Text, nullable=False)
+    topic_description = deferred(Column(Text, nullable=False))  # large, only loaded on access
     speaking_experience = Column(String(50))
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -144,6 +225,7 @@ class SponsorshipInquiry(Base):
     company_name = Column(String(255), nullable=False)
     contact_name = Column(String(100), nullable=False)
     email = Column(String(255), nullable=False)
+    email_normalized = email_normalized_column()
     phone = Column(String(20))
     company_website = Column(String(255))
     interested_sponsorship_level = Column(String(100))
@@ -158,6 +240,7 @@ class PartnershipProposal(Base):
     organization_name = Column(String(255), nullable=False)
     contact_name = Column(String(100), nullable=False)
     email = Column(String(255), nullable=False)
+    email_normalized = email_normalized_column()
     phone = Column(String(20))
     organization_website = Column(String(255))
     partnership_type = Column(String(100), nullable=False)
@@ -172,15 +255,17 @@ class VolunteerApplication(Base):
     salutation = Column(String(10))
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
-    email = Column(String(255), nullable=False)
+    email = Column(String(255), nullable=False, unique=True)
+    email_normalized = email_normalized_column()
     phone_number = Column(String(20))
     profession = Column(String(255), nullable=False)
     company_organization = Column(String(255))
     volunteer_experience = Column(String(50))
     availability = Column(String(50), nullable=False)
-    relevant_skills_experience = Column(Text, nullable=False)
-    areas_of_interest = Column(Text, nullable=False)
-    motivation = Column(Text, nullable=False)
+    # large free-text answers, only loaded on access
+    relevant_skills_experience = deferred(Column(Text, nullable=False), group="answers")
+    areas_of_interest = deferred(Column(Text, nullable=False), group="answers")
+    motivation = deferred(Column(Text, nullable=False), group="answers")
     created_at = Column(DateTime, default=datetime.utcnow)
 
 # Pydantic Models for Request Validation
@@ -279,12 +364,13 @@ class Contact(Base):
     firstname = Column(Text)
     lastname = Column(Text)
     email = Column(String(250), unique=True)
+    email_normalized = email_normalized_column()
     designation = Column(Text)
     company = Column(Text)
     phone = Column(Text)
     status = Column(Text)
     mmml = Column(Text)
-    fintellect = Column(Text)
+    fintellect = deferred(Column(Text))
     location = Column(Text)
     linkedin = Column(Text)
     coupon_code = Column(Text)
@@ -293,13 +379,81 @@ class Contact(Base):
     years_of_experience = Column(String(20), nullable=False)
     dietary_preference = Column(String(20), nullable=False)
     about_mmml = Column(String(20))
-    mmml_membership_application=Column(Text)
+    mmml_membership_application=deferred(Column(Text))  # large, only loaded on access
     MMML_Account = Column(String(20))
     Mum = Column(String(20))
     Blr = Column(String(20))
+    # microsecond precision so every upsert of an existing row changes it (affected rows = 2)
+    updated_at = Column(DateTime().with_variant(MYSQL_DATETIME(fsp=6), "mysql"))
+
+    # normalized participation, keyed by event code; the string flags above are kept in sync
+    attendance = relationship(
+        "ContactAttendance",
+        collection_class=attribute_keyed_dict("event"),
+        cascade="all, delete-orphan",
+        back_populates="contact",
+    )
+
+    def set_attendance(self, event: str, active: bool = True):
+        """Record participation in an event and mirror it to the legacy string column"""
+        row = self.attendance.get(event)
+        if row is None:
+            self.attendance[event] = ContactAttendance(event=event, active=active)
+        else:
+            row.active = active
+
+        for column, value in legacy_attendance_values(event, active).items():
+            setattr(self, column, value)
+
+    def attends(self, event: str) -> bool:
+        row = self.attendance.get(event)
+        return bool(row and row.active)
+
+# Event codes for ContactAttendance; cities use the same codes as coupon products
+EVENT_MMML = "MMML"
+EVENT_MMML_ACCOUNT = "MMML_ACCOUNT"
+EVENT_MMML_WAITLIST = "MMML_WAITLIST"
+VENUE_EVENTS = {
+    "Mumbai": "MMML_MUM",
+    "Bangalore": "MMML_BLR",
+}
+
+# event -> (legacy Contact column, value when active, value when inactive or None to leave it)
+LEGACY_ATTENDANCE_COLUMNS = {
+    EVENT_MMML: ("mmml", "Yes", "No"),
+    EVENT_MMML_ACCOUNT: ("MMML_Account", "Yes", "No"),
+    EVENT_MMML_WAITLIST: ("status", "waitlisted", None),
+    VENUE_EVENTS["Mumbai"]: ("Mum", "Yes", "No"),
+    VENUE_EVENTS["Bangalore"]: ("Blr", "Yes", "No"),
+}
+
+def legacy_attendance_values(event: str, active: bool) -> dict:
+    """Legacy Contact column values that mirror an attendance change"""
+    legacy = LEGACY_ATTENDANCE_COLUMNS.get(event)
+    if not legacy:
+        return {}
+    column, yes_value, no_value = legacy
+    value = yes_value if active else no_value
+    return {} if value is None else {column: value}
+
+class ContactAttendance(Base):
+    __tablename__ = "contact_attendance"
+
+    contact_id = Column(Integer, ForeignKey("crm_contacts.id", ondelete="CASCADE"), primary_key=True)
+    event = Column(String(20), primary_key=True)
+    active = Column(Boolean, nullable=False, default=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    contact = relationship("Contact", back_populates="attendance")
+
+    __table_args__ = (
+        # per-event attendee lookups are a range scan on (event, active)
+        Index("ix_contact_attendance_event_active", "event", "active", "contact_id"),
+    )
     
 class OrderRequest(BaseModel):
     amount: int  # Amount in INR paise
+    idempotency_key: str | None = None  # same key -> same order, e.g. on a double click
     
 class DiscountType(str, enum.Enum):
     flat = "flat"
@@ -336,7 +490,55 @@ class ProcessedPayment(Base):
     id = Column(Integer, primary_key=True, index=True)
     payment_id = Column(String(100), unique=True, nullable=False)  # Razorpay ID
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class RateLimitBucket(Base):
+    """Token buckets shared across workers when RATE_LIMIT_STORE=mysql"""
+    __tablename__ = "rate_limit_buckets"
+
+    bucket_key = Column(String(320), primary_key=True)  # "<group>.<ip|email>:<value>"
+    tat = Column(DOUBLE, nullable=False)  # unix time at which the bucket is full again
+
+class ContactEmailKey(Base):
+    """One row per provider-folded email key, locked by upsert_contact to serialize aliases"""
+    __tablename__ = "contact_email_keys"
+
+    email_key = Column(String(255), primary_key=True)  # emails.normalize_email
+    contact_id = Column(Integer, nullable=True)  # lowest contact with this key; NULL until known
+
+class CacheChange(Base):
+    """Append-only change log tailed by every worker to invalidate its caches (cache_bus.py)"""
+    __tablename__ = "cache_changes"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity = Column(String(64), nullable=False)  # "contact", "coupon"
+    entity_key = Column(String(320), nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
     
+class EventCheckin(Base):
+    """First check-in of a registration; written in batches by checkin.py"""
+    __tablename__ = "event_checkins"
+
+    registration_id = Column(Integer, ForeignKey("event_registrations.registration_id", ondelete="CASCADE"),
+                             primary_key=True)
+    venue = Column(String(20), nullable=False, index=True)
+    checked_in_at = Column(DateTime, nullable=False)  # when scanned, by the scanner's clock
+    scanner_id = Column(String(64))
+
+class CheckinScanRequest(BaseModel):
+    token: str
+    venue: str
+    scanner_id: str | None = Field(None, max_length=64)  # event_checkins.scanner_id
+    scanned_at: datetime | None = None  # set by scanners syncing offline scans
+
+class OfflineScan(BaseModel):
+    token: str
+    scanned_at: datetime
+
+class CheckinSyncRequest(BaseModel):
+    venue: str
+    scanner_id: str = Field(max_length=64)
+    scans: list[OfflineScan]
+
 class MembershipApplicationCreate(BaseModel):
     full_name: str
     email: str
@@ -371,6 +573,185 @@ class CheckAccountRequest(BaseModel):
 
 # Create Database Tables
 Base.metadata.create_all(bind=engine)
+configure_rate_limit_store(engine, RateLimitBucket.__table__)
+configure_cache_bus(engine, CacheChange.__table__, SessionLocal)
+configure_checkin(engine, EventRegistration.__table__, EventCheckin.__table__)
+
+# ---------- FAST READ QUERIES ----------
+# Hot read paths use statements built once at import with named bind parameters and
+# select only the columns they need. They run on the session's connection, so the
+# compiled SQL is reused, rows come back as plain tuples and the identity map is skipped.
+
+_account_flag_stmt = (
+    select(Contact.id, ContactAttendance.active)
+    .outerjoin(ContactAttendance, and_(
+        ContactAttendance.contact_id == Contact.id,
+        ContactAttendance.event == EVENT_MMML_ACCOUNT,
+    ))
+    .where(Contact.email_normalized == bindparam("email"))
+    .order_by(Contact.id)
+    .limit(1)
+)
+
+_account_profile_stmt = (
+    select(
+        Contact.salutation, Contact.firstname, Contact.lastname, Contact.email, Contact.phone,
+        Contact.company, Contact.designation, Contact.location, Contact.linkedin,
+        Contact.years_of_experience, Contact.dietary_preference,
+    )
+    .join(ContactAttendance, and_(
+        ContactAttendance.contact_id == Contact.id,
+        ContactAttendance.event == EVENT_MMML_ACCOUNT,
+        ContactAttendance.active.is_(True),
+    ))
+    .where(Contact.email_normalized == bindparam("email"))
+    .order_by(Contact.id)
+    .limit(1)
+)
+
+# coupons are cached by code, so validity is checked in fetch_valid_coupon
+_coupon_stmt = (
+    select(
+        Coupon.product, Coupon.is_active, Coupon.expiry_date, Coupon.used_count, Coupon.max_usage,
+        Coupon.discount_type, Coupon.discount_value,
+    )
+    .where(Coupon.code == bindparam("code"))
+    .limit(1)
+)
+
+_processed_payment_stmt = (
+    select(ProcessedPayment.id)
+    .where(ProcessedPayment.payment_id == bindparam("payment_id"))
+    .limit(1)
+)
+
+_registration_exists_stmt = (
+    select(EventRegistration.registration_id)
+    # IS NOT DISTINCT FROM (<=> on MySQL), so a venue-less payment matches a venue-less registration
+    .where(EventRegistration.email_normalized == bindparam("email"),
+           EventRegistration.Venue.is_not_distinct_from(bindparam("venue")))
+    .limit(1)
+)
+
+# In-process caches, kept coherent across workers by cache_bus (CACHE_BUS_ENABLED).
+# Every write to a cached entity must call cache_bus.record in its transaction.
+account_flag_cache = InvalidatingCache("account_flag", "contact")
+account_profile_cache = InvalidatingCache("account_profile", "contact")
+coupon_cache = InvalidatingCache("coupon", "coupon")
+
+def fetch_account_flag(db: Session, email: str):
+    """(contact id, MMML account active) for an email, or None"""
+    email = normalize_email(email)
+    return account_flag_cache.get_or_load(
+        email, lambda: db.connection().execute(_account_flag_stmt, {"email": email}).first())
+
+def fetch_account_profile(db: Session, email: str):
+    """Profile fields of a contact with an active MMML account, or None"""
+    email = normalize_email(email)
+    return account_profile_cache.get_or_load(
+        email, lambda: db.connection().execute(_account_profile_stmt, {"email": email}).first())
+
+def fetch_valid_coupon(db: Session, code: str, product: str, now: datetime):
+    """Discount fields of a coupon for product that is unexpired and under its usage limit, or None"""
+    coupon = coupon_cache.get_or_load(
+        cache_key(code), lambda: db.connection().execute(_coupon_stmt, {"code": code}).first())
+    if (coupon is None or (coupon.product or "").lower() != product.lower()
+            or coupon.expiry_date <= now or coupon.used_count is None or coupon.used_count >= coupon.max_usage):
+        return None
+    return coupon
+
+def payment_already_processed(db: Session, payment_id: str) -> bool:
+    return db.connection().execute(_processed_payment_stmt, {"payment_id": payment_id}).first() is not None
+
+def registration_exists(db: Session, email: str, venue: str) -> bool:
+    params = {"email": normalize_email(email), "venue": venue}
+    return db.connection().execute(_registration_exists_stmt, params).first() is not None
+
+# ---------- SINGLE ROUND-TRIP WRITES ----------
+
+def lock_email_key(db: Session, key: str) -> int | None:
+    """Lock the contact_email_keys row of key, creating it if missing; returns its contact id.
+
+    An insert on the unique key waits on a record lock when another transaction holds
+    the same key, where a locking read of a missing key would take a gap lock and let
+    two first sign-ups deadlock on their inserts.
+    """
+    keys = ContactEmailKey.__table__
+    ensure = mysql_insert(keys).values(email_key=key)
+    db.execute(ensure.on_duplicate_key_update(email_key=keys.c.email_key))
+    return db.execute(select(keys.c.contact_id).where(keys.c.email_key == key).with_for_update()).scalar()
+
+def upsert_contact(db: Session, values: dict, update: dict, event: str | None = None):
+    """Insert the crm_contacts row for values["email"], or update the existing one, in one statement
+    (a few more, serialized on the email key, for addresses whose provider aliases fold together).
+
+    `update` holds the columns to change on an existing row; `event` is also recorded as
+    active attendance. Returns (contact id, created) without a refresh.
+    """
+    now = datetime.utcnow()
+    legacy = legacy_attendance_values(event, True) if event else {}
+    contacts = Contact.__table__
+    key = normalize_email(values["email"])
+
+    aliased = has_provider_aliases(values["email"])
+    contact_id = None
+    if aliased:
+        # The unique index is on the raw email (migrations/002), so aliases of one person
+        # (j.doe@ vs jdoe@gmail.com) do not conflict there; they queue on their shared row
+        # in contact_email_keys instead
+        contact_id = lock_email_key(db, key)
+        if contact_id is None:
+            # written before the key row existed (migrations/003 backfills these)
+            contact_id = db.execute(
+                select(contacts.c.id).where(contacts.c.email_normalized == key).order_by(contacts.c.id).limit(1)
+            ).scalar()
+        if contact_id is not None and not db.execute(
+                contacts.update().where(contacts.c.id == contact_id).values(**update, **legacy, updated_at=now)
+        ).rowcount:
+            contact_id = None  # merged away by scripts.dedupe_contacts
+    created = False
+    if contact_id is None:
+        stmt = mysql_insert(contacts).values(**values, **legacy, updated_at=now)
+        # LAST_INSERT_ID(id) makes lastrowid the existing id when the email is already there
+        stmt = stmt.on_duplicate_key_update(**update, **legacy, updated_at=now, id=func.last_insert_id(contacts.c.id))
+        result = db.execute(stmt)
+        contact_id = result.lastrowid
+        # affected rows: 1 = inserted, 2 = existing row updated (updated_at always changes)
+        created = result.rowcount == 1
+    if aliased:
+        keys = ContactEmailKey.__table__
+        db.execute(keys.update().where(keys.c.email_key == key).values(contact_id=contact_id))
+    cache_bus.record(db, "contact", key)
+
+    if event:
+        attendance = mysql_insert(ContactAttendance.__table__).values(
+            contact_id=contact_id, event=event, active=True, updated_at=now)
+        db.execute(attendance.on_duplicate_key_update(active=True, updated_at=now))
+
+    return contact_id, created
+
+def insert_unique(db: Session, model, values: dict):
+    """Insert one row in a single statement; returns the new primary key, or None on a duplicate"""
+    try:
+        result = db.execute(insert(model.__table__).values(**values))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    return result.inserted_primary_key[0]
+
+async def insert_form_row(db: Session, model, values: dict) -> int:
+    """Insert one form row and return its primary key.
+
+    With WRITE_BUFFER_ENABLED the row is group-committed with other submissions;
+    otherwise it is a single INSERT and commit on the request's session.
+    """
+    write_buffer = get_write_buffer()
+    if write_buffer:
+        return await write_buffer.insert(model, values)
+    result = db.execute(insert(model.__table__).values(**values))
+    db.commit()
+    return result.inserted_primary_key[0]
 
 # ---------- CONFIG ----------
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
@@ -380,11 +761,20 @@ pwd = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")  # add to .env
 import requests as http
 
+GOOGLE_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_TIMEOUT_SECONDS", "5"))
+
 def verify_google_token(token: str):
-    resp = http.get(
-        GOOGLE_USERINFO_URL,
-        headers={"Authorization": f"Bearer {token}"}
-    )
+    with span("google.userinfo") as s:
+        try:
+            resp = http.get(
+                GOOGLE_USERINFO_URL,
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=timeout_for("google", GOOGLE_TIMEOUT_SECONDS),
+            )
+        except http.Timeout:
+            raise DeadlineExceeded("google")
+        if s:
+            s.attributes["http.status_code"] = resp.status_code
 
     if resp.status_code != 200:
         return None
@@ -406,17 +796,164 @@ def create_token(data: dict):
 def get_current_user_email(authorization: str = Header(...)) -> str:
     try:
         token = authorization.replace("Bearer ", "")
-        print("Token received:", token)
         payload = jwt.decode(
             token,
             os.getenv("JWT_SECRET_KEY"),
             algorithms=os.getenv("JWT_ALGORITHM", "HS256")
         )
-        print("Decoded payload:", payload)
+        logger.debug("Decoded token for user_id %s", payload.get("user_id"))
         return payload.get("email")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+def require_admin(x_admin_token: str = Header(None, alias="X-Admin-Token")):
+    """Admin-only endpoints; disabled entirely when ADMIN_API_TOKEN is not set"""
+    if not ADMIN_API_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+def require_scanner(x_scanner_token: str = Header(None, alias="X-Scanner-Token")):
+    """Check-in scanners; disabled entirely when CHECKIN_SCANNER_TOKEN or the token secret is not set"""
+    if (not CHECKIN_SCANNER_TOKEN or not CHECKIN_SECRET or not x_scanner_token
+            or not secrets.compare_digest(x_scanner_token, CHECKIN_SCANNER_TOKEN)):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/admin/metrics/", dependencies=[Depends(require_admin)])
+async def admin_metrics():
+    """Live counters of the in-process buffers and queues"""
+    write_buffer = get_write_buffer()
+    return {
+        "admission": admission_controller.snapshot(),
+        "rate_limit": rate_limiter.snapshot(),
+        "executors": executors_snapshot(),
+        "db_pool": pool_snapshot(),
+        "cache_bus": cache_bus.snapshot(),
+        "event_hub": event_hub.snapshot(),
+        "checkin": checkin_service.snapshot(),
+        "razorpay": razorpay_api.snapshot(),
+        "deadline_exceeded": dict(deadline_exceeded_counts),
+        "write_buffer": {**write_buffer.stats.snapshot(), "pending": write_buffer.pending()} if write_buffer else None,
+    }
+
+@app.get("/admin/events/stream", dependencies=[Depends(require_admin)])
+async def admin_event_stream(
+    types: str | None = None,
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+):
+    """Server-Sent Events of new registrations, coupon redemptions and form submissions.
+
+    `types` is a comma-separated subset of EVENT_TYPES. Reconnecting with Last-Event-ID
+    replays what was missed; a `reset` event means the dashboard should reload instead.
+    """
+    kinds = [kind.strip() for kind in types.split(",")] if types else list(EVENT_TYPES)
+    unknown = set(kinds) - set(EVENT_TYPES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown event types: {', '.join(sorted(unknown))}")
+    try:
+        frames = await event_hub.stream(kinds, last_event_id)
+    except HubFull:
+        raise HTTPException(status_code=503, detail="Too many event stream clients",
+                            headers={"Retry-After": "30"})
+    return StreamingResponse(frames, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile(
+    seconds: float = 10,
+    interval_ms: float = PROFILER_INTERVAL_MS,
+    route: str | None = None,
+    include_threads: bool = True,
+    output: str = Query("speedscope", alias="format"),
+):
+    """Sample this worker's Python stacks for `seconds` and return the profile.
+
+    `route` (a path such as /apply) keeps only samples inside that route's endpoint
+    function. include_threads=false samples only the event loop, leaving out the
+    threads that run sync handlers. `format` is speedscope (JSON) or collapsed.
+    """
+    if not 0 < seconds <= PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILER_MAX_SECONDS:g}]")
+    if interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms must be at least 1")
+    if output not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be speedscope or collapsed")
+    scope_codes = None
+    if route:
+        scope_codes = endpoint_codes(app.routes, route)
+        if not scope_codes:
+            raise HTTPException(status_code=404, detail=f"No route {route}")
+    # this handler runs on the event loop thread
+    thread_ids = None if include_threads else {threading.get_ident()}
+
+    logger.info("Profiling for %.1fs (route=%s, include_threads=%s)", seconds, route, include_threads)
+    try:
+        profile = await asyncio.to_thread(profiler.run, seconds, interval_ms / 1000, thread_ids, scope_codes)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+
+    name = f"pid {os.getpid()} {route or 'all routes'} {datetime.utcfromtimestamp(profile.started_at):%Y-%m-%dT%H:%M:%SZ}"
+    headers = {"X-Profile-Samples": str(profile.samples), "X-Profile-Ticks": str(profile.ticks)}
+    if output == "collapsed":
+        return PlainTextResponse(profile.collapsed(), headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="profile-{os.getpid()}.speedscope.json"'
+    return JSONResponse(profile.speedscope(name), headers=headers)
+
+def _memory_query(group_by: str, limit: int):
+    if group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY)}")
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+
+@app.get("/admin/memory/", dependencies=[Depends(require_admin)])
+async def admin_memory():
+    """RSS, live sessions, ORM instances per model, pending background and asyncio tasks"""
+    mapped_classes = [mapper.class_ for mapper in Base.registry.mappers]
+    objects = await asyncio.to_thread(live_objects, mapped_classes)
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "gc_counts": gc.get_count(),
+        **objects,
+        "asyncio_tasks": asyncio_tasks(),
+        "tracemalloc": {
+            "tracing": tracemalloc.is_tracing(),
+            "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+            "snapshots": snapshots.list(),
+        },
+    }
+
+@app.post("/admin/memory/snapshots", dependencies=[Depends(require_admin)])
+async def admin_take_memory_snapshot(frames: int = MEMORY_TRACE_FRAMES):
+    """Take a tracemalloc snapshot, starting tracemalloc first if needed"""
+    if not 1 <= frames <= 100:
+        raise HTTPException(status_code=400, detail="frames must be between 1 and 100")
+    return await asyncio.to_thread(snapshots.take, frames)
+
+@app.get("/admin/memory/snapshots/{snapshot_id}", dependencies=[Depends(require_admin)])
+async def admin_memory_snapshot(snapshot_id: int, group_by: str = "lineno", limit: int = 25):
+    """Largest allocation sites in one snapshot"""
+    _memory_query(group_by, limit)
+    top = await asyncio.to_thread(snapshots.top, snapshot_id, group_by, limit)
+    if top is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {"id": snapshot_id, "group_by": group_by, "top": top}
+
+@app.get("/admin/memory/snapshots/{old_id}/diff/{new_id}", dependencies=[Depends(require_admin)])
+async def admin_memory_diff(old_id: int, new_id: int, group_by: str = "lineno", limit: int = 25):
+    """Allocation sites that grew the most between two snapshots"""
+    _memory_query(group_by, limit)
+    diff = await asyncio.to_thread(snapshots.diff, old_id, new_id, group_by, limit)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {"old": old_id, "new": new_id, "group_by": group_by, "diff": diff}
+
+@app.delete("/admin/memory/snapshots", dependencies=[Depends(require_admin)])
+async def admin_stop_memory_tracing():
+    """Drop the snapshots and stop tracemalloc"""
+    stop_tracing()
+    return {"tracing": False}
 
 # Root endpoint
 @app.get("/")
@@ -425,18 +962,12 @@ async def root():
 
 
 @app.get("/fetch-logged-in-user/")
+@bulkhead("db")
 def get_logged_in_user(
     email: str = Depends(get_current_user_email),
-    db: Session = Depends(lambda: SessionLocal())
+    db: Session = Depends(get_db)
 ):
-    contact = (
-        db.query(Contact)
-        .filter(
-            Contact.email == email,
-            Contact.MMML_Account.ilike("Yes")
-        )
-        .first()
-    )
+    contact = fetch_account_profile(db, email)
 
     if not contact:
         raise HTTPException(
@@ -461,16 +992,49 @@ def get_logged_in_user(
         },
     }
 
+@app.get("/checkin/tokens")
+@bulkhead("db")
+def get_checkin_tokens(email: str = Depends(get_current_user_email), db: Session = Depends(get_db)):
+    """QR check-in tokens of the logged-in user's registrations"""
+    if not CHECKIN_SECRET:
+        raise HTTPException(status_code=503, detail="Check-in is not available")
+    registrations = db.execute(
+        select(EventRegistration.registration_id, EventRegistration.Venue)
+        .where(EventRegistration.email_normalized == normalize_email(email))
+    ).all()
+    return {"data": [{"registration_id": registration_id, "venue": venue, "token": issue_token(registration_id, venue)}
+                     for registration_id, venue in registrations if venue]}
+
+def _checkin_venue(venue: str) -> str:
+    if venue not in VENUE_EVENTS:
+        raise HTTPException(status_code=404, detail=f"Unknown venue {venue}")
+    return venue
+
+@app.post("/checkin/scan", dependencies=[Depends(require_scanner)])
+async def checkin_scan(scan: CheckinScanRequest):
+    """Check one QR token in against the venue's in-memory attendee index"""
+    await checkin_service.ensure_venue(_checkin_venue(scan.venue))
+    return checkin_service.scan(scan.token, scan.venue, scan.scanner_id, scan.scanned_at)
+
+@app.post("/checkin/sync", dependencies=[Depends(require_scanner)])
+async def checkin_sync(batch: CheckinSyncRequest):
+    """Upload scans buffered while offline; safe to repeat, the earliest scan of each attendee wins"""
+    await checkin_service.ensure_venue(_checkin_venue(batch.venue))
+    results = checkin_service.sync(batch.venue, batch.scanner_id, [(scan.token, scan.scanned_at) for scan in batch.scans])
+    return {"results": results}
+
+@app.post("/admin/checkin/{venue}/open", dependencies=[Depends(require_admin)])
+async def admin_open_checkin(venue: str):
+    """(Re)load a venue's attendee index in the worker serving this request"""
+    return await checkin_service.open_venue(_checkin_venue(venue))
+
 @app.post("/check-account/")
+@bulkhead("db")
 def check_account(
     payload: CheckAccountRequest,
-    db: Session = Depends(lambda: SessionLocal())
+    db: Session = Depends(get_db)
 ):
-    contact = (
-        db.query(Contact)
-        .filter(Contact.email == payload.email)
-        .first()
-    )
+    contact = fetch_account_flag(db, payload.email)
 
     if not contact:
         return {
@@ -485,17 +1049,15 @@ def check_account(
         "status_code": 200,
         "data": {
             "exists": True,
-            "has_mmml_account": (
-                contact.MMML_Account is not None
-                and contact.MMML_Account.lower() == "yes"
-            ),
+            "has_mmml_account": bool(contact.active),
         },
     }
     
     
-@app.post("/auth")
+@app.post("/auth", dependencies=[Depends(rate_limited("auth"))])
+@bulkhead("cpu")
 def login_or_signup(payload: AuthRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
+    user = db.query(User).filter(User.email_normalized == normalize_email(payload.email)).order_by(User.user_id).first()
     # User exists → LOGIN
     if user is not None :
         if user.password is None:
@@ -526,7 +1088,8 @@ def login_or_signup(payload: AuthRequest, db: Session = Depends(get_db)):
         "token": token
     }
 
-@app.post("/auth/google")
+@app.post("/auth/google", dependencies=[Depends(rate_limited("auth"))])
+@bulkhead("external_http")
 def google_login(payload: GoogleAuthRequest, db: Session = Depends(get_db)):
     google_data = verify_google_token(payload.token)
 
@@ -537,7 +1100,7 @@ def google_login(payload: GoogleAuthRequest, db: Session = Depends(get_db)):
     if not email:
         raise HTTPException(status_code=400, detail="Email not found in Google token")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = db.query(User).filter(User.email_normalized == normalize_email(email)).order_by(User.user_id).first()
 
     # Existing user → LOGIN
     if user:
@@ -563,7 +1126,8 @@ def google_login(payload: GoogleAuthRequest, db: Session = Depends(get_db)):
 
 
 # API Endpoints
-@app.post("/auth/google")
+@app.post("/auth/google", dependencies=[Depends(rate_limited("auth"))])
+@bulkhead("external_http")
 def google_login(payload: GoogleAuthRequest, db: Session = Depends(get_db)):
     google_data = verify_google_token(payload.token)
 
@@ -573,7 +1137,7 @@ def google_login(payload: GoogleAuthRequest, db: Session = Depends(get_db)):
     email = google_data.get("email")
     name = google_data.get("name") or email.split("@")[0]
 
-    user = db.query(User).filter(User.email == email).first()
+    user = db.query(User).filter(User.email_normalized == normalize_email(email)).order_by(User.user_id).first()
 
     if user:
         token = create_token({"user_id": user.user_id, "email": user.email, "new_user": False})
@@ -597,13 +1161,12 @@ def google_login(payload: GoogleAuthRequest, db: Session = Depends(get_db)):
     }
 
 
-razorpay_client = razorpay.Client(auth=(os.getenv("RAZORPAY_KEY_ID"), os.getenv("RAZORPAY_KEY_SECRET")))
 
 
 @app.post("/create-order/")
-def create_order(order: OrderRequest):
+async def create_order(order: OrderRequest, idempotency_key: str = Header(None, alias="Idempotency-Key")):
     try:
-        logger.info("Incoming create-order request: %s", order.dict())
+        logger.info("Incoming create-order request: amount=%s", order.amount)
 
         # # Validate amount
         # if order.amount not in [49900]:
@@ -616,11 +1179,12 @@ def create_order(order: OrderRequest):
             "currency": "INR",
             "payment_capture": 1
         }
-        logger.info("Order payload: %s", order_data)
+        logger.debug("Order payload: %s", order_data)
 
         # Call Razorpay
-        order_response = razorpay_client.order.create(data=order_data)
-        logger.info("Razorpay response: %s", order_response)
+        order_response = await razorpay_api.create_order(order_data, idempotency_key or order.idempotency_key)
+        logger.info("Razorpay order created: %s", order_response.get("id"))
+        logger.debug("Razorpay response: %s", order_response)
 
         return {
             "id": order_response["id"],
@@ -632,9 +1196,18 @@ def create_order(order: OrderRequest):
     except HTTPException as e:
         logger.error("HTTP Exception: %s", str(e.detail))
         raise
-    except razorpay.errors.BadRequestError as e:
-        logger.error("Razorpay BadRequestError: %s", str(e))
-        raise HTTPException(status_code=400, detail=str(e))
+    except DeadlineExceeded:
+        raise
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RazorpayUnavailable as e:
+        logger.error("Razorpay unavailable: %s", str(e))
+        raise HTTPException(status_code=503, detail="Payment provider unavailable, please retry", headers={"Retry-After": "5"})
+    except RazorpayError as e:
+        logger.error("Razorpay error %s: %s", e.status_code, e.description)
+        if e.status_code < 500:
+            raise HTTPException(status_code=400, detail=e.description)
+        raise HTTPException(status_code=502, detail="Failed to create order")
     except Exception as e:
         logger.exception("Unexpected error while creating order")
         raise HTTPException(status_code=500, detail="Failed to create order")
@@ -643,7 +1216,8 @@ def create_order(order: OrderRequest):
 
 
 
-@app.post("/apply", response_model=ApplyCouponResponse)
+@app.post("/apply", response_model=ApplyCouponResponse, dependencies=[Depends(rate_limited("apply"))])
+@bulkhead("db")
 def apply_coupon(data: ApplyCouponRequest, db: Session = Depends(get_db)):
     if not data.coupon_code:
         raise HTTPException(status_code=400, detail="Coupon code is required")
@@ -653,29 +1227,17 @@ def apply_coupon(data: ApplyCouponRequest, db: Session = Depends(get_db)):
         
     product = "MMML_BLR" if data.venue == "Bangalore" else "MMML_MUM"
         
-    logger.info(f"Coupon code: {data.coupon_code}")
-    logger.info(f"Venue: {data.venue}")
-    logger.info(f"Product resolved: {product}")
-    logger.info(f"Amount: {data.amount}")
-    logger.info(f"Current UTC time: {datetime.utcnow()}")
+    logger.info("Apply coupon: code=%s venue=%s product=%s amount=%s",
+                data.coupon_code, data.venue, product, data.amount)
 
-    
-    query = db.query(Coupon).filter(
-        Coupon.code == data.coupon_code,
-        Coupon.product == product,
-        Coupon.expiry_date > datetime.utcnow(),
-        Coupon.used_count < Coupon.max_usage
-    )
-
-    logger.info(str(query.statement.compile(compile_kwargs={"literal_binds": True})))
-
-    coupon = query.first()
+    now = datetime.utcnow()
+    coupon = fetch_valid_coupon(db, data.coupon_code, product, now)
     
     if not coupon:
         raise HTTPException(status_code=404, detail="Invalid coupon code")
     if not coupon.is_active:
         raise HTTPException(status_code=400, detail="Coupon is inactive")
-    if coupon.expiry_date < datetime.utcnow():
+    if coupon.expiry_date < now:
         raise HTTPException(status_code=400, detail="Coupon has expired")
     if coupon.used_count >= coupon.max_usage:
         raise HTTPException(status_code=400, detail="Coupon usage limit reached")
@@ -694,113 +1256,78 @@ def apply_coupon(data: ApplyCouponRequest, db: Session = Depends(get_db)):
     }
     
 @app.post("/post-login-registration/")
+@bulkhead("db")
 def post_login_registration(
     reg: EventRegistrationCreate,
     db: Session = Depends(get_db)
 ):
-    existing_contact = db.query(Contact).filter(
-        Contact.email == reg.email
-    ).first()
-
-    # ---------------- EXISTING CONTACT ----------------
-    if existing_contact:
-        existing_contact.MMML_Account = "Yes"
-        db.commit()
-        db.refresh(existing_contact)
-
-        return {
-            "status": "success",
-            "message": "Existing contact updated with MMML account",
-            "data": {"id": existing_contact.id}
-        }
-
-    # ---------------- NEW CONTACT ----------------
-    new_contact = Contact(
-        salutation=reg.salutation,
-        firstname=reg.first_name,
-        lastname=reg.last_name,
-        fullname=f"{reg.first_name} {reg.last_name}",
-        email=reg.email,
-        phone=reg.phone_number,
-        company=reg.company,
-        designation=reg.job_title,
-        years_of_experience=reg.years_of_experience or "0",
-        dietary_preference=reg.dietary_restrictions or "none",
-        MMML_Account="Yes",
+    contact_id, created = upsert_contact(
+        db,
+        values=dict(
+            salutation=reg.salutation,
+            firstname=reg.first_name,
+            lastname=reg.last_name,
+            fullname=f"{reg.first_name} {reg.last_name}",
+            email=reg.email,
+            phone=reg.phone_number,
+            company=reg.company,
+            designation=reg.job_title,
+            years_of_experience=reg.years_of_experience or "0",
+            dietary_preference=reg.dietary_restrictions or "none",
+        ),
+        update={},
+        event=EVENT_MMML_ACCOUNT,
     )
-
-    db.add(new_contact)
     db.commit()
-    db.refresh(new_contact)
 
     return {
         "status": "success",
-        "message": "New contact created with MMML account",
-        "data": {"id": new_contact.id}
+        "message": "New contact created with MMML account" if created else "Existing contact updated with MMML account",
+        "data": {"id": contact_id}
     }
 
 
-@app.post("/event-registration-webhook/")
-async def event_registration_webhook(
-    request: Request,
-    background_tasks: BackgroundTasks,
-    x_razorpay_signature: str = Header(None, alias="X-Razorpay-Signature"),
-    db: Session = Depends(get_db),
-):
-    logger.info("---- EVENT REGISTRATION WEBHOOK HIT ----")
-
-    # Read raw body
-    raw_body = await request.body()
-    if not x_razorpay_signature:
-        logger.warning("Missing Razorpay signature header.")
-        return JSONResponse(
-            status_code=400, 
-            content={"status": "error", "detail": "Missing Razorpay signature"},
-        )
+def parse_payment_extra(extra_raw) -> dict:
+    """The notes.extra object of a payment: a dict, JSON, or JSON written with single quotes"""
+    if not extra_raw:
+        return {}
+    # Case 1 – already dict
+    if isinstance(extra_raw, dict):
+        return extra_raw
+    try:
+        return json.loads(extra_raw)
+    except Exception as e:
+        logger.warning("FAILED normal JSON parse: %s", e)
 
-    # Verify signature
+    # Case 2 – single quotes → fix
+    try:
+        fixed = extra_raw.replace("'", '"')
+        return json.loads(fixed)
+    except Exception as e2:
+        logger.error("FAILED fallback JSON parse: %s", e2)
+        return {}
+
+def valid_razorpay_signature(raw_body: bytes, signature: str) -> bool:
+    """Whether signature is the webhook secret's HMAC-SHA256 of the raw request body"""
     RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
     expected_signature = hmac.new(
         key=RAZORPAY_WEBHOOK_SECRET.encode("utf-8"),
         msg=raw_body,
         digestmod=hashlib.sha256,
     ).hexdigest()
+    return hmac.compare_digest(expected_signature, signature)
 
-    if not hmac.compare_digest(expected_signature, x_razorpay_signature):
-        logger.error("Signature mismatch.")
-        return JSONResponse(
-            status_code=400,
-            content={"status": "error", "detail": "Invalid signature"},
-        )
+def register_captured_payment(db: Session, payment_data: dict):
+    """Register the attendee for a captured Razorpay payment entity.
 
-    # Parse JSON
-    try:
-        payload = json.loads(raw_body)
-    except Exception as e:
-        logger.exception("JSON parse error: %s", e)
-        return JSONResponse(
-            status_code=400,
-            content={"status": "ignored", "detail": "Bad JSON"},
-        )
-        
-    event_type = payload.get("event")
-    if event_type != "payment.captured":
-        logger.info("Ignoring non-captured event: %s", event_type)
-        return JSONResponse(status_code=200, content={"status": "ignored", "detail": "non-captured event"})
-    payment_data = (
-        payload.get("payload", {})
-        .get("payment", {})
-        .get("entity", {})
-    )
+    Shared by the webhook and the reconciliation job. Returns the response content
+    and, when a new registration was stored, the arguments for send_registration_email.
+    """
     payment_id = payment_data.get("id")
     
-    existing_payment = db.query(ProcessedPayment).filter(
-        ProcessedPayment.payment_id == payment_id
-    ).first()
-    
-    if existing_payment:
+    if payment_already_processed(db, payment_id):
         logger.info("Duplicate webhook for payment_id %s ignored", payment_id)
-        return JSONResponse(status_code=200, content={"status": "success", "detail": "already processed"})
+        return {"status": "success", "detail": "already processed"}, None
 
 
     notes = payment_data.get("notes", {}) or {}
@@ -813,28 +1340,9 @@ async def event_registration_webhook(
     date = notes.get("date")
     time = notes.get("time")
     extra_raw = notes.get("extra")
-    extra = {}
-
-    logger.info("RAW EXTRA RECEIVED: %s", extra_raw)
+    logger.debug("RAW EXTRA RECEIVED: %s", extra_raw)
+    extra = parse_payment_extra(extra_raw)
 
-    if extra_raw:
-        # Case 1 – already dict
-        if isinstance(extra_raw, dict):
-            extra = extra_raw
-        else:
-            try:
-                extra = json.loads(extra_raw)
-            except Exception as e:
-                logger.warning("FAILED normal JSON parse: %s", e)
-
-                # Case 2 – single quotes → fix
-                try:
-                    fixed = extra_raw.replace("'", '"')
-                    extra = json.loads(fixed)
-                except Exception as e2:
-                    logger.error("FAILED fallback JSON parse: %s", e2)
-                    extra = {}
-            
     salutation = notes.get("salutation")
     phone_number = notes.get("phone_number")
     company = notes.get("company")
@@ -847,32 +1355,32 @@ async def event_registration_webhook(
     coupon_code = extra.get("coupon_code")
     venue_info = extra.get("venue_info")
     product = "MMML_BLR" if venue == "Bangalore" else "MMML_MUM"
-    logger.info("FINAL FIELD VALUES BEING SAVED: %s", {
-        "salutation": salutation,
-        "email": email,
-        "first_name": first_name,
-        "last_name": last_name,
-        "venue": venue,
-        "phone_number": phone_number,
-        "years_of_experience": years_of_experience,
-        "topics_of_interest": topics_of_interest,
-        "dietary_restrictions": dietary_restrictions,
-        "referral_source": referral_source,
-        "linkedin_profile": linkedin_profile,
-        "coupon_code": coupon_code,
-        "venue_info": venue_info,
-    })
+    logger.info("Webhook payment %s for %s at %s", payment_id, email, venue)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("FINAL FIELD VALUES BEING SAVED: %s", {
+            "salutation": salutation,
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+            "venue": venue,
+            "phone_number": phone_number,
+            "years_of_experience": years_of_experience,
+            "topics_of_interest": topics_of_interest,
+            "dietary_restrictions": dietary_restrictions,
+            "referral_source": referral_source,
+            "linkedin_profile": linkedin_profile,
+            "coupon_code": coupon_code,
+            "venue_info": venue_info,
+        })
     
     if not email:
         logger.warning("Missing email in webhook notes.")
-        return JSONResponse(
-            status_code=200,  # 200 so Razorpay doesn’t retry endlessly
-            content={"status": "ignored", "reason": "missing email"},
-        )
+        return {"status": "ignored", "reason": "missing email"}, None
 
     try:
             # Start transaction
         with db.begin_nested():
+            registration_id = None
             if coupon_code:
                 updated = db.query(Coupon).filter(
                     Coupon.code == coupon_code,
@@ -883,12 +1391,11 @@ async def event_registration_webhook(
             
                 if not updated:
                     logger.warning("Coupon %s usage exceeded or not found", coupon_code)
+                else:
+                    cache_bus.record(db, "coupon", cache_key(coupon_code))
 
             # Check duplicate registration
-            existing_registration = db.query(EventRegistration).filter(
-                EventRegistration.email == email,
-                EventRegistration.Venue == venue
-            ).first()
+            existing_registration = registration_exists(db, email, venue)
 
             if existing_registration:
                 logger.info("User already registered: %s", email)
@@ -910,9 +1417,12 @@ async def event_registration_webhook(
                     Venue = venue,
                 )
                 db.add(db_registration)
+                db.flush()
+                registration_id = db_registration.registration_id
 
             # Create Contact if not exists
-            existing_contact = db.query(Contact).filter(Contact.email == email).first()
+            existing_contact = (db.query(Contact).filter(Contact.email_normalized == normalize_email(email))
+                                .order_by(Contact.id).first())
             if not existing_contact:
                 db_contact = Contact(
                     fullname=f"{first_name} {last_name}",
@@ -923,49 +1433,105 @@ async def event_registration_webhook(
                     phone=phone_number,
                     company=company,
                     designation=job_title,
-                    mmml="Yes",
                     mmml_time = datetime.now(IST),
                     coupon_code = coupon_code,
                     years_of_experience = years_of_experience,
                     dietary_preference = dietary_restrictions,
                     about_mmml = referral_source,
                     linkedin=linkedin_profile,
-                    Mum = 'Yes' if venue == 'Mumbai' else 'No',
-                    Blr = 'Yes' if venue == 'Bangalore' else 'No',
                 )
+                db_contact.set_attendance(EVENT_MMML, True)
+                for city, city_event in VENUE_EVENTS.items():
+                    db_contact.set_attendance(city_event, venue == city)
                 db.add(db_contact)
             else :
                 existing_contact.mmml_time = datetime.now(IST)  # ✅ update timestamp
-                existing_contact.mmml = 'Yes' 
+                existing_contact.set_attendance(EVENT_MMML, True)
                 existing_contact.coupon_code=coupon_code
-                existing_contact.Mum = 'Yes' if venue == 'Mumbai' else existing_contact.Mum
-                existing_contact.Blr = 'Yes' if venue == 'Bangalore' else existing_contact.Blr
+                if venue in VENUE_EVENTS:
+                    existing_contact.set_attendance(VENUE_EVENTS[venue], True)
                 logger.info("Updated mmmL time for exisiting user %s", datetime.now(IST))
+            cache_bus.record(db, "contact", normalize_email(email))
         
             db_payment = ProcessedPayment(payment_id=payment_id)
             db.add(db_payment)
         db.commit()  # ensures all changes are persisted    
         logger.info("Event Registration successful for %s", email)
+        if coupon_code and updated:
+            event_hub.publish("coupon_redemption", {"code": coupon_code, "product": product, "payment_id": payment_id})
+        if registration_id is not None:
+            event_hub.publish("registration", {
+                "registration_id": registration_id, "first_name": first_name, "last_name": last_name,
+                "email": email, "venue": venue, "coupon_code": coupon_code, "payment_id": payment_id,
+            })
         fullname=f"{first_name} {last_name}"
         event_name = "MMML " +  (venue if venue else "Event")
         event_date = date if date else "to be announced"
         event_time = time if time else "to be announced"
         event_city = venue if venue else "to be announced"
         event_venue_status = venue_info if venue_info else "to be announced"
-        background_tasks.add_task(send_registration_email, email, first_name, fullname,
-                                  event_date, event_time, event_city, event_venue_status, event_name)
-        
+        registration_email = (email, first_name, fullname, event_date, event_time,
+                              event_city, event_venue_status, event_name)
+        return {"status": "success", "detail": "user registered"}, registration_email
+
+    except Exception as e:
+        logger.exception("DB update failed: %s", e)
+        db.rollback()
+        # still answered with a 200, but the reconciliation job retries "error" payments
+        return {"status": "error", "detail": "DB update failed"}, None
+
+
+@app.post("/event-registration-webhook/")
+async def event_registration_webhook(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    x_razorpay_signature: str = Header(None, alias="X-Razorpay-Signature"),
+    db: Session = Depends(get_db),
+):
+    logger.info("---- EVENT REGISTRATION WEBHOOK HIT ----")
+
+    # Read raw body
+    raw_body = await request.body()
+    if not x_razorpay_signature:
+        logger.warning("Missing Razorpay signature header.")
+        return JSONResponse(
+            status_code=400, 
+            content={"status": "error", "detail": "Missing Razorpay signature"},
+        )
+
+    # Verify signature
+    if not valid_razorpay_signature(raw_body, x_razorpay_signature):
+        logger.error("Signature mismatch.")
         return JSONResponse(
-            status_code=200,
-            content={"status": "success", "detail": "user registered"},
+            status_code=400,
+            content={"status": "error", "detail": "Invalid signature"},
         )
 
+    # Parse JSON
+    try:
+        payload = json.loads(raw_body)
     except Exception as e:
-        logger.exception("DB update failed: %s", e)
+        logger.exception("JSON parse error: %s", e)
         return JSONResponse(
-            status_code=200,
-            content={"status": "ignored", "detail": "DB update failed"},
+            status_code=400,
+            content={"status": "ignored", "detail": "Bad JSON"},
         )
+        
+    event_type = payload.get("event")
+    if event_type != "payment.captured":
+        logger.info("Ignoring non-captured event: %s", event_type)
+        return JSONResponse(status_code=200, content={"status": "ignored", "detail": "non-captured event"})
+    payment_data = (
+        payload.get("payload", {})
+        .get("payment", {})
+        .get("entity", {})
+    )
+    result, registration_email = register_captured_payment(db, payment_data)
+    if registration_email:
+        background_tasks.add_task(traced_task(send_registration_email), *registration_email)
+    # always 200 so Razorpay doesn’t retry endlessly
+    return JSONResponse(status_code=200, content=result)
+
 
 # @app.get("/send-email/")
 # async def send_email():
@@ -976,13 +1542,10 @@ async def event_registration_webhook(
 #     await send_registration_email(email,first_name,fullname)
 #     return {"message": "Email has been sent"}
 
-from sqlalchemy.exc import IntegrityError
-
-
 @app.get("/test-email")
 async def test_email(background_tasks: BackgroundTasks):
     background_tasks.add_task(
-        send_registration_email,
+        traced_task(send_registration_email),
         to_email="professionalbuzz@gmail.com",
         firstname="Chintan",
         event_date="15 March 2026",
@@ -995,114 +1558,101 @@ async def test_email(background_tasks: BackgroundTasks):
     return {"status": "ok", "message": "Test email triggered"}
 
 
-@app.post("/waitlist-registrations/")
+@app.post("/waitlist-registrations/", dependencies=[Depends(rate_limited("forms"))])
 async def create_waitlist_registration(
     reg: WaitlistRegistrationCreate,
     db: Session = Depends(get_db)
 ):
-    # check duplicate
-    exists = db.query(Contact).filter(Contact.email == reg.email).first()
-    if exists:
-        exists.status = "waitlisted"
-        try:
-            db.commit()
-            db.refresh(exists)
-        except IntegrityError:
-            db.rollback()
-            raise HTTPException(status_code=400, detail="Failed to update status")
-
-        return {
-            "status_code": 200,
-            "message": "Existing contact updated to waitlisted",
-            "data": {"id": exists.id}
-        }
-
-    # create contact
-    contact = Contact(
-        salutation=reg.salutation,
-        firstname=reg.first_name,
-        lastname=reg.last_name,
-        fullname=f"{reg.first_name} {reg.last_name}",
-        email=reg.email,
-        location=reg.city,
-        status="waitlisted",
-        years_of_experience="0",          # default since NOT NULL
-        dietary_preference="none"         # default since NOT NULL
-    )
-
-    # save
     try:
-        db.add(contact)
+        contact_id, created = upsert_contact(
+            db,
+            values=dict(
+                salutation=reg.salutation,
+                firstname=reg.first_name,
+                lastname=reg.last_name,
+                fullname=f"{reg.first_name} {reg.last_name}",
+                email=reg.email,
+                location=reg.city,
+                years_of_experience="0",          # default since NOT NULL
+                dietary_preference="none"         # default since NOT NULL
+            ),
+            update={},
+            event=EVENT_MMML_WAITLIST,
+        )
         db.commit()
-        db.refresh(contact)
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=400, detail="Failed to save")
 
+    if not created:
+        return {
+            "status_code": 200,
+            "message": "Existing contact updated to waitlisted",
+            "data": {"id": contact_id}
+        }
+
     return {
         "status_code": 201,
         "message": "Waitlist entry created",
-        "data": {"id": contact.id}
+        "data": {"id": contact_id}
     }
 
-@app.post("/membership-applications/")
+@app.post("/membership-applications/", dependencies=[Depends(rate_limited("forms"))])
+@bulkhead("db")
 def submit_membership_application(
     data: MembershipApplicationCreate,
     db: Session = Depends(get_db)
 ):
-    # check duplicate
-    exists = db.query(Contact).filter(Contact.email == data.email).first()
-    if exists:
-        exists.mmml_membership_application = "membership_waitlisted"
-        try:
-            db.commit()
-            db.refresh(exists)
-        except IntegrityError:
-            db.rollback()
-            raise HTTPException(status_code=400, detail="Failed to update status")
-
-        return {
-            "status_code": 200,
-            "message": "Existing contact updated to waitlisted",
-            "data": {"id": exists.id}
-        }
-
     # split full name
     parts = data.full_name.strip().split(" ")
     firstname = parts[0]
     lastname = " ".join(parts[1:]) if len(parts) > 1 else ""
 
-    # save into crm_contacts
-    entry = Contact(
-        fullname=data.full_name,
-        firstname=firstname,
-        lastname=lastname,
-        email=data.email,
-        company=data.company,
-        linkedin=data.linkedin,
-        mmml_membership_application="membership_waitlisted",  # important flag
-        years_of_experience="0",
-        dietary_preference="none",
-    )
+    # save into crm_contacts, or flag the existing contact
+    try:
+        contact_id, created = upsert_contact(
+            db,
+            values=dict(
+                fullname=data.full_name,
+                firstname=firstname,
+                lastname=lastname,
+                email=data.email,
+                company=data.company,
+                linkedin=data.linkedin,
+                mmml_membership_application="membership_waitlisted",  # important flag
+                years_of_experience="0",
+                dietary_preference="none",
+            ),
+            update={"mmml_membership_application": "membership_waitlisted"},
+        )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Failed to update status")
 
-    db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    if not created:
+        return {
+            "status_code": 200,
+            "message": "Existing contact updated to waitlisted",
+            "data": {"id": contact_id}
+        }
 
     return {
         "status_code": 201,
         "message": "Membership Application submitted successfully",
-        "data": {"id": entry.id}
+        "data": {"id": contact_id}
     }
 
 
 
-@app.post("/contact-messages/")
+@app.post("/contact-messages/", dependencies=[Depends(rate_limited("forms"))])
 async def create_contact_message(message: ContactMessageCreate, db: Session = Depends(get_db)):
-    db_message = ContactMessage(**message.model_dump())
-    db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    created_at = datetime.utcnow()
+    message_id = await insert_form_row(db, ContactMessage, {**message.model_dump(), "created_at": created_at})
+    event_hub.publish("contact_message", {
+        "message_id": message_id, "first_name": message.first_name, "last_name": message.last_name,
+        "email": message.email, "company_organization": message.company_organization, "created_at": created_at,
+    })
     
     user_name = f"{message.first_name} {message.last_name}"
     form_data = {
@@ -1112,7 +1662,7 @@ async def create_contact_message(message: ContactMessageCreate, db: Session = De
         "email": message.email,
         "company_organization": message.company_organization,
         "message": message.message,
-        "created_at": db_message.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S")
     }
     
     await send_form_submission_emails(
@@ -1122,24 +1672,21 @@ async def create_contact_message(message: ContactMessageCreate, db: Session = De
         form_data=form_data
     )
     
-    return {"message_id": db_message.message_id}
+    return {"message_id": message_id}
 
-@app.post("/speaker-applications/")
+@app.post("/speaker-applications/", dependencies=[Depends(rate_limited("forms"))])
 async def create_speaker_application(application: SpeakerApplicationCreate, db: Session = Depends(get_db)):
-    existing_registration = db.query(SpeakerApplication).filter(
-        SpeakerApplication.email == application.email
-    ).first()
+    # the unique email constraint rejects duplicates, so this is a single INSERT
+    created_at = datetime.utcnow()
+    application_id = insert_unique(db, SpeakerApplication, {**application.model_dump(), "created_at": created_at})
     
-    if existing_registration:
+    if application_id is None:
         return {"status": 405, "detail": "User already exists"}
-
-    if not existing_registration:
-        db_application = SpeakerApplication(**application.model_dump())
-        db.add(db_application)
-        db.commit()
-        db.refresh(db_application)
-    else:
-        db_application = existing_registration
+    event_hub.publish("speaker_application", {
+        "application_id": application_id, "full_name": application.full_name, "email": application.email,
+        "company": application.company, "proposed_topic_title": application.proposed_topic_title,
+        "created_at": created_at,
+    })
 
     # existing_contact = db.query(Contact).filter(
     #     Contact.email == application.email
@@ -1176,7 +1723,7 @@ async def create_speaker_application(application: SpeakerApplicationCreate, db:
         "proposed_topic_title": application.proposed_topic_title,
         "topic_description": application.topic_description,
         "speaking_experience": application.speaking_experience,
-        "created_at": db_application.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S")
     }
     
     await send_form_submission_emails(
@@ -1186,14 +1733,12 @@ async def create_speaker_application(application: SpeakerApplicationCreate, db:
         form_data=form_data
     )
     
-    return {"application_id": db_application.application_id}
+    return {"application_id": application_id}
 
-@app.post("/sponsorship-inquiries/")
+@app.post("/sponsorship-inquiries/", dependencies=[Depends(rate_limited("forms"))])
 async def create_sponsorship_inquiry(inquiry: SponsorshipInquiryCreate, db: Session = Depends(get_db)):
-    db_inquiry = SponsorshipInquiry(**inquiry.model_dump())
-    db.add(db_inquiry)
-    db.commit()
-    db.refresh(db_inquiry)
+    created_at = datetime.utcnow()
+    inquiry_id = await insert_form_row(db, SponsorshipInquiry, {**inquiry.model_dump(), "created_at": created_at})
     
     form_data = {
         "company_name": inquiry.company_name,
@@ -1205,7 +1750,7 @@ async def create_sponsorship_inquiry(inquiry: SponsorshipInquiryCreate, db: Sess
         "marketing_objectives": inquiry.marketing_objectives,
         "budget_range": inquiry.budget_range,
         "timeline": inquiry.timeline,
-        "created_at": db_inquiry.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S")
     }
     
     await send_form_submission_emails(
@@ -1215,14 +1760,12 @@ async def create_sponsorship_inquiry(inquiry: SponsorshipInquiryCreate, db: Sess
         form_data=form_data
     )
     
-    return {"inquiry_id": db_inquiry.inquiry_id}
+    return {"inquiry_id": inquiry_id}
 
-@app.post("/partnership-proposals/")
+@app.post("/partnership-proposals/", dependencies=[Depends(rate_limited("forms"))])
 async def create_partnership_proposal(proposal: PartnershipProposalCreate, db: Session = Depends(get_db)):
-    db_proposal = PartnershipProposal(**proposal.model_dump())
-    db.add(db_proposal)
-    db.commit()
-    db.refresh(db_proposal)
+    created_at = datetime.utcnow()
+    proposal_id = await insert_form_row(db, PartnershipProposal, {**proposal.model_dump(), "created_at": created_at})
     
     form_data = {
         "organization_name": proposal.organization_name,
@@ -1234,7 +1777,7 @@ async def create_partnership_proposal(proposal: PartnershipProposalCreate, db: S
         "partnership_proposal": proposal.partnership_proposal,
         "audience_community": proposal.audience_community,
         "resources_contributed": proposal.resources_contributed,
-        "created_at": db_proposal.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S")
     }
     
     await send_form_submission_emails(
@@ -1244,24 +1787,21 @@ async def create_partnership_proposal(proposal: PartnershipProposalCreate, db: S
         form_data=form_data
     )
     
-    return {"proposal_id": db_proposal.proposal_id}
+    return {"proposal_id": proposal_id}
 
-@app.post("/volunteer-applications/")
+@app.post("/volunteer-applications/", dependencies=[Depends(rate_limited("forms"))])
 async def create_volunteer_application(application: VolunteerApplicationCreate, db: Session = Depends(get_db)):
-    existing_registration = db.query(VolunteerApplication).filter(
-        VolunteerApplication.email == application.email
-    ).first()
+    # the unique email constraint rejects duplicates, so this is a single INSERT
+    created_at = datetime.utcnow()
+    application_id = insert_unique(db, VolunteerApplication, {**application.model_dump(), "created_at": created_at})
     
-    if existing_registration:
+    if application_id is None:
         return {"status": 405, "detail": "User already exists"}
-
-    if not existing_registration:
-        db_application = VolunteerApplication(**application.model_dump())
-        db.add(db_application)
-        db.commit()
-        db.refresh(db_application)
-    else:
-        db_application = existing_registration
+    event_hub.publish("volunteer_application", {
+        "application_id": application_id, "first_name": application.first_name,
+        "last_name": application.last_name, "email": application.email,
+        "profession": application.profession, "created_at": created_at,
+    })
 
     # existing_contact = db.query(Contact).filter(
     #     Contact.email == application.email
@@ -1302,7 +1842,7 @@ async def create_volunteer_application(application: VolunteerApplicationCreate,
         "relevant_skills_experience": application.relevant_skills_experience,
         "areas_of_interest": application.areas_of_interest,
         "motivation": application.motivation,
-        "created_at": db_application.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S")
     }
     
     
@@ -1314,7 +1854,7 @@ async def create_volunteer_application(application: VolunteerApplicationCreate,
         form_data=form_data
     )
     
-    return {"application_id": db_application.application_id}
+    return {"application_id": application_id}
 
 if __name__ == "__main__":
     print("🚀 Starting MMML Backend Server...")
@@ -0,0 +1,156 @@
+import gc
+import os
+import time
+import asyncio
+import logging
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+from starlette.background import BackgroundTasks
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc stays off until the first snapshot is requested; while on it costs
+# memory and CPU on every allocation, so stop it when done
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "4"))
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+# Objects suspected of piling up, counted on every /admin/memory/ call
+SUSPECT_TYPES = {"Session": Session, "BackgroundTasks": BackgroundTasks}
+try:
+    import jinja2
+    SUSPECT_TYPES.update({"jinja2.Environment": jinja2.Environment, "jinja2.Template": jinja2.Template})
+except ImportError:
+    pass
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size; None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def live_objects(mapped_classes: Iterable[type]) -> Dict[str, Any]:
+    """One pass over the GC heap: ORM instances per model and the suspect types"""
+    models = {cls: cls.__name__ for cls in mapped_classes}
+    suspects = {cls: name for name, cls in SUSPECT_TYPES.items()}
+    orm_instances: Counter = Counter()
+    suspect_counts: Counter = Counter({name: 0 for name in SUSPECT_TYPES})
+    sessions: List[Session] = []
+    background_tasks = 0
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls in models:
+            orm_instances[models[cls]] += 1
+            continue
+        for suspect, name in suspects.items():
+            if isinstance(obj, suspect):
+                suspect_counts[name] += 1
+                if suspect is Session:
+                    sessions.append(obj)
+                elif suspect is BackgroundTasks:
+                    background_tasks += len(obj.tasks)
+                break
+
+    return {
+        "orm_instances": dict(orm_instances.most_common()),
+        "objects": dict(suspect_counts),
+        "sessions": {
+            "live": len(sessions),
+            # a session still holding a connection outside a request is a leak
+            "in_transaction": sum(1 for session in sessions if session.in_transaction()),
+            "identity_map_objects": sum(len(session.identity_map) for session in sessions),
+        },
+        "background_tasks_pending": background_tasks,
+    }
+
+
+def asyncio_tasks() -> Dict[str, int]:
+    """Running asyncio tasks grouped by coroutine name"""
+    names: Counter = Counter()
+    for task in asyncio.all_tasks():
+        coroutine = task.get_coro()
+        names[getattr(coroutine, "__qualname__", type(coroutine).__name__)] += 1
+    return dict(names.most_common())
+
+
+class SnapshotStore:
+    """The last MEMORY_MAX_SNAPSHOTS tracemalloc snapshots, by id"""
+
+    def __init__(self, max_snapshots: int):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (taken_at, snapshot)
+        self._next_id = 1
+
+    def take(self, frames: int) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.warning("tracemalloc started with %d frames; stop it when done", frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        snapshot_id = self._next_id
+        self._next_id += 1
+        self._snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+        current, peak = tracemalloc.get_traced_memory()
+        return {"id": snapshot_id, "traced_bytes": current, "traced_peak_bytes": peak,
+                "traceback_limit": tracemalloc.get_traceback_limit(), "rss_bytes": rss_bytes()}
+
+    def get(self, snapshot_id: int):
+        entry = self._snapshots.get(snapshot_id)
+        return entry[1] if entry else None
+
+    def top(self, snapshot_id: int, group_by: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        snapshot = self.get(snapshot_id)
+        if snapshot is None:
+            return None
+        return [_stat(stat, group_by) for stat in snapshot.statistics(group_by)[:limit]]
+
+    def diff(self, old_id: int, new_id: int, group_by: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Allocation sites sorted by growth between two snapshots"""
+        old, new = self.get(old_id), self.get(new_id)
+        if old is None or new is None:
+            return None
+        return [_stat(stat, group_by) for stat in new.compare_to(old, group_by)[:limit]]
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{"id": snapshot_id, "taken_at": taken_at}
+                for snapshot_id, (taken_at, _) in self._snapshots.items()]
+
+    def clear(self):
+        self._snapshots.clear()
+
+
+def _stat(stat, group_by: str) -> Dict[str, Any]:
+    frame = stat.traceback[0]
+    if group_by == "traceback":
+        site = stat.traceback.format()
+    elif group_by == "filename":
+        site = frame.filename
+    else:
+        site = f"{frame.filename}:{frame.lineno}"
+    entry = {"site": site, "size_bytes": stat.size, "count": stat.count}
+    if hasattr(stat, "size_diff"):
+        entry.update(size_diff_bytes=stat.size_diff, count_diff=stat.count_diff)
+    return entry
+
+
+def stop_tracing():
+    snapshots.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info("tracemalloc stopped")
+
+
+snapshots = SnapshotStore(MEMORY_MAX_SNAPSHOTS)
@@ -0,0 +1,12 @@
+-- Schema changes for the single-statement form writes (upsert_contact / insert_unique in main.py).
+-- Base.metadata.create_all only creates missing tables, so existing databases need these applied by hand.
+
+-- Duplicate speaker / volunteer emails must be removed first, otherwise the unique indexes fail:
+--   SELECT email, COUNT(*) FROM speaker_applications GROUP BY email HAVING COUNT(*) > 1;
+--   SELECT email, COUNT(*) FROM volunteer_applications GROUP BY email HAVING COUNT(*) > 1;
+ALTER TABLE speaker_applications ADD UNIQUE INDEX uq_speaker_applications_email (email);
+ALTER TABLE volunteer_applications ADD UNIQUE INDEX uq_volunteer_applications_email (email);
+
+-- Microsecond precision so an upsert of an existing contact always changes the row
+-- (affected rows = 2), which is how upsert_contact tells an update from an insert.
+ALTER TABLE crm_contacts ADD COLUMN updated_at DATETIME(6) NULL;
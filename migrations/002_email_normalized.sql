@@ -0,0 +1,33 @@
+-- Canonical email keys (emails.normalize_email) next to every email column; main.py looks
+-- emails up through these indexed columns and fills them in on every insert.
+--
+-- Rollout:
+--   1. apply this file (online: ALGORITHM=INPLACE, LOCK=NONE)
+--   2. python -m scripts.backfill_email_keys
+--   3. deploy the code that reads email_normalized
+--   4. python -m scripts.backfill_email_keys again, for rows written by the old code in between
+ALTER TABLE users ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_users_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE event_registrations ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_event_registrations_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE contact_messages ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_contact_messages_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE speaker_applications ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_speaker_applications_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE sponsorship_inquiries ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_sponsorship_inquiries_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE partnership_proposals ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_partnership_proposals_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE volunteer_applications ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_volunteer_applications_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE crm_contacts ADD COLUMN email_normalized VARCHAR(255) NULL,
+    ADD INDEX ix_crm_contacts_email_normalized (email_normalized), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- crm_contacts and users keep their unique indexes on the raw email until case and alias
+-- variants are merged (python -m scripts.dedupe_contacts for contacts; users need the same
+-- cleanup by hand); only then can email_normalized become unique on either table.
+-- Until then, with EMAIL_PROVIDER_NORMALIZATION=true, main.upsert_contact serializes
+-- writes for domains whose aliases fold together on their row in contact_email_keys
+-- (migrations/003), so j.doe@gmail.com updates the existing jdoe@gmail.com contact instead
+-- of adding a second one. Lookups by email_normalized take the lowest id (contacts: the
+-- one the dedupe merge keeps; users: the oldest account).
@@ -0,0 +1,18 @@
+-- One row per normalized contact email, pointing at its contact. With
+-- EMAIL_PROVIDER_NORMALIZATION=true, main.upsert_contact inserts or locks the row of
+-- the key before writing a contact, so concurrent sign-ups under aliases of one address
+-- (j.doe@gmail.com, jdoe+x@gmail.com) queue on one record lock instead of each inserting
+-- a contact, and without the gap locks a locking read on email_normalized would take.
+--
+-- Apply after 002 and its backfill; re-run the INSERT after deploying to pick up contacts
+-- written by the old code in between (upsert_contact also falls back to email_normalized).
+CREATE TABLE IF NOT EXISTS contact_email_keys (
+    email_key VARCHAR(255) NOT NULL PRIMARY KEY,
+    contact_id INT NULL
+);
+
+INSERT INTO contact_email_keys (email_key, contact_id)
+SELECT email_normalized, MIN(id) FROM crm_contacts
+WHERE email_normalized IS NOT NULL
+GROUP BY email_normalized
+ON DUPLICATE KEY UPDATE contact_id = COALESCE(contact_email_keys.contact_id, VALUES(contact_id));
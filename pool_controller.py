@@ -0,0 +1,294 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, exc
+
+from deadlines import DeadlineExceeded, DeadlineQueuePool
+
+logger = logging.getLogger(__name__)
+
+# Bounds for the adaptive pool; max_overflow stays fixed on top of the adaptive size
+POOL_MIN_SIZE = int(os.getenv("POOL_MIN_SIZE", "5"))
+POOL_MAX_SIZE = int(os.getenv("POOL_MAX_SIZE", "30"))
+POOL_MAX_OVERFLOW = int(os.getenv("POOL_MAX_OVERFLOW", "10"))
+POOL_ADJUST_ENABLED = os.getenv("POOL_ADJUST_ENABLED", "true").lower() == "true"
+POOL_ADJUST_INTERVAL_SECONDS = float(os.getenv("POOL_ADJUST_INTERVAL_SECONDS", "10"))
+# Grow when checkouts wait longer than this on average, or the pool runs this full
+POOL_TARGET_WAIT_MS = float(os.getenv("POOL_TARGET_WAIT_MS", "20"))
+POOL_GROW_UTILIZATION = float(os.getenv("POOL_GROW_UTILIZATION", "0.9"))
+# Shrink after this many consecutive intervals below the low-utilisation mark
+POOL_SHRINK_UTILIZATION = float(os.getenv("POOL_SHRINK_UTILIZATION", "0.4"))
+POOL_SHRINK_AFTER_INTERVALS = int(os.getenv("POOL_SHRINK_AFTER_INTERVALS", "30"))
+# After MySQL refuses connections, do not grow again for this long
+POOL_ERROR_COOLDOWN_SECONDS = float(os.getenv("POOL_ERROR_COOLDOWN_SECONDS", "300"))
+# Scheduled sale openings: "2026-11-01T10:00+05:30/120=40,..." keeps at least 40
+# warm connections for 120 minutes, starting POOL_WARM_LEAD_MINUTES early
+POOL_WARM_WINDOWS = os.getenv("POOL_WARM_WINDOWS", "")
+POOL_WARM_LEAD_MINUTES = float(os.getenv("POOL_WARM_LEAD_MINUTES", "15"))
+
+# MySQL errors that mean the server (not this worker) is out of connections
+MYSQL_CONNECTION_LIMIT_ERRORS = {1040, 1203, 1226}  # too many connections, max_user_connections, resource limit
+
+
+def parse_warm_windows(value: str, lead_minutes: float) -> List[Tuple[datetime, datetime, int]]:
+    """Parse "start/minutes=size,..." into (warm_from, until, size) with the lead time applied"""
+    windows = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        try:
+            spec, _, size = item.partition("=")
+            start, _, minutes = spec.partition("/")
+            start_at = datetime.fromisoformat(start.strip()).astimezone()
+            windows.append((start_at - timedelta(minutes=lead_minutes),
+                            start_at + timedelta(minutes=float(minutes)), int(size)))
+        except ValueError:
+            logger.error("Ignoring invalid POOL_WARM_WINDOWS entry %r", item)
+    return windows
+
+
+class AdaptiveQueuePool(DeadlineQueuePool):
+    """DeadlineQueuePool that can be resized at runtime and records checkout waits"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.untracked_checked_out = 0
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_checkouts = 0
+        self.window_wait_seconds = 0.0
+        self.window_max_wait_seconds = 0.0
+        self.window_timeouts = 0
+        self.window_peak_checked_out = self._demand()
+
+    def _demand(self) -> int:
+        return self.checkedout() - self.untracked_checked_out
+
+    @contextmanager
+    def untracked_checkouts(self):
+        """Leave this thread's checkouts out of the statistics; they must be returned inside the block"""
+        self._local.untracked = 0
+        try:
+            yield
+        finally:
+            with self._stats_lock:
+                self.untracked_checked_out -= self._local.untracked
+            self._local.untracked = None
+
+    def _do_get(self):
+        if getattr(self._local, "untracked", None) is not None:
+            record = super()._do_get()
+            with self._stats_lock:
+                self._local.untracked += 1
+                self.untracked_checked_out += 1
+            return record
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except (exc.TimeoutError, DeadlineExceeded):
+            with self._stats_lock:
+                self.window_timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self.window_checkouts += 1
+            self.window_wait_seconds += waited
+            self.window_max_wait_seconds = max(self.window_max_wait_seconds, waited)
+            self.window_peak_checked_out = max(self.window_peak_checked_out, self._demand())
+        return record
+
+    def take_window(self) -> Dict[str, Any]:
+        """Return and reset the checkout statistics since the previous call"""
+        with self._stats_lock:
+            window = {
+                "checkouts": self.window_checkouts,
+                "avg_wait_ms": self.window_wait_seconds / self.window_checkouts * 1000 if self.window_checkouts else 0.0,
+                "max_wait_ms": self.window_max_wait_seconds * 1000,
+                "timeouts": self.window_timeouts,
+                "peak_checked_out": self.window_peak_checked_out,
+            }
+            self._reset_window()
+        return window
+
+    def resize(self, pool_size: int):
+        """Change the number of pooled connections; idle ones above the new size are closed"""
+        surplus = []
+        with self._overflow_lock, self._pool.mutex:
+            delta = pool_size - self._pool.maxsize
+            self._pool.maxsize = pool_size
+            # _overflow counts connections relative to the pool size
+            self._overflow -= delta
+            while len(self._pool.queue) > pool_size:
+                surplus.append(self._pool.queue.pop())
+                self._overflow -= 1
+        for record in surplus:
+            record.close()
+
+
+class PoolController:
+    """Periodically grow or shrink an AdaptiveQueuePool from its recent checkout statistics"""
+
+    def __init__(self, engine, min_size: int, max_size: int, interval_seconds: float,
+                 warm_windows: List[Tuple[datetime, datetime, int]]):
+        self.engine = engine
+        self.min_size = min_size
+        self.max_size = max_size
+        self.interval_seconds = interval_seconds
+        self.warm_windows = warm_windows
+        self.quiet_intervals = 0
+        self.server_errors = 0
+        self.no_grow_until = 0.0
+        self.last_window: Optional[Dict[str, Any]] = None
+        self.decisions: List[Dict[str, Any]] = []
+        self._task = None
+        event.listen(engine, "handle_error", self._on_error)
+
+    @property
+    def pool(self) -> AdaptiveQueuePool:
+        return self.engine.pool
+
+    def _on_error(self, context):
+        args = getattr(context.original_exception, "args", ())
+        if args and args[0] in MYSQL_CONNECTION_LIMIT_ERRORS:
+            self.server_errors += 1
+
+    def warm_floor(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.now().astimezone()
+        return max([size for start, end, size in self.warm_windows if start <= now < end] + [self.min_size])
+
+    def adjust(self) -> Optional[int]:
+        """Take one sizing decision; returns the new size if it changed"""
+        pool = self.pool
+        window = pool.take_window()
+        size = pool.size()
+        capacity = size + POOL_MAX_OVERFLOW
+        utilization = window["peak_checked_out"] / capacity if capacity else 0.0
+        floor = min(self.warm_floor(), self.max_size)
+        server_errors, self.server_errors = self.server_errors, 0
+        window.update(size=size, utilization=round(utilization, 2), server_errors=server_errors, floor=floor)
+        self.last_window = window
+
+        step = max(2, size // 4)
+        new_size, reason = size, None
+        if server_errors:
+            # MySQL itself is out of connections: growing would only make it worse
+            self.no_grow_until = time.monotonic() + POOL_ERROR_COOLDOWN_SECONDS
+            new_size, reason = max(floor, size - step), "MySQL refused connections"
+        elif size < floor:
+            new_size, reason = floor, "scheduled warm window"
+        elif (window["avg_wait_ms"] > POOL_TARGET_WAIT_MS or window["timeouts"]
+              or utilization >= POOL_GROW_UTILIZATION):
+            self.quiet_intervals = 0
+            if time.monotonic() < self.no_grow_until:
+                logger.info("DB pool kept at %d: under pressure but in cooldown after MySQL refused connections", size)
+            elif size >= self.max_size:
+                logger.warning("DB pool kept at %d: under pressure but already at POOL_MAX_SIZE (%s)", size, window)
+            else:
+                new_size, reason = min(self.max_size, size + step), "checkouts waiting or pool nearly full"
+        elif utilization < POOL_SHRINK_UTILIZATION:
+            self.quiet_intervals += 1
+            if self.quiet_intervals >= POOL_SHRINK_AFTER_INTERVALS:
+                new_size, reason = max(floor, size - step), "low utilisation"
+        else:
+            self.quiet_intervals = 0
+
+        if new_size == size:
+            return None
+        self.quiet_intervals = 0
+        pool.resize(new_size)
+        decision = {"at": datetime.now().astimezone().isoformat(timespec="seconds"),
+                    "from": size, "to": new_size, "reason": reason, **window}
+        self.decisions = (self.decisions + [decision])[-50:]
+        logger.info("DB pool resized %d -> %d (%s): avg wait %.1f ms, max wait %.1f ms, %d timeouts, "
+                    "peak %d checked out, utilisation %.2f, %d server errors",
+                    size, new_size, reason, window["avg_wait_ms"], window["max_wait_ms"], window["timeouts"],
+                    window["peak_checked_out"], utilization, server_errors)
+        return new_size
+
+    def prewarm(self):
+        """Fill the pool up to its full size, so a sale opening pays no connect cost"""
+        pool = self.pool
+        # idle connections are handed out first, so hold all of them plus the new ones at once
+        wanted = pool.size() - max(pool.checkedout(), 0)
+        idle = pool.checkedin()
+        if idle >= wanted:
+            return
+        connections = []
+        # these checkouts are not demand, and must not make the controller grow the pool
+        with pool.untracked_checkouts():
+            try:
+                for _ in range(wanted):
+                    connections.append(self.engine.raw_connection())
+            except Exception as e:
+                logger.warning("DB pool prewarm stopped after %d connections: %s", len(connections), e)
+            finally:
+                for connection in connections:
+                    connection.close()
+        if len(connections) > idle:
+            logger.info("DB pool prewarmed %d connections", len(connections) - idle)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                self.adjust()
+                if self.warm_floor() > self.min_size:
+                    # refill connections recycled or dropped during the warm window
+                    await asyncio.to_thread(self.prewarm)
+            except Exception:
+                logger.exception("DB pool adjustment failed")
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self.pool
+        return {
+            "size": pool.size(),
+            "max_overflow": POOL_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "bounds": [self.min_size, self.max_size],
+            "warm_floor": self.warm_floor(),
+            "last_window": self.last_window,
+            "recent_decisions": self.decisions[-10:],
+        }
+
+
+pool_controller: Optional[PoolController] = None
+
+
+async def start_pool_controller(engine):
+    """Start adaptive sizing when the engine uses AdaptiveQueuePool"""
+    global pool_controller
+    if POOL_ADJUST_ENABLED and isinstance(engine.pool, AdaptiveQueuePool):
+        pool_controller = PoolController(engine, POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_ADJUST_INTERVAL_SECONDS,
+                                         parse_warm_windows(POOL_WARM_WINDOWS, POOL_WARM_LEAD_MINUTES))
+        await pool_controller.start()
+
+
+async def stop_pool_controller():
+    if pool_controller:
+        await pool_controller.stop()
+
+
+def pool_snapshot() -> Optional[Dict[str, Any]]:
+    return pool_controller.snapshot() if pool_controller else None
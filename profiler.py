@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# On-demand stack sampling. Nothing is hooked or traced while no profile runs; a
+# profile is one thread reading sys._current_frames() every PROFILER_INTERVAL_MS.
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_MAX_DEPTH = int(os.getenv("PROFILER_MAX_DEPTH", "128"))
+
+# Leaf functions of threads that are parked, not working: idle threadpool workers,
+# the event loop waiting in select(), background timers
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("_thread.py", "get"),  # anyio worker threads
+}
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running in this worker"""
+
+
+class Profile:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()  # tuple of Frames, root first -> samples
+        self.samples = 0
+        self.ticks = 0
+        self.started_at = time.time()
+        self.duration = 0.0
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format, one "root;...;leaf count" line per stack"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = ";".join(f"{function} ({os.path.basename(file)}:{line})" for function, file, line in stack)
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """A sampled profile in speedscope's file format, weighted in milliseconds"""
+        frame_index: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            samples.append([frame_index.setdefault(frame, len(frame_index)) for frame in stack])
+            weights.append(round(count * self.interval * 1000, 3))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "mmml-backend profiler",
+            "shared": {"frames": [{"name": function, "file": file, "line": line}
+                                  for (function, file, line) in frame_index]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(self.duration * 1000, 3),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+
+    def run(self, seconds: float, interval: float, thread_ids: Optional[Set[int]] = None,
+            scope_codes: Optional[Set[Any]] = None) -> Profile:
+        """Sample for `seconds`, blocking the calling thread.
+
+        thread_ids limits sampling to those threads (None: every thread). scope_codes
+        keeps only stacks that pass through one of those code objects, e.g. a route's
+        endpoint function, and cuts them to start there.
+        """
+        with self._lock:
+            if self.running:
+                raise ProfilerBusy()
+            self.running = True
+        try:
+            return self._sample(seconds, interval, thread_ids, scope_codes)
+        finally:
+            self.running = False
+
+    def _sample(self, seconds, interval, thread_ids, scope_codes) -> Profile:
+        profile = Profile(interval)
+        me = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_tick = started
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now < next_tick:
+                time.sleep(next_tick - now)
+            next_tick += interval
+            profile.ticks += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or (thread_ids is not None and thread_id not in thread_ids):
+                    continue
+                stack = _walk(frame, scope_codes)
+                if stack:
+                    profile.stacks[stack] += 1
+                    profile.samples += 1
+        profile.duration = time.perf_counter() - started
+        return profile
+
+
+def _walk(frame, scope_codes) -> Optional[Tuple[Frame, ...]]:
+    leaf = frame.f_code
+    if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+        return None
+    frames = []
+    scoped = scope_codes is None
+    depth = 0
+    while frame is not None and depth < PROFILER_MAX_DEPTH:
+        code = frame.f_code
+        frames.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+        if not scoped and code in scope_codes:
+            scoped = True
+            break  # everything above the endpoint is framework plumbing
+        frame = frame.f_back
+        depth += 1
+    if not scoped:
+        return None
+    frames.reverse()
+    return tuple(frames)
+
+
+def endpoint_codes(routes: Iterable[Any], path: str) -> Set[Any]:
+    """Code objects of the endpoint functions serving path, unwrapping decorators"""
+    codes = set()
+    for route in routes:
+        if getattr(route, "path", None) != path or not hasattr(route, "endpoint"):
+            continue
+        function = route.endpoint
+        while function is not None:
+            if hasattr(function, "__code__"):
+                codes.add(function.__code__)
+            function = getattr(function, "__wrapped__", None)
+    return codes
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,212 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "memory" keeps buckets per worker; "mysql" shares them across workers through
+# the rate_limit_buckets table (insert-if-missing, locked read and update per check)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "1000000"))
+
+# "<group>.<ip|email>=<requests>/<seconds>": a bucket of <requests> tokens that
+# refills completely in <seconds>
+DEFAULT_RATE_LIMITS = {
+    "auth.ip": "60/60",
+    "auth.email": "10/300",
+    "apply.ip": "30/60",
+    "forms.ip": "10/600",
+    "forms.email": "3/600",
+}
+
+
+def parse_rate_limits(value: str) -> Dict[str, Tuple[int, float]]:
+    """Parse "name=requests/seconds,..." into {name: (requests, seconds)}"""
+    limits = {}
+    for item in value.split(","):
+        name, _, spec = item.partition("=")
+        requests, _, seconds = spec.partition("/")
+        if name.strip() and requests.strip() and seconds.strip():
+            limits[name.strip()] = (int(requests), float(seconds))
+    return limits
+
+
+RATE_LIMITS = parse_rate_limits(",".join(f"{k}={v}" for k, v in DEFAULT_RATE_LIMITS.items()))
+RATE_LIMITS.update(parse_rate_limits(os.getenv("RATE_LIMITS", "")))
+
+# (key, seconds per token, bucket size)
+Bucket = Tuple[str, float, int]
+
+
+class MemoryBucketStore:
+    """Token buckets kept as one float per key (GCRA's theoretical arrival time).
+
+    A key whose arrival time has passed has a full bucket, which is the same as no
+    entry at all, so those keys are evicted. Keys are kept in last-touched order,
+    so the sweep and the RATE_LIMIT_MAX_KEYS cap only ever look at the oldest ones.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self._operations = 0
+
+    async def take(self, buckets: List[Bucket], now: float) -> List[float]:
+        return self._take(buckets, now)
+
+    def _take(self, buckets: List[Bucket], now: float) -> List[float]:
+        new_tats, retry_afters = charge([self._tat.get(key, now) for key, _, _ in buckets], buckets, now)
+        if new_tats:
+            for (key, _, _), new_tat in zip(buckets, new_tats):
+                self._tat[key] = new_tat
+                self._tat.move_to_end(key)
+
+        self._operations += 1
+        if self._operations % 1024 == 0 or len(self._tat) > self.max_keys:
+            self._evict(now)
+        return retry_afters
+
+    def _evict(self, now: float):
+        tat = self._tat
+        while tat:
+            key = next(iter(tat))
+            if len(tat) <= self.max_keys and tat[key] > now:
+                break
+            del tat[key]
+
+    def size(self) -> int:
+        return len(self._tat)
+
+
+class MySQLBucketStore:
+    """The same buckets stored in a MySQL table so every worker shares them"""
+
+    def __init__(self, engine, table):
+        self.engine = engine
+        self.table = table
+        self._operations = 0
+
+    async def take(self, buckets: List[Bucket], now: float) -> List[float]:
+        return await asyncio.to_thread(self._take, buckets, now)
+
+    def _take(self, buckets: List[Bucket], now: float) -> List[float]:
+        table = self.table
+        keys = sorted({key for key, _, _ in buckets})  # one lock order for every worker
+        with self.engine.begin() as conn:
+            # Insert the rows before locking them: a locking read of a missing key takes
+            # a gap lock, and two first hits for one key would deadlock on the insert.
+            # A full bucket (tat = now) is the same as no row.
+            ensure = mysql_insert(table).values([{"bucket_key": key, "tat": now} for key in keys])
+            conn.execute(ensure.on_duplicate_key_update(tat=table.c.tat))
+            stored = dict(conn.execute(
+                select(table.c.bucket_key, table.c.tat).where(table.c.bucket_key.in_(keys)).with_for_update()
+            ).all())
+            new_tats, retry_afters = charge([stored.get(key, now) for key, _, _ in buckets], buckets, now)
+            for (key, _, _), new_tat in zip(buckets, new_tats):
+                conn.execute(update(table).where(table.c.bucket_key == key).values(tat=new_tat))
+
+            self._operations += 1
+            if self._operations % 1024 == 0:
+                # full buckets carry no state
+                conn.execute(delete(table).where(table.c.tat <= now))
+        return retry_afters
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def charge(tats: List[float], buckets: List[Bucket], now: float) -> Tuple[List[float], List[float]]:
+    """GCRA for several buckets at once: a token is taken from every bucket or from none.
+
+    Returns the new arrival times (empty when the request is limited) and each
+    bucket's seconds to wait, 0 where it had a token.
+    """
+    new_tats, retry_afters = [], []
+    for tat, (_, interval, burst) in zip(tats, buckets):
+        new_tat = max(tat, now) + interval
+        new_tats.append(new_tat)
+        retry_afters.append(max(new_tat - now - interval * burst, 0.0))
+    return ([] if any(retry_afters) else new_tats), retry_afters
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Tuple[int, float]], store):
+        self.limits = limits
+        self.store = store
+        self.counters: Dict[str, Dict[str, int]] = {name: {"allowed": 0, "limited": 0} for name in limits}
+
+    async def check(self, checks: List[Tuple[str, str]]) -> Tuple[Optional[str], float]:
+        """Take a token from each (rule, value) bucket, or from none if any is empty.
+
+        Returns the rule that limited the request and the seconds to wait, or (None, 0).
+        """
+        buckets = []
+        for rule, value in checks:
+            requests, seconds = self.limits[rule]
+            buckets.append((f"{rule}:{value}", seconds / requests, requests))
+        retry_afters = await self.store.take(buckets, time.time())
+        limited = [(retry_after, rule) for (rule, _), retry_after in zip(checks, retry_afters) if retry_after]
+        if not limited:
+            for rule, _ in checks:
+                self.counters[rule]["allowed"] += 1
+            return None, 0.0
+        for _, rule in limited:
+            self.counters[rule]["limited"] += 1
+        retry_after, rule = max(limited)
+        return rule, retry_after
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"store": RATE_LIMIT_STORE, "keys": self.store.size(), "rules": self.counters}
+
+
+rate_limiter = RateLimiter(RATE_LIMITS, MemoryBucketStore(RATE_LIMIT_MAX_KEYS))
+
+
+def configure_rate_limit_store(engine, table):
+    """Switch to the shared MySQL store when RATE_LIMIT_STORE=mysql"""
+    if RATE_LIMIT_STORE == "mysql":
+        rate_limiter.store = MySQLBucketStore(engine, table)
+
+
+def rate_limited(group: str):
+    """Dependency limiting a route group per client IP and, if the JSON body has one, per email"""
+
+    async def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        checks = []
+        if f"{group}.ip" in rate_limiter.limits and request.client:
+            checks.append((f"{group}.ip", request.client.host))
+        if f"{group}.email" in rate_limiter.limits:
+            try:
+                body = await request.json()  # cached on the request, FastAPI reuses it
+            except ValueError:
+                body = None
+            email = body.get("email") if isinstance(body, dict) else None
+            if isinstance(email, str) and email.strip():
+                checks.append((f"{group}.email", email.strip().lower()))
+
+        if not checks:
+            return
+        # every bucket is checked before any is charged, so a request the email rule
+        # rejects does not also spend the caller's IP token
+        rule, retry_after = await rate_limiter.check(checks)
+        if rule:
+            logger.warning("Rate limited %s for %s", rule, dict(checks)[rule])
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return dependency
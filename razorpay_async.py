@@ -0,0 +1,247 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
+
+from tracing import span
+from deadlines import DeadlineExceeded, raise_if_expired, timeout_for
+
+logger = logging.getLogger(__name__)
+
+# RAZORPAY_API_BASE lets local runs point at scripts/fake_razorpay.py
+RAZORPAY_API_BASE = os.getenv("RAZORPAY_API_BASE", "https://api.razorpay.com")
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv("RAZORPAY_CONNECT_TIMEOUT", "3"))
+RAZORPAY_READ_TIMEOUT = float(os.getenv("RAZORPAY_READ_TIMEOUT", "10"))
+# A slower response counts as a breaker failure even when the request deadline, not
+# RAZORPAY_READ_TIMEOUT, ended the wait (the /create-order/ budget is below the read timeout)
+RAZORPAY_SLOW_SECONDS = float(os.getenv("RAZORPAY_SLOW_SECONDS", "5"))
+RAZORPAY_MAX_CONNECTIONS = int(os.getenv("RAZORPAY_MAX_CONNECTIONS", "20"))
+RAZORPAY_MAX_RETRIES = int(os.getenv("RAZORPAY_MAX_RETRIES", "2"))
+RAZORPAY_RETRY_BACKOFF = float(os.getenv("RAZORPAY_RETRY_BACKOFF", "0.2"))
+# Circuit breaker: open after this many consecutive failures, probe again after the cooldown
+RAZORPAY_BREAKER_FAILURES = int(os.getenv("RAZORPAY_BREAKER_FAILURES", "5"))
+RAZORPAY_BREAKER_COOLDOWN = float(os.getenv("RAZORPAY_BREAKER_COOLDOWN", "30"))
+# How long a client-supplied idempotency key returns the order it created
+ORDER_IDEMPOTENCY_TTL = float(os.getenv("ORDER_IDEMPOTENCY_TTL", "900"))
+ORDER_IDEMPOTENCY_MAX_KEYS = int(os.getenv("ORDER_IDEMPOTENCY_MAX_KEYS", "10000"))
+
+
+class RazorpayError(Exception):
+    """Razorpay answered with an error status"""
+
+    def __init__(self, status_code: int, description: str):
+        super().__init__(description)
+        self.status_code = status_code
+        self.description = description
+
+
+class RazorpayUnavailable(Exception):
+    """Razorpay could not be reached, or the circuit breaker is open"""
+
+
+class IdempotencyConflict(Exception):
+    """The idempotency key was already used for a different request"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True  # let exactly one trial call through
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Razorpay circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                logger.warning("Razorpay circuit opened after %d consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class AsyncRazorpayClient:
+    """Pooled, timed-out, retrying Razorpay client for the calls the endpoints make"""
+
+    def __init__(self, base_url: str, key_id: Optional[str], key_secret: Optional[str]):
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(key_id or "", key_secret or ""),
+            timeout=httpx.Timeout(RAZORPAY_READ_TIMEOUT, connect=RAZORPAY_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=RAZORPAY_MAX_CONNECTIONS,
+                                max_keepalive_connections=RAZORPAY_MAX_CONNECTIONS,
+                                keepalive_expiry=60),
+        )
+        self.breaker = CircuitBreaker(RAZORPAY_BREAKER_FAILURES, RAZORPAY_BREAKER_COOLDOWN)
+        # idempotency key -> (expires_at, request fingerprint, future of the order)
+        self._orders: "OrderedDict[str, tuple]" = OrderedDict()
+        self.counters = {"requests": 0, "retries": 0, "failures": 0, "short_circuited": 0, "idempotent_hits": 0}
+
+    async def create_order(self, data: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Create an order; repeating an idempotency key returns the order it already created"""
+        if not idempotency_key:
+            return await self._create_order(data)
+
+        now = time.monotonic()
+        self._expire(now)
+        fingerprint = (data.get("amount"), data.get("currency"))
+        cached = self._orders.get(idempotency_key)
+        if cached:
+            _, cached_fingerprint, future = cached
+            if cached_fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency key was already used for a different order")
+            self.counters["idempotent_hits"] += 1
+            # a double submit while the first call is still running waits for that call
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._orders[idempotency_key] = (now + ORDER_IDEMPOTENCY_TTL, fingerprint, future)
+        try:
+            order = await self._create_order({**data, "receipt": idempotency_key[:40]})
+        except BaseException as e:
+            # failures are not cached, so the client can retry with the same key
+            self._orders.pop(idempotency_key, None)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            elif not future.done():
+                future.set_exception(e)
+                future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        future.set_result(order)
+        return order
+
+    async def _create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        with span("razorpay.order.create", amount=data.get("amount")):
+            # order creation is not idempotent on Razorpay's side, so only retry when
+            # the request cannot have reached it
+            return await self._request("POST", "/v1/orders", json=data, retry_unsent_only=True)
+
+    async def _request(self, method: str, path: str, retry_unsent_only: bool = False, **kwargs) -> Dict[str, Any]:
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise RazorpayUnavailable("Razorpay circuit breaker is open")
+        probe = self.breaker.probing
+        try:
+            return await self._attempt(method, path, retry_unsent_only, **kwargs)
+        finally:
+            # A probe cut short by cancellation or the deadline proves nothing either way;
+            # let the next call probe instead of leaving the circuit stuck half open
+            if probe and self.breaker.probing:
+                self.breaker.probing = False
+
+    async def _attempt(self, method: str, path: str, retry_unsent_only: bool, **kwargs) -> Dict[str, Any]:
+        error, razorpay_failed = None, False
+        try:
+            for attempt in range(RAZORPAY_MAX_RETRIES + 1):
+                if attempt:
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(RAZORPAY_RETRY_BACKOFF * 2 ** (attempt - 1))
+                # each attempt only gets what is left of the request's deadline
+                timeout = timeout_for("razorpay", RAZORPAY_READ_TIMEOUT)
+                self.counters["requests"] += 1
+                started = time.monotonic()
+                try:
+                    response = await self._http.request(
+                        method, path, timeout=httpx.Timeout(timeout, connect=min(timeout, RAZORPAY_CONNECT_TIMEOUT)),
+                        **kwargs)
+                except httpx.PoolTimeout as e:
+                    razorpay_failed = False  # waiting for our own pool, not for Razorpay
+                    raise_if_expired("razorpay")
+                    error = RazorpayUnavailable(f"Could not reach Razorpay: {e!r}")
+                    continue
+                except httpx.TransportError as e:
+                    razorpay_failed = _razorpay_to_blame(e, time.monotonic() - started)
+                    raise_if_expired("razorpay")
+                    error = RazorpayUnavailable(f"Razorpay request failed: {e!r}")
+                    if retry_unsent_only and not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                        break
+                    continue
+
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response.json()
+                error = RazorpayError(response.status_code, _error_description(response))
+                if response.status_code < 500 and response.status_code != 429:
+                    # a client error says nothing about Razorpay's health
+                    self.breaker.record_success()
+                    raise error
+                razorpay_failed = True
+                if response.status_code >= 500 and retry_unsent_only:
+                    break
+        except DeadlineExceeded:
+            # out of budget, but still a breaker failure when Razorpay's errors or
+            # slowness were what used the budget up
+            if razorpay_failed:
+                self._record_failure()
+            raise
+
+        self._record_failure()
+        raise error
+
+    def _record_failure(self):
+        self.counters["failures"] += 1
+        self.breaker.record_failure()
+
+    def _expire(self, now: float):
+        orders = self._orders
+        while orders:
+            key = next(iter(orders))
+            if len(orders) <= ORDER_IDEMPOTENCY_MAX_KEYS and orders[key][0] > now:
+                break
+            del orders[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.counters, "circuit": self.breaker.state, "idempotency_keys": len(self._orders)}
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+def _razorpay_to_blame(error: httpx.TransportError, waited: float) -> bool:
+    """Whether a failed attempt counts against Razorpay even if the deadline cut it short.
+
+    Errors other than timeouts always do. A timeout only does after a fair wait: the
+    full connect timeout, or RAZORPAY_SLOW_SECONDS for a response, which is longer
+    than a healthy Razorpay ever takes but shorter than the capped per-request budget.
+    """
+    if isinstance(error, httpx.ConnectTimeout):
+        return waited >= min(RAZORPAY_CONNECT_TIMEOUT, RAZORPAY_SLOW_SECONDS)
+    if isinstance(error, httpx.TimeoutException):
+        return waited >= RAZORPAY_SLOW_SECONDS
+    return True
+
+
+def _error_description(response: httpx.Response) -> str:
+    try:
+        return response.json()["error"]["description"]
+    except (ValueError, KeyError, TypeError):
+        return f"Razorpay returned HTTP {response.status_code}"
+
+
+razorpay_api = AsyncRazorpayClient(RAZORPAY_API_BASE, os.getenv("RAZORPAY_KEY_ID"), os.getenv("RAZORPAY_KEY_SECRET"))
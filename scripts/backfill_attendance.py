@@ -0,0 +1,70 @@
+"""Backfill contact_attendance from the legacy string flags on crm_contacts.
+
+Walks crm_contacts in primary-key order, one batch per transaction, and upserts
+one contact_attendance row per recognised flag (mmml, Mum, Blr, MMML_Account and
+status = "waitlisted"). It is idempotent, so it can be re-run after bulk imports
+that only set the legacy columns.
+
+    python -m scripts.backfill_attendance --batch-size 5000
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+
+from main import LEGACY_ATTENDANCE_COLUMNS, Contact, ContactAttendance, engine
+
+
+def legacy_rows(contact_row, now):
+    """Translate one contact's legacy flags into contact_attendance rows"""
+    rows = []
+    for event, (column, yes_value, no_value) in LEGACY_ATTENDANCE_COLUMNS.items():
+        value = getattr(contact_row, column)
+        if value is None:
+            continue
+        value = value.strip().lower()
+        if value == yes_value.lower():
+            active = True
+        elif no_value is not None and value == no_value.lower():
+            active = False
+        else:
+            continue
+        rows.append({"contact_id": contact_row.id, "event": event, "active": active, "updated_at": now})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--start-id", type=int, default=0, help="resume after this crm_contacts.id")
+    args = parser.parse_args()
+
+    columns = [Contact.id] + [getattr(Contact, column) for column, _, _ in LEGACY_ATTENDANCE_COLUMNS.values()]
+    upsert = insert(ContactAttendance.__table__)
+    upsert = upsert.on_duplicate_key_update(active=upsert.inserted.active, updated_at=upsert.inserted.updated_at)
+
+    last_id, contacts, written = args.start_id, 0, 0
+    started = time.perf_counter()
+    while True:
+        with engine.begin() as conn:
+            batch = conn.execute(
+                select(*columns).where(Contact.id > last_id).order_by(Contact.id).limit(args.batch_size)
+            ).all()
+            if not batch:
+                break
+            now = datetime.utcnow()
+            rows = [row for contact_row in batch for row in legacy_rows(contact_row, now)]
+            if rows:
+                conn.execute(upsert, rows)
+        last_id = batch[-1].id
+        contacts += len(batch)
+        written += len(rows)
+        print(f"up to id {last_id}: {contacts} contacts, {written} attendance rows")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
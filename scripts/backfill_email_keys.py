@@ -0,0 +1,71 @@
+"""Backfill email_normalized on every table that stores an email.
+
+Walks each table in primary-key order, one batch per transaction, and sets
+email_normalized = emails.normalize_email(email) where it is missing. With
+--recompute every row is rewritten, which is needed after the normalization
+rules (or EMAIL_PROVIDER_NORMALIZATION) change. It is idempotent and resumable.
+
+    python -m scripts.backfill_email_keys --batch-size 5000
+    python -m scripts.backfill_email_keys --tables crm_contacts --recompute
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, select, update
+
+from emails import normalize_email
+from main import (Contact, ContactMessage, EventRegistration, PartnershipProposal, SpeakerApplication,
+                  SponsorshipInquiry, User, VolunteerApplication, engine)
+
+MODELS = [User, EventRegistration, ContactMessage, SpeakerApplication, SponsorshipInquiry,
+          PartnershipProposal, VolunteerApplication, Contact]
+
+
+def backfill(table, batch_size: int, recompute: bool, start_id: int):
+    pk = table.primary_key.columns[0]
+    stmt = (
+        update(table)
+        .where(pk == bindparam("b_id"))
+        .values(email_normalized=bindparam("b_email_normalized"))
+    )
+    last_id, scanned, written = start_id, 0, 0
+    while True:
+        with engine.begin() as conn:
+            query = select(pk, table.c.email, table.c.email_normalized).where(pk > last_id)
+            if not recompute:
+                query = query.where(table.c.email_normalized.is_(None))
+            batch = conn.execute(query.order_by(pk).limit(batch_size)).all()
+            if not batch:
+                break
+            rows = []
+            for row_id, email, current in batch:
+                normalized = normalize_email(email)
+                if normalized != current:
+                    rows.append({"b_id": row_id, "b_email_normalized": normalized})
+            if rows:
+                conn.execute(stmt, rows)
+        last_id = batch[-1][0]
+        scanned += len(batch)
+        written += len(rows)
+        print(f"{table.name}: up to id {last_id}: {scanned} rows scanned, {written} updated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--tables", nargs="*", help="only these tables (default: all)")
+    parser.add_argument("--recompute", action="store_true", help="rewrite rows that already have a key")
+    parser.add_argument("--start-id", type=int, default=0, help="resume after this primary key")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for model in MODELS:
+        table = model.__table__
+        if args.tables and table.name not in args.tables:
+            continue
+        backfill(table, args.batch_size, args.recompute, args.start_id)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
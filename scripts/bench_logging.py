@@ -0,0 +1,68 @@
+"""Compare the per-request cost of logging on the request thread.
+
+Runs the old apply_coupon logging pattern (six f-string info lines through a
+synchronous StreamHandler) against the new one (one lazy info line through the
+queue pipeline), writing to /dev/null so only the caller-side cost is measured.
+
+    python -m scripts.bench_logging --iterations 20000
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+
+import logging_config
+
+
+def old_pattern(logger, code, venue, product, amount):
+    logger.info(f"Coupon code: {code}")
+    logger.info(f"Venue: {venue}")
+    logger.info(f"Product resolved: {product}")
+    logger.info(f"Amount: {amount}")
+    logger.info(f"Current UTC time: {datetime.utcnow()}")
+    logger.info(f"SELECT ... WHERE code = '{code}' AND product = '{product}'")
+
+
+def new_pattern(logger, code, venue, product, amount):
+    logger.info("Apply coupon: code=%s venue=%s product=%s amount=%s", code, venue, product, amount)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Coupon query: %s", code)
+
+
+def run(pattern, logger, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        pattern(logger, f"SAVE{i % 50}", "Bangalore", "MMML_BLR", 4999.0)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, "w")
+    root = logging.getLogger()
+
+    # Baseline: what logging.basicConfig(level=INFO) gave us
+    root.handlers = [logging.StreamHandler(devnull)]
+    root.handlers[0].setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    root.setLevel(logging.INFO)
+    logger = logging.getLogger("bench")
+    old_us = run(old_pattern, logger, args.iterations)
+
+    # Queue pipeline with JSON records
+    logging_config.LOG_QUEUE_SIZE = args.iterations * 2
+    logging_config.setup_logging()
+    logging_config._listener.handlers[0].setStream(devnull)
+    new_us = run(new_pattern, logger, args.iterations)
+    logging_config.shutdown_logging()
+
+    print(f"old (sync, 6 f-string lines):  {old_us:8.2f} us/request")
+    print(f"new (queued, 1 lazy line):     {new_us:8.2f} us/request")
+    print(f"new / old:                     {new_us / old_us:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
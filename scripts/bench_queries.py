@@ -0,0 +1,121 @@
+"""Benchmark the hot read queries: full ORM entities vs. the projected statements built at import.
+
+Runs against the database configured for main.py (DATABASE_URL / DB_*). With
+--seed it first inserts one row per table for the benchmark email, coupon and
+payment, including large Text values so deferred-column savings show up.
+
+    python -m scripts.bench_queries --seed --iterations 2000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_
+
+from main import (
+    EVENT_MMML_ACCOUNT, Contact, ContactAttendance, Coupon, DiscountType, EventRegistration,
+    ProcessedPayment, SessionLocal, fetch_account_flag, fetch_account_profile, fetch_valid_coupon,
+    payment_already_processed, registration_exists,
+)
+
+EMAIL = "bench.queries@example.com"
+COUPON = "BENCHQUERIES"
+PRODUCT = "MMML_BLR"
+PAYMENT_ID = "pay_benchqueries"
+VENUE = "Bangalore"
+
+
+def seed(db):
+    if db.query(Contact.id).filter(Contact.email == EMAIL).first():
+        return
+    contact = Contact(
+        firstname="Bench", lastname="Queries", fullname="Bench Queries", email=EMAIL,
+        years_of_experience="5", dietary_preference="none",
+        mmml_membership_application="x" * 20000, fintellect="y" * 5000,
+    )
+    contact.set_attendance(EVENT_MMML_ACCOUNT, True)
+    db.add(contact)
+    db.add(Coupon(code=COUPON, product=PRODUCT, discount_type=DiscountType.flat, discount_value=100,
+                  max_usage=1000, used_count=0, expiry_date=datetime.utcnow() + timedelta(days=365)))
+    db.add(ProcessedPayment(payment_id=PAYMENT_ID))
+    db.add(EventRegistration(first_name="Bench", last_name="Queries", email=EMAIL, phone_number="0",
+                             Venue=VENUE, topics_of_interest="z" * 5000))
+    db.commit()
+
+
+# Old implementations, as the endpoints were written before the fast path
+def orm_check_account(db):
+    contact = db.query(Contact).filter(Contact.email == EMAIL).first()
+    return contact and contact.MMML_Account
+
+
+def orm_logged_in_user(db):
+    return db.query(Contact).join(ContactAttendance, and_(
+        ContactAttendance.contact_id == Contact.id,
+        ContactAttendance.event == EVENT_MMML_ACCOUNT,
+        ContactAttendance.active.is_(True),
+    )).filter(Contact.email == EMAIL).first()
+
+
+def orm_coupon(db):
+    return db.query(Coupon).filter(
+        Coupon.code == COUPON, Coupon.product == PRODUCT,
+        Coupon.expiry_date > datetime.utcnow(), Coupon.used_count < Coupon.max_usage,
+    ).first()
+
+
+def orm_payment(db):
+    return db.query(ProcessedPayment).filter(ProcessedPayment.payment_id == PAYMENT_ID).first() is not None
+
+
+def orm_registration(db):
+    return db.query(EventRegistration).filter(
+        EventRegistration.email == EMAIL, EventRegistration.Venue == VENUE,
+    ).first() is not None
+
+
+CASES = [
+    ("check_account", orm_check_account, lambda db: fetch_account_flag(db, EMAIL)),
+    ("get_logged_in_user", orm_logged_in_user, lambda db: fetch_account_profile(db, EMAIL)),
+    ("apply_coupon", orm_coupon, lambda db: fetch_valid_coupon(db, COUPON, PRODUCT, datetime.utcnow())),
+    ("webhook payment check", orm_payment, lambda db: payment_already_processed(db, PAYMENT_ID)),
+    ("webhook registration check", orm_registration, lambda db: registration_exists(db, EMAIL, VENUE)),
+]
+
+
+def measure(func, iterations):
+    # a fresh session per call, like a request, so the identity map never serves the result
+    start = time.perf_counter()
+    for _ in range(iterations):
+        db = SessionLocal()
+        try:
+            func(db)
+        finally:
+            db.close()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", action="store_true", help="insert the benchmark rows first")
+    args = parser.parse_args()
+
+    if args.seed:
+        db = SessionLocal()
+        try:
+            seed(db)
+        finally:
+            db.close()
+
+    print(f"{'query':28s} {'orm us':>10s} {'fast us':>10s} {'speed-up':>9s}")
+    for name, orm_func, fast_func in CASES:
+        measure(orm_func, min(args.iterations, 100))  # warm caches
+        measure(fast_func, min(args.iterations, 100))
+        orm_us = measure(orm_func, args.iterations)
+        fast_us = measure(fast_func, args.iterations)
+        print(f"{name:28s} {orm_us:10.1f} {fast_us:10.1f} {orm_us / fast_us:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare per-request commits with the group-commit write buffer for form inserts.
+
+Runs N concurrent submitters against the database configured for main.py
+(DATABASE_URL / DB_*), each inserting contact_messages rows, first with one
+INSERT + COMMIT per row on its own session and then through WriteBuffer. Reports
+rows/s, commits and per-row latency for both.
+
+    python -m scripts.bench_write_buffer --rows 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from main import ContactMessage, SessionLocal, engine
+from sqlalchemy import insert
+from write_buffer import WriteBuffer
+
+
+def row(i):
+    return {
+        "salutation": "Ms", "first_name": f"Bench{i}", "last_name": "Buffer",
+        "email": f"bench.buffer{i}@example.com", "company_organization": "Bench",
+        "message": "write buffer benchmark", "created_at": datetime.utcnow(),
+    }
+
+
+def insert_direct(values):
+    db = SessionLocal()
+    try:
+        result = db.execute(insert(ContactMessage.__table__).values(**values))
+        db.commit()
+        return result.inserted_primary_key[0]
+    finally:
+        db.close()
+
+
+async def run(submit, rows, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await submit(row(i))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(rows)))
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def report(name, rows, elapsed, latencies, commits):
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:10s} {rows / elapsed:9.0f} rows/s {commits:7d} commits "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100, help="in-flight submissions")
+    parser.add_argument("--threads", type=int, default=40, help="threadpool size for the direct path")
+    parser.add_argument("--max-delay-ms", type=float, default=5)
+    parser.add_argument("--max-rows", type=int, default=100)
+    args = parser.parse_args()
+
+    # the direct path runs in threads, like a sync endpoint in AnyIO's threadpool
+    direct_threads = asyncio.Semaphore(args.threads)
+
+    async def direct(values):
+        async with direct_threads:
+            return await asyncio.to_thread(insert_direct, values)
+
+    elapsed, latencies = await run(direct, args.rows, args.concurrency)
+    report("direct", args.rows, elapsed, latencies, args.rows)
+
+    buffer = WriteBuffer(engine, args.max_delay_ms, args.max_rows, report_seconds=0)
+    await buffer.start()
+    elapsed, latencies = await run(lambda values: buffer.insert(ContactMessage, values), args.rows, args.concurrency)
+    await buffer.stop()
+    report("buffered", args.rows, elapsed, latencies, buffer.stats.commits)
+    print(buffer.stats.snapshot())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,380 @@
+"""Find and merge near-duplicate crm_contacts rows.
+
+`find` streams crm_contacts once and gives every row a few blocking keys: the
+provider-normalized email, the normalized phone number, the sorted name tokens
+(so swapped firstname/lastname still match) and the email local part. Keys are
+hashed to 64-bit integers and spilled to a SQLite work file, so memory stays flat
+at millions of rows. Only rows sharing a key are compared, never all pairs, and
+blocks larger than --max-block (common names, info@ addresses) are skipped.
+Each candidate pair is scored and written to a CSV for review:
+
+    python -m scripts.dedupe_contacts find --out candidates.csv --auto-approve 0.95
+
+`apply` merges the rows marked approve=yes. Approved pairs are joined into
+clusters; the lowest id survives, its empty columns are filled from the
+duplicates, attendance is combined, and the duplicates are deleted. Clusters are
+merged in batched transactions under row locks, and every merge is logged.
+A cluster is held back, and listed in --held, when a duplicate's email is not
+the survivor's and has a users row: deleting that contact would leave the login
+without an MMML account or profile, so those are merged by hand.
+
+    python -m scripts.dedupe_contacts apply candidates.csv --log merges.csv --batch-size 200
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from emails import normalize_email
+from main import CacheChange, Contact, ContactAttendance, ContactEmailKey, User, engine, legacy_attendance_values
+
+SALUTATIONS = {"mr", "mrs", "ms", "miss", "dr", "prof", "shri", "smt"}
+# shared mailboxes say nothing about the person behind them
+GENERIC_LOCAL_PARTS = {"info", "contact", "admin", "hello", "hi", "sales", "support", "office", "mail", "hr",
+                       "team", "careers", "jobs", "test", "enquiry", "enquiries"}
+
+# Columns filled on the surviving row when it has no value of its own
+FILL_COLUMNS = [
+    "salutation", "fullname", "firstname", "lastname", "designation", "company", "phone", "location",
+    "linkedin", "coupon_code", "years_of_experience", "dietary_preference", "about_mmml", "status",
+    "fintellect", "mmml_membership_application",
+]
+# Columns where the latest value wins
+LATEST_COLUMNS = ["last_emailed", "mmml_time"]
+
+_word = re.compile(r"[^\W\d_]+")
+
+
+def normalize_phone(phone):
+    """Last 10 digits, so +91 98765 43210, 098765-43210 and 9876543210 match; None if too short"""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) < 7:
+        return None
+    return digits[-10:]
+
+
+def name_tokens(*names):
+    tokens = set()
+    for name in names:
+        tokens.update(token for token in _word.findall((name or "").lower()) if token not in SALUTATIONS)
+    return " ".join(sorted(tokens)) or None
+
+
+def email_local_part(email_key):
+    local = (email_key or "").partition("@")[0].replace(".", "")
+    if len(local) < 4 or local in GENERIC_LOCAL_PARTS:
+        return None
+    return local
+
+
+def blocking_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def features(row):
+    email_key = normalize_email(row.email, provider_rules=True)
+    return {
+        "id": row.id,
+        "email": row.email,
+        "email_key": email_key,
+        "local": email_local_part(email_key),
+        "phone": normalize_phone(row.phone),
+        "tokens": name_tokens(row.firstname, row.lastname, row.fullname),
+        "name": row.fullname or " ".join(filter(None, [row.firstname, row.lastname])),
+        "company": (row.company or "").strip().lower() or None,
+    }
+
+
+def blocking_keys(contact):
+    for prefix, field in (("e", "email_key"), ("p", "phone"), ("n", "tokens"), ("l", "local")):
+        if contact[field]:
+            yield blocking_hash(f"{prefix}:{contact[field]}")
+
+
+def score(a, b):
+    """0..1 likelihood that two contacts are the same person, with the reasons"""
+    points, reasons = 0.0, []
+    if a["email_key"] and a["email_key"] == b["email_key"]:
+        points += 0.6
+        reasons.append("email")
+    elif a["local"] and a["local"] == b["local"]:
+        points += 0.15
+        reasons.append("email_local_part")
+    if a["phone"] and a["phone"] == b["phone"]:
+        points += 0.3
+        reasons.append("phone")
+    if a["tokens"] and b["tokens"]:
+        tokens_a, tokens_b = set(a["tokens"].split()), set(b["tokens"].split())
+        overlap = len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+        if overlap:
+            points += 0.3 * overlap
+            reasons.append("name" if overlap == 1 else f"name~{overlap:.2f}")
+    if a["company"] and a["company"] == b["company"]:
+        points += 0.05
+        reasons.append("company")
+    return min(points, 1.0), reasons
+
+
+def find(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="dedupe_contacts_")
+    work_path = os.path.join(workdir, "dedupe.sqlite3")
+    if os.path.exists(work_path):
+        os.remove(work_path)
+    work = sqlite3.connect(work_path)
+    work.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE contacts (id INTEGER PRIMARY KEY, email TEXT, email_key TEXT, local TEXT, phone TEXT,
+                               tokens TEXT, name TEXT, company TEXT);
+        CREATE TABLE blocks (key INTEGER NOT NULL, id INTEGER NOT NULL);
+        CREATE TABLE pairs (a INTEGER NOT NULL, b INTEGER NOT NULL, PRIMARY KEY (a, b)) WITHOUT ROWID;
+    """)
+    started = time.perf_counter()
+
+    # 1. one pass over crm_contacts: features and blocking keys
+    columns = (Contact.id, Contact.email, Contact.phone, Contact.firstname, Contact.lastname, Contact.fullname,
+               Contact.company)
+    last_id, scanned = 0, 0
+    while True:
+        with engine.connect() as conn:
+            batch = conn.execute(
+                select(*columns).where(Contact.id > last_id).order_by(Contact.id).limit(args.batch_size)
+            ).all()
+        if not batch:
+            break
+        contacts = [features(row) for row in batch]
+        work.executemany(
+            "INSERT INTO contacts VALUES (:id, :email, :email_key, :local, :phone, :tokens, :name, :company)",
+            contacts)
+        work.executemany("INSERT INTO blocks VALUES (?, ?)",
+                         [(key, contact["id"]) for contact in contacts for key in blocking_keys(contact)])
+        work.commit()
+        last_id = batch[-1].id
+        scanned += len(batch)
+        print(f"scanned {scanned} contacts (up to id {last_id})")
+
+    # 2. candidate pairs: every pair inside each block of a manageable size
+    work.execute("CREATE INDEX blocks_key ON blocks (key, id)")
+    oversized = 0
+    blocks = work.execute("SELECT key, group_concat(id), count(*) FROM blocks GROUP BY key HAVING count(*) > 1")
+    pair_cursor = work.cursor()
+    for _, ids, size in blocks:
+        if size > args.max_block:
+            oversized += 1
+            continue
+        ids = sorted({int(i) for i in ids.split(",")})
+        pair_cursor.executemany("INSERT OR IGNORE INTO pairs VALUES (?, ?)", itertools.combinations(ids, 2))
+    work.commit()
+    pair_count = work.execute("SELECT count(*) FROM pairs").fetchone()[0]
+    print(f"{pair_count} candidate pairs, {oversized} blocks over {args.max_block} rows skipped")
+
+    # 3. score the pairs
+    fields = ("id", "email", "email_key", "local", "phone", "tokens", "name", "company")
+    select_pairs = f"""
+        SELECT {", ".join("a." + f for f in fields)}, {", ".join("b." + f for f in fields)}
+        FROM pairs JOIN contacts a ON a.id = pairs.a JOIN contacts b ON b.id = pairs.b
+    """
+    written = 0
+    with open(args.out, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["survivor_id", "duplicate_id", "score", "reasons", "survivor_email", "duplicate_email",
+                         "survivor_name", "duplicate_name", "approve"])
+        for row in work.execute(select_pairs):
+            a, b = dict(zip(fields, row[:len(fields)])), dict(zip(fields, row[len(fields):]))
+            points, reasons = score(a, b)
+            if points < args.min_score:
+                continue
+            approve = "yes" if args.auto_approve is not None and points >= args.auto_approve else ""
+            writer.writerow([a["id"], b["id"], f"{points:.2f}", " ".join(reasons), a["email"], b["email"],
+                             a["name"], b["name"], approve])
+            written += 1
+    work.close()
+    if not args.workdir:
+        os.remove(work_path)
+        os.rmdir(workdir)
+    print(f"Wrote {written} merge candidates to {args.out} in {time.perf_counter() - started:.1f}s")
+
+
+class DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+def approved_clusters(path):
+    """Clusters of contact ids joined by approved pairs, each sorted so the survivor is first"""
+    clusters = DisjointSet()
+    with open(path, newline="") as candidates:
+        for row in csv.DictReader(candidates):
+            if row.get("approve", "").strip().lower() in ("yes", "y", "1", "true"):
+                clusters.union(int(row["survivor_id"]), int(row["duplicate_id"]))
+    members = {}
+    for contact_id in clusters.parent:
+        members.setdefault(clusters.find(contact_id), []).append(contact_id)
+    return [sorted(ids) for ids in members.values()]
+
+
+class LoginConflict(Exception):
+    """A duplicate with a different email has a users row, so its contact must stay"""
+
+    def __init__(self, survivor, duplicates):
+        super().__init__(f"{', '.join(row.email for row in duplicates)} have their own login, "
+                         f"not merged into {survivor.id} ({survivor.email})")
+        self.survivor = survivor
+        self.duplicates = duplicates
+
+
+def login_duplicates(conn, survivor, duplicates):
+    """Duplicates whose email differs from the survivor's and belongs to a users row"""
+    survivor_key = normalize_email(survivor.email)
+    other = {normalize_email(row.email): row for row in duplicates if row.email}
+    other.pop(survivor_key, None)
+    if not other:
+        return []
+    users = User.__table__
+    logins = set(conn.execute(select(users.c.email_normalized).where(users.c.email_normalized.in_(other))).scalars())
+    return [row for key, row in other.items() if key in logins]
+
+
+def merge_cluster(conn, ids, now):
+    """Merge one cluster into its lowest id; returns the merged rows or None if nothing to do.
+
+    Raises LoginConflict, before changing anything, when a duplicate's own login would
+    lose its contact (matched on phone or name, not on the email).
+    """
+    contacts = Contact.__table__
+    attendance = ContactAttendance.__table__
+    rows = conn.execute(select(contacts).where(contacts.c.id.in_(ids)).order_by(contacts.c.id).with_for_update()).all()
+    if len(rows) < 2 or rows[0].id != ids[0]:
+        return None  # already merged, or the survivor is gone
+    survivor, duplicates = rows[0], rows[1:]
+    conflicts = login_duplicates(conn, survivor, duplicates)
+    if conflicts:
+        raise LoginConflict(survivor, conflicts)
+
+    values = {}
+    for column in FILL_COLUMNS:
+        if getattr(survivor, column) in (None, ""):
+            value = next((getattr(row, column) for row in duplicates if getattr(row, column) not in (None, "")), None)
+            if value is not None:
+                values[column] = value
+    for column in LATEST_COLUMNS:
+        latest = max((getattr(row, column) for row in rows if getattr(row, column)), default=None)
+        if latest is not None and latest != getattr(survivor, column):
+            values[column] = latest
+
+    # attendance: active if active for any of the merged rows
+    merged = {}
+    for contact_id, event, active in conn.execute(
+            select(attendance.c.contact_id, attendance.c.event, attendance.c.active)
+            .where(attendance.c.contact_id.in_([row.id for row in rows]))):
+        merged[event] = merged.get(event, False) or bool(active)
+    for event, active in merged.items():
+        values.update(legacy_attendance_values(event, active))
+        upsert = mysql_insert(attendance).values(contact_id=survivor.id, event=event, active=active, updated_at=now)
+        conn.execute(upsert.on_duplicate_key_update(active=active, updated_at=now))
+
+    duplicate_ids = [row.id for row in duplicates]
+    conn.execute(delete(attendance).where(attendance.c.contact_id.in_(duplicate_ids)))
+    conn.execute(delete(contacts).where(contacts.c.id.in_(duplicate_ids)))
+    email_keys = ContactEmailKey.__table__
+    conn.execute(update(email_keys).where(email_keys.c.contact_id.in_(duplicate_ids)).values(contact_id=survivor.id))
+    values["updated_at"] = now
+    conn.execute(update(contacts).where(contacts.c.id == survivor.id).values(**values))
+
+    # running workers drop their cached copies of every merged email
+    keys = {normalize_email(row.email) for row in rows if row.email}
+    if keys:
+        conn.execute(insert(CacheChange.__table__), [{"entity": "contact", "entity_key": key} for key in keys])
+    return survivor, duplicates
+
+
+def apply(args):
+    clusters = approved_clusters(args.candidates)
+    print(f"{len(clusters)} clusters, {sum(len(c) - 1 for c in clusters)} contacts to merge")
+    if args.dry_run:
+        for ids in clusters[:20]:
+            print(f"would merge {ids[1:]} into {ids[0]}")
+        return
+
+    merged_clusters, removed, skipped, held = 0, 0, 0, 0
+    started = time.perf_counter()
+    with open(args.log, "a", newline="") as log_file, open(args.held, "a", newline="") as held_file:
+        log = csv.writer(log_file)
+        held_log = csv.writer(held_file)
+        for start in range(0, len(clusters), args.batch_size):
+            batch = clusters[start:start + args.batch_size]
+            now = datetime.utcnow()
+            entries = []
+            with engine.begin() as conn:
+                for ids in batch:
+                    try:
+                        result = merge_cluster(conn, ids, now)
+                    except LoginConflict as e:
+                        held += 1
+                        held_log.writerows([now.isoformat(), e.survivor.id, e.survivor.email, row.id, row.email]
+                                           for row in e.duplicates)
+                        continue
+                    if result is None:
+                        skipped += 1
+                        continue
+                    survivor, duplicates = result
+                    entries.extend([now.isoformat(), survivor.id, survivor.email, row.id, row.email]
+                                   for row in duplicates)
+                    merged_clusters += 1
+                    removed += len(duplicates)
+            # logged only once the batch has committed
+            log.writerows(entries)
+            log_file.flush()
+            held_file.flush()
+            print(f"{start + len(batch)}/{len(clusters)} clusters: {removed} contacts merged, {skipped} skipped, "
+                  f"{held} held")
+    print(f"Merged {merged_clusters} clusters ({removed} contacts) in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    find_parser = commands.add_parser("find", help="write scored merge candidates to a CSV")
+    find_parser.add_argument("--out", default="dedupe_candidates.csv")
+    find_parser.add_argument("--batch-size", type=int, default=10000)
+    find_parser.add_argument("--max-block", type=int, default=50, help="skip blocking keys shared by more rows")
+    find_parser.add_argument("--min-score", type=float, default=0.5)
+    find_parser.add_argument("--auto-approve", type=float, help="pre-approve pairs scoring at least this")
+    find_parser.add_argument("--workdir", help="keep the SQLite work file here instead of a temp dir")
+
+    apply_parser = commands.add_parser("apply", help="merge the approved pairs of a candidates CSV")
+    apply_parser.add_argument("candidates")
+    apply_parser.add_argument("--log", default="dedupe_merges.csv", help="appended with every merged row")
+    apply_parser.add_argument("--held", default="dedupe_held.csv",
+                              help="appended with the clusters held back because a duplicate's email has a login")
+    apply_parser.add_argument("--batch-size", type=int, default=200, help="clusters per transaction")
+    apply_parser.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+    find(args) if args.command == "find" else apply(args)
+
+
+if __name__ == "__main__":
+    main()
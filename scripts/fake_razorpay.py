@@ -0,0 +1,178 @@
+"""Local stand-in for the parts of the Razorpay API this backend uses.
+
+Serves a deterministic set of captured payments from GET /v1/payments (with the
+real API's from / to / count / skip paging, newest first) and creates orders on
+POST /v1/orders, so the reconciliation job, /create-order/ and load tests can run
+without touching Razorpay. Order creation can be slowed down or made to fail to
+exercise the client's timeouts, retries and circuit breaker.
+
+    python -m scripts.fake_razorpay --port 9000 --payments 50000
+    python -m scripts.fake_razorpay --order-delay-ms 200 --order-error-rate 0.2
+    RAZORPAY_API_BASE=http://127.0.0.1:9000 python -m scripts.reconcile_payments ...
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAX_PAGE_SIZE = 100
+
+
+def generate_payments(count, start_ts, end_ts, seed=0):
+    """Build captured payment entities shaped like the webhook's payload.payment.entity"""
+    rng = random.Random(seed)
+    venues = ["Mumbai", "Bangalore"]
+    step = max(1, (end_ts - start_ts) // max(count, 1))
+    payments = []
+    for i in range(count):
+        venue = venues[rng.random() < 0.4]
+        payments.append({
+            "id": f"pay_fake{i:010d}",
+            "entity": "payment",
+            "amount": 499900,
+            "currency": "INR",
+            "status": "captured" if rng.random() < 0.97 else "failed",
+            "email": f"attendee{i}@example.com",
+            "created_at": start_ts + i * step,
+            "notes": {
+                "email": f"attendee{i}@example.com",
+                "first_name": f"First{i}",
+                "last_name": f"Last{i}",
+                "venue": venue,
+                "phone_number": f"98{i:08d}"[-10:],
+                "years_of_experience": "5",
+                "dietary_restrictions": "none",
+                "extra": json.dumps({"venue_info": "to be announced"}),
+            },
+        })
+    payments.sort(key=lambda p: p["created_at"], reverse=True)
+    return payments
+
+
+class FakeRazorpay:
+    """In-memory Razorpay state served over HTTP on a background thread"""
+
+    def __init__(self, payments, host="127.0.0.1", port=0, order_delay_ms=0, order_error_rate=0.0, seed=0):
+        self.payments = payments
+        self.orders = {}
+        self.order_delay_ms = order_delay_ms
+        self.order_error_rate = order_error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def list_payments(self, query):
+        from_ts = int(query.get("from", ["0"])[0])
+        to_ts = int(query.get("to", [str(2 ** 40)])[0])
+        count = min(int(query.get("count", ["10"])[0]), MAX_PAGE_SIZE)
+        skip = int(query.get("skip", ["0"])[0])
+        with self.lock:
+            matching = [p for p in self.payments if from_ts <= p["created_at"] <= to_ts]
+        items = matching[skip:skip + count]
+        return {"entity": "collection", "count": len(items), "items": items}
+
+    def create_order(self, body):
+        """Return (status, response) for POST /v1/orders, after any injected delay or failure"""
+        if self.order_delay_ms:
+            time.sleep(self.order_delay_ms / 1000)
+        if not isinstance(body.get("amount"), int) or body["amount"] < 100:
+            return 400, {"error": {"code": "BAD_REQUEST_ERROR", "description": "The amount must be atleast INR 1.00"}}
+        with self.lock:
+            failed = self.rng.random() < self.order_error_rate
+            if not failed:
+                order_id = f"order_fake{len(self.orders):010d}"
+                order = {
+                    "id": order_id,
+                    "entity": "order",
+                    "amount": body.get("amount"),
+                    "amount_paid": 0,
+                    "amount_due": body.get("amount"),
+                    "currency": body.get("currency", "INR"),
+                    "receipt": body.get("receipt"),
+                    "status": "created",
+                    "attempts": 0,
+                    "notes": body.get("notes", []),
+                    "created_at": int(time.time()),
+                }
+                self.orders[order_id] = order
+        if failed:
+            return 500, {"error": {"code": "SERVER_ERROR", "description": "injected failure"}}
+        return 200, order
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.rstrip("/") == "/v1/payments":
+                    self._reply(200, fake.list_payments(parse_qs(url.query)))
+                else:
+                    self._reply(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = {}
+                if urlparse(self.path).path.rstrip("/") == "/v1/orders":
+                    self._reply(*fake.create_order(body))
+                else:
+                    self._reply(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "not found"}})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--payments", type=int, default=10000)
+    parser.add_argument("--from-ts", type=int, default=1767225600, help="first payment time (unix)")
+    parser.add_argument("--to-ts", type=int, default=1769904000, help="last payment time (unix)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--order-delay-ms", type=float, default=0, help="delay before answering POST /v1/orders")
+    parser.add_argument("--order-error-rate", type=float, default=0.0, help="fraction of order requests that fail with 500")
+    args = parser.parse_args()
+
+    fake = FakeRazorpay(generate_payments(args.payments, args.from_ts, args.to_ts, args.seed),
+                        args.host, args.port, args.order_delay_ms, args.order_error_rate, args.seed)
+    print(f"Fake Razorpay with {args.payments} payments at {fake.base_url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
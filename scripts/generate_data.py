@@ -0,0 +1,339 @@
+"""Bulk-load reproducible synthetic data for scale testing.
+
+Generates crm_contacts (with contact_attendance and, for account holders, users),
+event_registrations, processed_payments and Coupons at production-like proportions, with the skew and
+mess of the real tables: most attendees go to one venue, a few coupons get most
+redemptions, companies and email domains are long-tailed, a share of contacts are
+near-duplicates of others (gmail dots, +tags, googlemail.com, a second address)
+and repeat registrations come in with the email in different case.
+
+Rows are inserted in batches of multi-row INSERTs, one transaction per batch, with
+ids assigned up front so child rows need no round trip. The same --seed gives the
+same data on an empty database; on a non-empty one rows are appended after the
+current maximum ids.
+
+    python -m scripts.generate_data --contacts 2000000 --seed 7 --fast
+
+Only loads into a local database (localhost or SQLite) unless --allow-remote is given.
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from emails import normalize_email
+from main import (
+    EVENT_MMML, EVENT_MMML_ACCOUNT, LEGACY_ATTENDANCE_COLUMNS, VENUE_EVENTS, Contact, ContactAttendance, Coupon,
+    DiscountType, EventRegistration, ProcessedPayment, User, engine, pwd,
+)
+
+FIRST_NAMES = [
+    "Aarav", "Aditi", "Aditya", "Akash", "Amit", "Ananya", "Anil", "Anjali", "Arjun", "Asha", "Deepak", "Divya",
+    "Gaurav", "Isha", "Kavya", "Kiran", "Krishna", "Lakshmi", "Manish", "Meera", "Mohit", "Neha", "Nikhil",
+    "Nisha", "Pooja", "Pranav", "Priya", "Rahul", "Rajesh", "Ravi", "Riya", "Rohan", "Sachin", "Sanjay", "Sneha",
+    "Shreya", "Sunil", "Suresh", "Tanvi", "Varun", "Vikram", "Vivek", "Yash", "Zoya", "John", "Maria", "David",
+    "Sarah", "Mohammed", "Fatima",
+]
+LAST_NAMES = [
+    "Agarwal", "Bhat", "Chopra", "Das", "Desai", "Gupta", "Iyer", "Jain", "Joshi", "Kapoor", "Kulkarni", "Kumar",
+    "Menon", "Mehta", "Mishra", "Nair", "Patel", "Patil", "Pillai", "Rao", "Reddy", "Sharma", "Shah", "Singh",
+    "Sinha", "Srinivasan", "Thomas", "Verma", "Yadav", "Khan", "DSouza", "Fernandes", "Banerjee", "Chatterjee",
+    "Ghosh", "Hegde", "Krishnan", "Naidu", "Pandey", "Saxena",
+]
+# (domain, weight): a handful of providers hold most addresses
+EMAIL_DOMAINS = [("gmail.com", 45), ("yahoo.com", 8), ("outlook.com", 6), ("hotmail.com", 4),
+                 ("icloud.com", 2), ("rediffmail.com", 2)]
+COMPANY_WORDS = ["Data", "Quant", "Analytics", "Cloud", "Neural", "Vector", "Insight", "Signal", "Fin", "Health",
+                 "Retail", "Logic", "Matrix", "Tensor", "Pixel", "Cortex", "Delta", "Sigma", "Apex", "Nova"]
+COMPANY_SUFFIXES = ["Labs", "Technologies", "Solutions", "Systems", "AI", "Analytics", "Consulting", "Bank"]
+DESIGNATIONS = ["Data Scientist", "ML Engineer", "Software Engineer", "Analyst", "Manager", "Director", "Student",
+                "Researcher", "CTO", "Product Manager", "Consultant"]
+EXPERIENCE = ["0-2", "2-5", "5-10", "10-15", "15+"]
+DIETARY = ["Vegetarian", "Non-Vegetarian", "Vegan", "Jain", "None"]
+REFERRALS = ["LinkedIn", "Friend", "Email", "Twitter", "College", "Other"]
+TOPICS = ["LLMs", "MLOps", "Computer Vision", "Forecasting", "NLP", "Recommender Systems", "Fintech"]
+SALUTATIONS = ["Mr", "Ms", "Mrs", "Dr", None]
+COUPON_WORDS = ["EARLY", "STUDENT", "MMML", "SPEAKER", "PARTNER", "COMMUNITY", "ALUMNI", "FRIEND", "VIP", "GROUP"]
+
+
+def parse_weights(value):
+    """"Mumbai=0.7,Bangalore=0.3" -> ({"Mumbai": 0.7, "Bangalore": 0.3})"""
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def zipf_cum_weights(n, s):
+    """Cumulative Zipf weights for random.choices: rank k is drawn with p ~ 1/k^s"""
+    return list(itertools.accumulate(1 / k ** s for k in range(1, n + 1)))
+
+
+def next_id(conn, column):
+    return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+class Generator:
+    def __init__(self, args, contact_id, registration_id, payment_id, user_id):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.contact_id = contact_id
+        self.registration_id = registration_id
+        self.payment_id = payment_id
+        self.user_id = user_id
+        # every generated account logs in with the password "synthetic"; hashed once, it is slow
+        self.password_hash = pwd.hash("synthetic")
+        self.now = datetime(2026, 1, 1)  # fixed, so the same seed gives the same rows
+        self.venues = parse_weights(args.venues)
+        companies = [f"{a} {b} {c}" for a in COMPANY_WORDS for b in COMPANY_WORDS if a != b
+                     for c in COMPANY_SUFFIXES][:args.companies]
+        self.rng.shuffle(companies)
+        self.companies = companies
+        self.company_weights = zipf_cum_weights(len(companies), 1.1)
+        # coupon codes per product; a few per product take most of the redemptions
+        self.coupons = {}
+        for venue in self.venues:
+            product = VENUE_EVENTS[venue]
+            codes = [f"{self.rng.choice(COUPON_WORDS)}{product[-3:]}{n}" for n in range(args.coupons)]
+            self.coupons[product] = (codes, zipf_cum_weights(len(codes), args.coupon_skew))
+        self.redemptions = {}
+        self.registrations = 0
+        self.people = []  # recent people, the pool near-duplicates are drawn from
+        self.variant_emails = set()
+
+    def created_at(self):
+        # two years back, weighted towards recent months
+        return self.now - timedelta(days=730 * self.rng.random() ** 2, seconds=self.rng.randrange(86400))
+
+    def phone(self):
+        digits = f"{self.rng.choice('6789')}{self.rng.randrange(10 ** 9):09d}"
+        style = self.rng.random()
+        if style < 0.6:
+            return digits
+        if style < 0.85:
+            return f"+91 {digits[:5]} {digits[5:]}"
+        return f"0{digits}"
+
+    def person(self, ordinal):
+        first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+        domain = self.rng.choices([d for d, _ in EMAIL_DOMAINS] + ["company"],
+                                  weights=[w for _, w in EMAIL_DOMAINS] + [33])[0]
+        company = self.rng.choices(self.companies, cum_weights=self.company_weights)[0]
+        if domain == "company":
+            domain = company.split()[0].lower() + company.split()[1].lower() + ".com"
+        # the ordinal keeps generated addresses unique without remembering them all
+        email = f"{first.lower()}.{last.lower()}{ordinal}@{domain}"
+        return {"first": first, "last": last, "email": email, "phone": self.phone(), "company": company}
+
+    def duplicate_of(self, person, ordinal):
+        """Another row for the same person under an address MySQL sees as different"""
+        local, _, domain = person["email"].partition("@")
+        kind = self.rng.random()
+        if domain == "gmail.com" and kind < 0.3:
+            email = f"{local}+mmml{ordinal}@gmail.com"
+        elif domain == "gmail.com" and kind < 0.5:
+            email = f"{local}@googlemail.com"
+        elif domain == "gmail.com" and kind < 0.7:
+            email = f"{local.replace('.', '')}@gmail.com"
+        else:
+            email = f"{person['first'].lower()}{ordinal}@{self.rng.choice(EMAIL_DOMAINS)[0]}"
+        if email in self.variant_emails:
+            email = f"{person['first'].lower()}{ordinal}@{self.rng.choice(EMAIL_DOMAINS)[0]}"
+        self.variant_emails.add(email)
+        # sometimes with swapped names or a reformatted phone number
+        first, last = (person["last"], person["first"]) if self.rng.random() < 0.2 else (person["first"], person["last"])
+        phone = person["phone"] if self.rng.random() < 0.7 else self.phone()
+        return {**person, "first": first, "last": last, "email": email, "phone": phone}
+
+    def case_variant(self, email):
+        local, _, domain = email.partition("@")
+        style = self.rng.random()
+        if style < 0.4:
+            return email.upper()
+        if style < 0.8:
+            return ".".join(part.capitalize() for part in local.split(".")) + "@" + domain.capitalize()
+        return f" {email} "
+
+    def batch(self, size):
+        """Rows for the next `size` contacts: (contacts, attendance, users, registrations, payments)"""
+        args, rng = self.args, self.rng
+        contacts, attendance, users, registrations, payments = [], [], [], [], []
+        for _ in range(size):
+            contact_id = self.contact_id
+            self.contact_id += 1
+            if self.people and rng.random() < args.duplicate_rate:
+                person = self.duplicate_of(rng.choice(self.people), contact_id)
+            else:
+                person = self.person(contact_id)
+                if len(self.people) < 100000:
+                    self.people.append(person)
+                else:
+                    self.people[rng.randrange(len(self.people))] = person
+
+            venue = rng.choices(list(self.venues), weights=list(self.venues.values()))[0]
+            attended = rng.random() < args.attendance_rate
+            created_at = self.created_at()
+            events = {EVENT_MMML_ACCOUNT: rng.random() < args.account_rate, EVENT_MMML: attended}
+            for city, city_event in VENUE_EVENTS.items():
+                events[city_event] = attended and city == venue
+            coupon_code = None
+            if attended and rng.random() < args.coupon_rate:
+                codes, weights = self.coupons[VENUE_EVENTS[venue]]
+                coupon_code = rng.choices(codes, cum_weights=weights)[0]
+                self.redemptions[coupon_code] = self.redemptions.get(coupon_code, 0) + 1
+
+            contact = {
+                "id": contact_id, "salutation": rng.choice(SALUTATIONS),
+                "fullname": f"{person['first']} {person['last']}", "firstname": person["first"],
+                "lastname": person["last"], "email": person["email"],
+                "email_normalized": normalize_email(person["email"]), "designation": rng.choice(DESIGNATIONS),
+                "company": person["company"], "phone": person["phone"], "status": None,
+                "location": venue if rng.random() < 0.8 else None, "linkedin": None, "coupon_code": coupon_code,
+                "mmml_time": created_at if attended else None, "years_of_experience": rng.choice(EXPERIENCE),
+                "dietary_preference": rng.choice(DIETARY), "about_mmml": rng.choice(REFERRALS),
+                "mmml": None, "MMML_Account": None, "Mum": None, "Blr": None, "updated_at": created_at,
+            }
+            for event, active in events.items():
+                column, yes_value, no_value = LEGACY_ATTENDANCE_COLUMNS[event]
+                contact[column] = yes_value if active else no_value
+                attendance.append({"contact_id": contact_id, "event": event, "active": active,
+                                   "updated_at": created_at})
+            contacts.append(contact)
+            if events[EVENT_MMML_ACCOUNT]:
+                users.append({"user_id": self.user_id, "email": person["email"], "password": self.password_hash,
+                              "email_normalized": contact["email_normalized"], "created_at": created_at})
+                self.user_id += 1
+
+            if attended:
+                # repeat registrations, often with the email typed differently
+                for repeat in range(2 if rng.random() < args.repeat_rate else 1):
+                    email = person["email"]
+                    if repeat or rng.random() < args.case_variant_rate:
+                        email = self.case_variant(email)
+                    registrations.append(self.registration(person, email, venue, created_at))
+                    self.registrations += 1
+                    payments.append({"id": self.payment_id, "created_at": created_at,
+                                     "payment_id": f"pay_S{self.payment_id:013d}"})
+                    self.payment_id += 1
+        return contacts, attendance, users, registrations, payments
+
+    def registration(self, person, email, venue, created_at):
+        rng = self.rng
+        registration_id = self.registration_id
+        self.registration_id += 1
+        return {
+            "registration_id": registration_id, "salutation": rng.choice(SALUTATIONS),
+            "first_name": person["first"], "last_name": person["last"], "email": email,
+            "email_normalized": normalize_email(email), "phone_number": person["phone"],
+            "company": person["company"], "job_title": rng.choice(DESIGNATIONS),
+            "years_of_experience": rng.choice(EXPERIENCE),
+            "topics_of_interest": ", ".join(rng.sample(TOPICS, rng.randint(1, 3))),
+            "dietary_restrictions": rng.choice(DIETARY), "referral_source": rng.choice(REFERRALS),
+            "linkedin_profile": None, "Venue": venue, "created_at": created_at,
+        }
+
+    def coupon_rows(self, existing):
+        """Coupons with used_count matching the generated redemptions; codes in `existing` are left alone"""
+        rng, rows = self.rng, []
+        for product, (codes, _) in self.coupons.items():
+            for code in codes:
+                if code in existing:
+                    continue
+                used = self.redemptions.get(code, 0)
+                state = rng.random()
+                rows.append({
+                    "code": code, "product": product,
+                    "discount_type": rng.choice([DiscountType.flat, DiscountType.percentage]),
+                    "discount_value": rng.choice([10, 15, 20, 25, 50, 100, 500]),
+                    # some exhausted, some expired, most still valid
+                    "max_usage": used if state < 0.1 else used + rng.randint(1, 500),
+                    "used_count": used,
+                    "expiry_date": self.now - timedelta(days=rng.randint(1, 300)) if state > 0.8
+                    else self.now + timedelta(days=rng.randint(1, 365)),
+                    "is_active": True,
+                })
+        return rows
+
+
+def check_local(allow_remote):
+    url = engine.url
+    if allow_remote or url.get_backend_name() == "sqlite" or url.host in ("localhost", "127.0.0.1", "::1"):
+        return
+    raise SystemExit(f"Refusing to load synthetic data into {url.host}; pass --allow-remote to do it anyway")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=5000, help="contacts per transaction")
+    parser.add_argument("--venues", default="Mumbai=0.7,Bangalore=0.3", help="venue weights")
+    parser.add_argument("--attendance-rate", type=float, default=0.3, help="share of contacts who registered")
+    parser.add_argument("--account-rate", type=float, default=0.2, help="share of contacts with an MMML account")
+    parser.add_argument("--duplicate-rate", type=float, default=0.03, help="near-duplicate contacts")
+    parser.add_argument("--repeat-rate", type=float, default=0.02, help="attendees who registered twice")
+    parser.add_argument("--case-variant-rate", type=float, default=0.05, help="registrations in different case")
+    parser.add_argument("--coupons", type=int, default=1000, help="coupons per product")
+    parser.add_argument("--coupon-rate", type=float, default=0.4, help="share of registrations with a coupon")
+    parser.add_argument("--coupon-skew", type=float, default=1.2, help="Zipf exponent of coupon popularity")
+    parser.add_argument("--companies", type=int, default=2000)
+    parser.add_argument("--fast", action="store_true",
+                        help="MySQL: skip unique and foreign key checks while loading (generated rows satisfy them)")
+    parser.add_argument("--allow-remote", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+    return parser
+
+
+def load(args):
+    """Generate and insert the data described by the parsed arguments"""
+    check_local(args.allow_remote)
+    tables = [Contact.__table__, ContactAttendance.__table__, User.__table__, EventRegistration.__table__,
+              ProcessedPayment.__table__]
+    with engine.connect() as conn:
+        generator = Generator(args, next_id(conn, Contact.id), next_id(conn, EventRegistration.registration_id),
+                              next_id(conn, ProcessedPayment.id), next_id(conn, User.user_id))
+
+    started = time.perf_counter()
+    loaded = 0
+    with engine.connect() as conn:
+        if args.fast and engine.dialect.name == "mysql":
+            conn.execute(text("SET SESSION unique_checks = 0, foreign_key_checks = 0"))
+            conn.commit()
+        while loaded < args.contacts:
+            size = min(args.batch_size, args.contacts - loaded)
+            batch = generator.batch(size)
+            with conn.begin():
+                for table, rows in zip(tables, batch):
+                    if rows:
+                        # executemany: PyMySQL sends it as multi-row INSERT ... VALUES (...), (...)
+                        conn.execute(insert(table), rows)
+            loaded += size
+            elapsed = time.perf_counter() - started
+            if not args.quiet:
+                print(f"{loaded}/{args.contacts} contacts, {generator.registrations} registrations "
+                      f"({loaded / elapsed:.0f} contacts/s)")
+        with conn.begin():
+            existing = set(conn.execute(select(Coupon.code)).scalars())
+            coupons = generator.coupon_rows(existing)
+            if coupons:
+                conn.execute(insert(Coupon.__table__), coupons)
+    if not args.quiet:
+        print(f"Loaded {args.contacts} contacts and {len(generator.redemptions)} redeemed coupons "
+              f"in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    unknown = set(parse_weights(args.venues)) - set(VENUE_EVENTS)
+    if unknown:
+        parser.error(f"unknown venues: {', '.join(sorted(unknown))}")
+    load(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Register captured Razorpay payments that the webhook never recorded.
+
+A lost webhook, or one answered with "DB update failed" (still a 200, so Razorpay
+never retries), leaves a paid attendee unregistered. This job pages through
+captured payments in time windows, diffs each window's payment IDs against
+processed_payments in bulk, and feeds the missing ones through
+register_captured_payment, the same code path the webhook uses. Progress is
+checkpointed per window so an interrupted run resumes where it stopped; the
+checkpoint never moves past a window with a failed registration, so the next run
+retries it.
+
+    python -m scripts.reconcile_payments --from 2026-01-01 --checkpoint reconcile.json
+    python -m scripts.reconcile_payments --dry-run --razorpay-base-url http://127.0.0.1:9000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import razorpay
+
+from email_service import send_registration_email
+from main import ProcessedPayment, SessionLocal, register_captured_payment
+
+logger = logging.getLogger("reconcile_payments")
+
+PAGE_SIZE = 100  # Razorpay's maximum `count`
+ID_BATCH_SIZE = 1000
+
+_local = threading.local()
+
+
+def razorpay_client(base_url):
+    """One client (and requests session) per fetch thread"""
+    if getattr(_local, "client", None) is None:
+        _local.client = razorpay.Client(
+            auth=(os.getenv("RAZORPAY_KEY_ID"), os.getenv("RAZORPAY_KEY_SECRET")),
+            base_url=base_url,
+        )
+    return _local.client
+
+
+def fetch_window(base_url, window_start, window_end):
+    """Fetch every captured payment created in [window_start, window_end]"""
+    client = razorpay_client(base_url)
+    captured, seen, skip = {}, 0, 0
+    while True:
+        page = client.payment.all({"from": window_start, "to": window_end, "count": PAGE_SIZE, "skip": skip})
+        items = page.get("items", [])
+        seen += len(items)
+        for payment in items:
+            if payment.get("status") == "captured":
+                captured[payment["id"]] = payment
+        if len(items) < PAGE_SIZE:
+            return window_start, window_end, seen, captured
+        skip += PAGE_SIZE
+
+
+def fetch_windows(pool, base_url, windows, look_ahead):
+    """Yield fetched windows in order, with at most look_ahead fetches submitted ahead"""
+    upcoming = iter(windows)
+    pending = deque()
+    for window in upcoming:
+        pending.append(pool.submit(fetch_window, base_url, *window))
+        if len(pending) >= look_ahead:
+            break
+    while pending:
+        result = pending.popleft().result()
+        for window in upcoming:
+            pending.append(pool.submit(fetch_window, base_url, *window))
+            break
+        yield result
+
+
+def find_unprocessed(db, payment_ids):
+    """Return the IDs that have no processed_payments row, checking in batches"""
+    missing = set(payment_ids)
+    ids = sorted(payment_ids)
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        batch = ids[start:start + ID_BATCH_SIZE]
+        rows = db.query(ProcessedPayment.payment_id).filter(ProcessedPayment.payment_id.in_(batch))
+        missing.difference_update(payment_id for (payment_id,) in rows)
+    return missing
+
+
+async def send_emails(registration_emails, concurrency=5):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(args):
+        async with semaphore:
+            try:
+                await send_registration_email(*args)
+            except Exception as e:
+                logger.error("Failed to send registration email to %s: %s", args[0], e)
+
+    await asyncio.gather(*(send(args) for args in registration_emails))
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f).get("next_from")
+    return None
+
+
+def save_checkpoint(path, next_from):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"next_from": next_from, "updated_at": datetime.now(timezone.utc).isoformat()}, f)
+    os.replace(tmp, path)
+
+
+def parse_time(value):
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="from_ts", type=parse_time,
+                        help="start time (unix or ISO date); defaults to the checkpoint")
+    parser.add_argument("--to", dest="to_ts", type=parse_time, default=int(time.time()))
+    parser.add_argument("--window-hours", type=float, default=24.0)
+    parser.add_argument("--fetch-workers", type=int, default=4, help="windows fetched in parallel")
+    parser.add_argument("--checkpoint", default="reconcile_checkpoint.json")
+    parser.add_argument("--razorpay-base-url", default=os.getenv("RAZORPAY_API_BASE", "https://api.razorpay.com"))
+    parser.add_argument("--dry-run", action="store_true", help="report missing payments without registering them")
+    parser.add_argument("--send-emails", action="store_true", help="send the registration email for recovered payments")
+    args = parser.parse_args()
+
+    from_ts = args.from_ts if args.from_ts is not None else load_checkpoint(args.checkpoint)
+    if from_ts is None:
+        parser.error("--from is required when there is no checkpoint")
+
+    window = max(1, int(args.window_hours * 3600))
+    windows = [(start, min(start + window - 1, args.to_ts)) for start in range(from_ts, args.to_ts + 1, window)]
+    totals = {"seen": 0, "captured": 0, "missing": 0, "registered": 0, "ignored": 0, "failed": 0}
+    started = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        with ThreadPoolExecutor(max_workers=args.fetch_workers) as pool:
+            # windows come back in order, so the checkpoint only ever moves past finished windows
+            held_at = None
+            for window_start, window_end, seen, captured in fetch_windows(
+                    pool, args.razorpay_base_url, windows, look_ahead=args.fetch_workers * 2):
+                missing = find_unprocessed(db, captured)
+                totals["seen"] += seen
+                totals["captured"] += len(captured)
+                totals["missing"] += len(missing)
+
+                registration_emails = []
+                failed = 0
+                for payment_id in sorted(missing):
+                    if args.dry_run:
+                        logger.info("Unprocessed payment %s (%s)", payment_id, captured[payment_id].get("email"))
+                        continue
+                    result, registration_email = register_captured_payment(db, captured[payment_id])
+                    if result.get("status") == "success":
+                        totals["registered"] += 1
+                    elif result.get("reason") == "missing email":
+                        # retrying cannot help a payment with no email in its notes
+                        totals["ignored"] += 1
+                        logger.warning("Ignored payment %s: %s", payment_id, result)
+                    else:
+                        failed += 1
+                        logger.warning("Could not register payment %s: %s", payment_id, result)
+                    if registration_email:
+                        registration_emails.append(registration_email)
+                totals["failed"] += failed
+
+                if args.send_emails and registration_emails:
+                    asyncio.run(send_emails(registration_emails))
+                if failed and held_at is None:
+                    # later windows still run, but the next run starts again here
+                    held_at = window_start
+                    logger.warning("Checkpoint held at %s: %d payments in this window failed", window_start, failed)
+                if not args.dry_run and held_at is None:
+                    save_checkpoint(args.checkpoint, window_end + 1)
+                logger.info("Window %s..%s: %d payments, %d captured, %d missing",
+                            window_start, window_end, seen, len(captured), len(missing))
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({**totals, "windows": len(windows), "seconds": round(elapsed, 2),
+                      "payments_per_second": round(totals["seen"] / elapsed, 1) if elapsed else None}))
+
+
+if __name__ == "__main__":
+    main()
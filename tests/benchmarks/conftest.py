@@ -0,0 +1,124 @@
+"""A small pytest-benchmark-style harness.
+
+The `bench` fixture times a callable the way pytest-benchmark does: calls are
+grouped into rounds long enough for the timer, and rounds repeat for at least
+BENCHMARK_MIN_TIME seconds. It returns the callable's result so tests can check it.
+
+    BENCHMARKS_ENABLED=true BENCHMARK_JSON=before.json python -m pytest tests/benchmarks
+    BENCHMARKS_ENABLED=true BENCHMARK_COMPARE=before.json python -m pytest tests/benchmarks
+
+BENCHMARK_JSON writes the results; BENCHMARK_COMPARE fails every benchmark whose
+median is more than BENCHMARK_MAX_REGRESSION slower than in that earlier file
+(pytest-benchmark JSON files work too). Compare runs from the same machine only.
+Without BENCHMARKS_ENABLED=true the benchmarks are skipped, so a plain test run
+stays fast and never fails on timing.
+"""
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+BENCHMARK_JSON = os.getenv("BENCHMARK_JSON")
+BENCHMARK_COMPARE = os.getenv("BENCHMARK_COMPARE")
+BENCHMARK_MAX_REGRESSION = float(os.getenv("BENCHMARK_MAX_REGRESSION", "0.25"))  # 25% slower fails
+BENCHMARK_MIN_TIME = float(os.getenv("BENCHMARK_MIN_TIME", "0.2"))
+BENCHMARK_MIN_ROUNDS = int(os.getenv("BENCHMARK_MIN_ROUNDS", "5"))
+ROUND_MIN_SECONDS = 0.001  # well above perf_counter's resolution
+
+_results = []
+_baseline = {}
+if BENCHMARK_COMPARE:
+    with open(BENCHMARK_COMPARE) as compare_file:
+        _baseline = {entry["name"]: entry["stats"] for entry in json.load(compare_file)["benchmarks"]}
+
+
+class Benchmark:
+    def __init__(self, name, fullname):
+        self.name = name
+        self.fullname = fullname
+        self.stats = None
+
+    def __call__(self, func, *args, **kwargs):
+        result = func(*args, **kwargs)  # warm-up, and the value handed back to the test
+        iterations = self._calibrate(func, args, kwargs)
+        timings = []
+        started = time.perf_counter()
+        while len(timings) < BENCHMARK_MIN_ROUNDS or time.perf_counter() - started < BENCHMARK_MIN_TIME:
+            timings.append(self._round(func, args, kwargs, iterations) / iterations)
+        self.stats = {
+            "min": min(timings),
+            "max": max(timings),
+            "mean": statistics.fmean(timings),
+            "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            "median": statistics.median(timings),
+            "rounds": len(timings),
+            "iterations": iterations,
+            "ops": 1 / statistics.fmean(timings),
+        }
+        _results.append({"name": self.name, "fullname": self.fullname, "stats": self.stats})
+        self._compare()
+        return result
+
+    @staticmethod
+    def _round(func, args, kwargs, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(*args, **kwargs)
+        return time.perf_counter() - start
+
+    def _calibrate(self, func, args, kwargs):
+        """Calls per round so that one round takes at least ROUND_MIN_SECONDS"""
+        iterations = 1
+        while True:
+            duration = self._round(func, args, kwargs, iterations)
+            if duration >= ROUND_MIN_SECONDS:
+                return iterations
+            iterations *= max(2, min(10, int(ROUND_MIN_SECONDS / max(duration, 1e-9)) + 1))
+
+    def _compare(self):
+        before = _baseline.get(self.name)
+        if not before:
+            return
+        change = self.stats["median"] / before["median"] - 1
+        if change > BENCHMARK_MAX_REGRESSION:
+            pytest.fail(f"{self.name}: median {self.stats['median'] * 1e6:.2f}us is {change:.0%} slower than "
+                        f"{before['median'] * 1e6:.2f}us (limit {BENCHMARK_MAX_REGRESSION:.0%})", pytrace=False)
+
+
+@pytest.fixture
+def bench(request):
+    # a collection in the middle of one benchmark would land on whichever runs next
+    gc.collect()
+    return Benchmark(request.node.name, request.node.nodeid)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks (per call)")
+    terminalreporter.write_line(f"{'name':60s} {'median us':>12s} {'min us':>12s} {'stddev':>9s} {'rounds':>7s}")
+    for entry in _results:
+        stats = entry["stats"]
+        line = (f"{entry['name']:60s} {stats['median'] * 1e6:12.2f} {stats['min'] * 1e6:12.2f} "
+                f"{stats['stddev'] / stats['mean']:8.1%} {stats['rounds']:7d}")
+        before = _baseline.get(entry["name"])
+        if before:
+            line += f"  {stats['median'] / before['median'] - 1:+.1%}"
+        terminalreporter.write_line(line)
+
+
+def pytest_sessionfinish(session):
+    if not (BENCHMARK_JSON and _results):
+        return
+    with open(BENCHMARK_JSON, "w") as output:
+        json.dump({
+            "machine_info": {"python_version": platform.python_version(), "machine": platform.machine(),
+                             "processor": platform.processor(), "node": platform.node()},
+            "datetime": datetime.now(timezone.utc).isoformat(),
+            "benchmarks": _results,
+        }, output, indent=2)
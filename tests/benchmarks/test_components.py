@@ -0,0 +1,152 @@
+"""Micro-benchmarks of the building blocks of a request, one layer per benchmark.
+
+    BENCHMARKS_ENABLED=true python -m pytest tests/benchmarks
+"""
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+import main
+from email_service import get_email_template
+from main import (
+    EVENT_MMML, VENUE_EVENTS, Contact, ContactMessageCreate, EventRegistrationCreate, MembershipApplicationCreate,
+    PartnershipProposalCreate, SpeakerApplicationCreate, SponsorshipInquiryCreate, UserCreate,
+    VolunteerApplicationCreate, WaitlistRegistrationCreate, create_token, get_current_user_email,
+    parse_payment_extra, pwd, valid_razorpay_signature,
+)
+
+pytestmark = pytest.mark.skipif(os.getenv("BENCHMARKS_ENABLED", "false").lower() != "true",
+                                reason="set BENCHMARKS_ENABLED=true to run the benchmarks")
+
+EMAIL = "asha.rao@example.com"
+LONG_TEXT = "I have been working on forecasting and recommender systems for six years. " * 8
+
+CREATE_PAYLOADS = {
+    UserCreate: {"salutation": "Ms", "first_name": "Asha", "last_name": "Rao", "email": EMAIL,
+                 "phone_number": "+91 98765 43210", "company": "Vector Labs", "job_title": "Data Scientist"},
+    EventRegistrationCreate: {"salutation": "Ms", "first_name": "Asha", "last_name": "Rao", "email": EMAIL,
+                              "phone_number": "+91 98765 43210", "company": "Vector Labs",
+                              "job_title": "Data Scientist", "years_of_experience": "5-10",
+                              "topics_of_interest": "LLMs, MLOps", "dietary_restrictions": "Vegetarian"},
+    WaitlistRegistrationCreate: {"salutation": "Ms", "first_name": "Asha", "last_name": "Rao", "email": EMAIL,
+                                 "city": "Mumbai"},
+    ContactMessageCreate: {"first_name": "Asha", "last_name": "Rao", "email": EMAIL,
+                           "company_organization": "Vector Labs", "message": LONG_TEXT},
+    SpeakerApplicationCreate: {"full_name": "Asha Rao", "email": EMAIL, "company": "Vector Labs",
+                               "job_title": "Data Scientist", "linkedin_profile": "https://linkedin.com/in/asharao",
+                               "area_of_expertise": "Forecasting", "proposed_topic_title": "Forecasting at scale",
+                               "topic_description": LONG_TEXT, "speaking_experience": LONG_TEXT},
+    SponsorshipInquiryCreate: {"company_name": "Vector Labs", "contact_name": "Asha Rao", "email": EMAIL,
+                               "phone": "+91 98765 43210", "company_website": "https://vectorlabs.example.com",
+                               "interested_sponsorship_level": "Gold", "marketing_objectives": LONG_TEXT,
+                               "budget_range": "5-10L", "timeline": "Q3"},
+    PartnershipProposalCreate: {"organization_name": "Vector Labs", "contact_name": "Asha Rao", "email": EMAIL,
+                                "partnership_type": "Community", "partnership_proposal": LONG_TEXT,
+                                "audience_community": "5000 data scientists"},
+    VolunteerApplicationCreate: {"first_name": "Asha", "last_name": "Rao", "email": EMAIL,
+                                 "profession": "Data Scientist", "availability": "Weekends",
+                                 "relevant_skills_experience": LONG_TEXT, "areas_of_interest": "Operations",
+                                 "motivation": LONG_TEXT},
+    MembershipApplicationCreate: {"full_name": "Asha Rao", "email": EMAIL, "company": "Vector Labs",
+                                  "title": "Data Scientist", "linkedin": "https://linkedin.com/in/asharao"},
+}
+
+
+@pytest.mark.parametrize("model", list(CREATE_PAYLOADS), ids=lambda model: model.__name__)
+def test_validate_create_model(bench, model):
+    validated = bench(model.model_validate, CREATE_PAYLOADS[model])
+    assert validated.email == EMAIL
+
+
+CLAIMS = {"user_id": 42, "email": EMAIL, "new_user": False}
+
+
+def test_create_token(bench):
+    assert bench(create_token, CLAIMS).count(".") == 2
+
+
+def test_decode_token(bench):
+    # the dependency every logged-in endpoint runs
+    assert bench(get_current_user_email, "Bearer " + create_token(CLAIMS)) == EMAIL
+
+
+def test_password_hash(bench):
+    assert pwd.verify("correct horse", bench(pwd.hash, "correct horse"))
+
+
+def test_password_verify(bench):
+    assert bench(pwd.verify, "correct horse", pwd.hash("correct horse"))
+
+
+EXTRA = {"topics_of_interest": "LLMs, MLOps", "linkedin_profile": "https://linkedin.com/in/asharao",
+         "coupon_code": "EARLY10", "venue_info": "Jio World Centre, Hall 2"}
+WEBHOOK_BODY = json.dumps({"event": "payment.captured", "payload": {"payment": {"entity": {
+    "id": "pay_Q1w2e3r4t5y6u7", "amount": 150000, "currency": "INR", "status": "captured",
+    "notes": {"email": EMAIL, "first_name": "Asha", "last_name": "Rao", "venue": "Mumbai",
+              "phone_number": "+91 98765 43210", "company": "Vector Labs", "extra": json.dumps(EXTRA)},
+}}}}).encode()
+
+
+def test_webhook_signature(bench):
+    signature = hmac.new(os.environ["RAZORPAY_WEBHOOK_SECRET"].encode(), WEBHOOK_BODY, hashlib.sha256).hexdigest()
+    assert bench(valid_razorpay_signature, WEBHOOK_BODY, signature)
+
+
+@pytest.mark.parametrize("extra", [
+    pytest.param(json.dumps(EXTRA), id="json"),
+    pytest.param(json.dumps(EXTRA).replace('"', "'"), id="single_quoted_fallback"),
+    pytest.param(EXTRA, id="dict"),
+])
+def test_parse_payment_extra(bench, extra):
+    assert bench(parse_payment_extra, extra)["coupon_code"] == "EARLY10"
+
+
+FORM_DATA = {"salutation": "Ms", "first_name": "Asha", "last_name": "Rao", "email": EMAIL,
+             "company_organization": "Vector Labs", "message": LONG_TEXT, "created_at": "2026-01-01 10:00:00"}
+
+TEMPLATE_CONTEXTS = {
+    "user_confirmation": {"user_name": "Asha Rao", "form_type": "Contact Message", "form_data": FORM_DATA,
+                          "submission_date": FORM_DATA["created_at"]},
+    "admin_notification": {"form_type": "Contact Message", "form_data": FORM_DATA,
+                           "submission_date": FORM_DATA["created_at"]},
+    "admin_digest": {"form_type": "Contact Message", "submissions": [FORM_DATA] * 25,
+                     "window_start": "2026-01-01 10:00:00", "window_end": "2026-01-01 10:05:00"},
+    "registration_acknowledgement": {"first_name": "Asha", "event_date": "14 March"},
+    "registration_approved": {"first_name": "Asha", "event_date": "14 March",
+                              "secure_spot_link": "https://mmml.co.in/secure/abc123"},
+    "registration_rejected": {"first_name": "Asha", "event_date": "14 March"},
+}
+
+
+def test_every_template_is_benchmarked():
+    templates = {path.stem for path in (Path(main.__file__).parent / "email_templates").glob("*.html")}
+    assert templates == set(TEMPLATE_CONTEXTS)
+
+
+@pytest.mark.parametrize("template", sorted(TEMPLATE_CONTEXTS))
+def test_render_email_template(bench, template):
+    assert "</html>" in bench(get_email_template, template, TEMPLATE_CONTEXTS[template]).lower()
+
+
+def build_contact():
+    # as the payment webhook builds a new contact
+    contact = Contact(
+        fullname="Asha Rao", salutation="Ms", firstname="Asha", lastname="Rao", email=EMAIL,
+        phone="+91 98765 43210", company="Vector Labs", designation="Data Scientist", mmml_time=datetime.utcnow(),
+        coupon_code="EARLY10", years_of_experience="5-10", dietary_preference="Vegetarian",
+        about_mmml="LinkedIn", linkedin="https://linkedin.com/in/asharao",
+    )
+    contact.set_attendance(EVENT_MMML, True)
+    for city, city_event in VENUE_EVENTS.items():
+        contact.set_attendance(city_event, city == "Mumbai")
+    return contact
+
+
+def test_build_contact(bench):
+    contact = bench(build_contact)
+    assert contact.attends(EVENT_MMML) and contact.attends(VENUE_EVENTS["Mumbai"])
@@ -0,0 +1,17 @@
+"""Test configuration. main.py reads its settings at import, so they are set here first.
+
+Tests run against TEST_DATABASE_URL, never DATABASE_URL, so a configured production
+database is not touched; by default that is a throwaway SQLite file.
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or "sqlite:///" + os.path.join(
+    tempfile.mkdtemp(prefix="mmml_tests_"), "test.db")
+os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret")
+os.environ.setdefault("RAZORPAY_WEBHOOK_SECRET", "test-webhook-secret")
+os.environ.setdefault("ADMIN_API_TOKEN", "test-admin-token")
+os.environ.setdefault("CHECKIN_SCANNER_TOKEN", "test-scanner-token")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
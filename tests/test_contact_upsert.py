@@ -0,0 +1,67 @@
+"""Concurrent upserts of provider aliases of one address end up on one contact (MySQL only).
+
+    TEST_DATABASE_URL=mysql+pymysql://... python -m pytest tests/test_contact_upsert.py
+"""
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+import emails
+from main import Contact, SessionLocal, engine, upsert_contact
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != "mysql", reason="needs MySQL")
+
+
+def upsert_concurrently(addresses):
+    """Upsert every address in its own session, all released at once; returns (contact id, created) each"""
+    barrier = threading.Barrier(len(addresses))
+    results, errors = [None] * len(addresses), []
+
+    def run(index, email):
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            results[index] = upsert_contact(db, dict(
+                firstname="Alias", lastname="Test", fullname="Alias Test", email=email,
+                years_of_experience="0", dietary_preference="none",
+            ), update={})
+            db.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=run, args=(index, email)) for index, email in enumerate(addresses)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+    return results
+
+
+@pytest.fixture(autouse=True)
+def provider_rules(monkeypatch):
+    monkeypatch.setattr(emails, "EMAIL_PROVIDER_NORMALIZATION", True)
+
+
+def test_concurrent_aliases_share_one_contact():
+    local = f"alias{uuid.uuid4().hex[:10]}"
+    addresses = [f"{local}@gmail.com", f"{local[:3]}.{local[3:]}@gmail.com", f"{local}+mmml@googlemail.com"]
+
+    results = upsert_concurrently(addresses)
+
+    assert len({contact_id for contact_id, _ in results}) == 1
+    assert sum(created for _, created in results) == 1
+    with engine.connect() as conn:
+        key = emails.normalize_email(addresses[0])
+        assert conn.execute(select(func.count()).where(Contact.email_normalized == key)).scalar() == 1
+
+
+def test_concurrent_first_sign_ups_do_not_deadlock():
+    # distinct new keys next to each other in the index, where gap locks used to collide
+    prefix = f"gap{uuid.uuid4().hex[:8]}"
+    results = upsert_concurrently([f"{prefix}{index}@gmail.com" for index in range(8)])
+    assert all(created for _, created in results)
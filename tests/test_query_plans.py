@@ -0,0 +1,307 @@
+"""Query-plan regression checks for the statements the endpoints issue.
+
+Each scenario calls one endpoint against a seeded database (scripts.generate_data)
+and records every statement it runs. Each SELECT/UPDATE/DELETE is EXPLAINed, and the
+test fails when a plan scans a table of at least QUERY_PLAN_MIN_ROWS rows in full
+(or through a full index scan) or sorts it with a filesort, unless exactly that plan
+is approved in query_plans.json.
+
+    python -m pytest tests/test_query_plans.py
+    TEST_DATABASE_URL=mysql+pymysql://... python -m pytest tests/test_query_plans.py
+
+After reviewing a plan change, approve the current plans of the dialect under test
+with QUERY_PLAN_UPDATE=true and commit the updated query_plans.json.
+"""
+import hashlib
+import hmac
+import json
+import os
+import re
+import uuid
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select, text
+
+import main
+from main import (
+    EVENT_MMML_ACCOUNT, Base, Contact, Coupon, DiscountType, EventRegistration, SessionLocal, User, app,
+    create_token, engine, pwd,
+)
+from scripts.generate_data import build_parser, load
+
+QUERY_PLAN_MIN_ROWS = int(os.getenv("QUERY_PLAN_MIN_ROWS", "1000"))
+QUERY_PLAN_SEED_CONTACTS = int(os.getenv("QUERY_PLAN_SEED_CONTACTS", "5000"))
+QUERY_PLAN_UPDATE = os.getenv("QUERY_PLAN_UPDATE", "false").lower() == "true"
+BASELINE = Path(__file__).with_name("query_plans.json")
+
+EMAIL = "plan.test@example.com"
+PASSWORD = "plan-test-password"
+COUPON = "PLANTEST"
+VENUE = "Mumbai"
+EXPLAINED = ("SELECT", "UPDATE", "DELETE")
+
+
+def seed_rows(db):
+    """The rows the scenarios look up, on top of the generated volume"""
+    if db.execute(select(Contact.id).where(Contact.email == EMAIL)).first():
+        return
+    contact = Contact(firstname="Plan", lastname="Test", fullname="Plan Test", email=EMAIL,
+                      years_of_experience="5", dietary_preference="none")
+    contact.set_attendance(EVENT_MMML_ACCOUNT, True)
+    db.add(contact)
+    db.add(User(email=EMAIL, password=pwd.hash(PASSWORD)))
+    db.add(EventRegistration(first_name="Plan", last_name="Test", email=EMAIL, phone_number="0", Venue=VENUE))
+    db.add(Coupon(code=COUPON, product="MMML_MUM", discount_type=DiscountType.flat, discount_value=100,
+                  max_usage=10 ** 6, used_count=0, expiry_date=datetime(2099, 1, 1)))
+    db.commit()
+
+
+@pytest.fixture(scope="module")
+def table_sizes():
+    with engine.connect() as conn:
+        contacts = conn.execute(select(func.count()).select_from(Contact)).scalar()
+    if contacts < QUERY_PLAN_SEED_CONTACTS:
+        load(build_parser().parse_args([
+            "--contacts", str(QUERY_PLAN_SEED_CONTACTS - contacts), "--coupons", "600", "--batch-size", "2500",
+            "--quiet",
+        ]))
+    db = SessionLocal()
+    try:
+        seed_rows(db)
+    finally:
+        db.close()
+
+    tables = Base.metadata.sorted_tables
+    with engine.begin() as conn:
+        # statistics for the optimizer, as on a long-running database
+        if engine.dialect.name == "mysql":
+            conn.execute(text("ANALYZE TABLE " + ", ".join(f"`{table.name}`" for table in tables)))
+        elif engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+        return {table.name: conn.execute(select(func.count()).select_from(table)).scalar() for table in tables}
+
+
+@pytest.fixture(scope="module")
+def client():
+    async def no_email(*args, **kwargs):
+        pass
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(main, "send_registration_email", no_email)
+        with TestClient(app) as test_client:
+            yield test_client
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    approved = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    if QUERY_PLAN_UPDATE:
+        approved[engine.dialect.name] = {}  # rebuilt from this run, so dropped statements go away
+    yield approved
+    if QUERY_PLAN_UPDATE:
+        BASELINE.write_text(json.dumps(approved, indent=2, sort_keys=True) + "\n")
+
+
+@contextmanager
+def captured_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def normalize_sql(statement):
+    sql = " ".join(statement.split())
+    # IN lists vary in length with the data
+    return re.sub(r"IN \((?:\?|%s)(?:, (?:\?|%s))*\)", "IN (...)", sql)
+
+
+def sqlite_plan(details):
+    tables, filesort = [], False
+    for detail in details:
+        words = detail.split()
+        if words[0] in ("SCAN", "SEARCH") and words[1] != "CONSTANT":
+            index = re.search(r"USING (?:COVERING )?INDEX (\S+)", detail)
+            key = index.group(1) if index else ("PRIMARY" if "PRIMARY KEY" in detail else None)
+            access = "lookup" if words[0] == "SEARCH" else ("index_scan" if key else "scan")
+            tables.append({"table": words[1], "access": access, "key": key})
+        elif detail.startswith("USE TEMP B-TREE"):
+            filesort = True
+    return {"tables": tables, "filesort": filesort}
+
+
+MYSQL_FULL_SCANS = {"ALL": "scan", "index": "index_scan"}
+
+
+def mysql_plan(tree, examined):
+    """Plan of an EXPLAIN FORMAT=JSON tree; fills examined with estimated rows per table"""
+    tables, filesort = [], False
+
+    def walk(node):
+        nonlocal filesort
+        if isinstance(node, dict):
+            if "table_name" in node and "access_type" in node:
+                tables.append({"table": node["table_name"], "key": node.get("key"),
+                               "access": MYSQL_FULL_SCANS.get(node["access_type"], "lookup")})
+                # kept out of the plan, so baselines do not churn with the statistics
+                examined[node["table_name"]] = max(examined.get(node["table_name"], 0),
+                                                   node.get("rows_examined_per_scan", 0))
+            if node.get("using_filesort"):
+                filesort = True
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(tree)
+    return {"tables": tables, "filesort": filesort}
+
+
+def explain(statement, parameters):
+    """(plan, estimated rows examined per table); SQLite gives no estimates"""
+    examined = {}
+    with engine.connect() as conn:
+        if engine.dialect.name == "mysql":
+            tree = json.loads(conn.exec_driver_sql("EXPLAIN FORMAT=JSON " + statement, parameters).scalar())
+            return mysql_plan(tree, examined), examined
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        return sqlite_plan(row[-1] for row in rows), examined
+
+
+def violations(plan, examined, table_sizes):
+    found = []
+    large = [table for table in plan["tables"] if table_sizes.get(table["table"], 0) >= QUERY_PLAN_MIN_ROWS]
+    for table in large:
+        if table["access"] != "lookup":
+            found.append(f"{table['access'].replace('_', ' ')} of {table['table']} "
+                         f"({table_sizes[table['table']]} rows)")
+        elif examined.get(table["table"], 0) >= QUERY_PLAN_MIN_ROWS:
+            # an index range that covers most of the table is a scan too
+            found.append(f"{table['key']} range over ~{examined[table['table']]} rows of {table['table']}")
+    if plan["filesort"] and large:
+        found.append(f"filesort with {', '.join(table['table'] for table in large)}")
+    return found
+
+
+# --- scenarios: one endpoint call each ---
+
+def mysql_only(scenario):
+    """Endpoints writing through MySQL-only statements (INSERT ... ON DUPLICATE KEY UPDATE)"""
+    scenario.mysql_only = True
+    return scenario
+
+
+def bearer():
+    return {"Authorization": "Bearer " + create_token({"email": EMAIL})}
+
+
+def check_account(client):
+    response = client.post("/check-account/", json={"email": EMAIL.upper()})
+    assert response.json()["data"]["has_mmml_account"]
+
+
+def fetch_logged_in_user(client):
+    assert client.get("/fetch-logged-in-user/", headers=bearer()).status_code == 200
+
+
+def auth_login(client):
+    response = client.post("/auth", json={"email": EMAIL, "password": PASSWORD})
+    assert response.json()["message"] == "Login successful"
+
+
+def apply_coupon(client):
+    response = client.post("/apply", json={"coupon_code": COUPON, "venue": VENUE, "amount": 1000})
+    assert response.status_code == 200
+
+
+def payment_webhook(client):
+    body = json.dumps({"event": "payment.captured", "payload": {"payment": {"entity": {
+        "id": f"pay_plan{uuid.uuid4().hex[:10]}",
+        "notes": {"email": EMAIL, "first_name": "Plan", "last_name": "Test", "venue": VENUE,
+                  "phone_number": "0", "extra": json.dumps({"coupon_code": COUPON})},
+    }}}}).encode()
+    signature = hmac.new(os.environ["RAZORPAY_WEBHOOK_SECRET"].encode(), body, hashlib.sha256).hexdigest()
+    response = client.post("/event-registration-webhook/", content=body,
+                           headers={"X-Razorpay-Signature": signature, "Content-Type": "application/json"})
+    assert response.json()["status"] == "success"
+
+
+@mysql_only
+def post_login_registration(client):
+    response = client.post("/post-login-registration/", json={
+        "first_name": "Plan", "last_name": "Test", "email": EMAIL, "phone_number": "0"})
+    assert response.status_code == 200
+
+
+@mysql_only
+def waitlist_registration(client):
+    response = client.post("/waitlist-registrations/", json={
+        "first_name": "Plan", "last_name": "Test", "email": EMAIL, "city": VENUE})
+    assert response.status_code == 200
+
+
+@mysql_only
+def membership_application(client):
+    response = client.post("/membership-applications/", json={
+        "full_name": "Plan Test", "email": EMAIL, "company": "Plan Co", "title": "Tester"})
+    assert response.status_code == 200
+
+
+def checkin_tokens(client):
+    assert client.get("/checkin/tokens", headers=bearer()).json()["data"]
+
+
+def checkin_open_venue(client):
+    response = client.post(f"/admin/checkin/{VENUE}/open", headers={"X-Admin-Token": main.ADMIN_API_TOKEN})
+    assert response.json()["attendees"]
+
+
+SCENARIOS = [
+    check_account, fetch_logged_in_user, auth_login, apply_coupon, payment_webhook, post_login_registration,
+    waitlist_registration, membership_application, checkin_tokens, checkin_open_venue,
+]
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=[scenario.__name__ for scenario in SCENARIOS])
+def test_query_plans(scenario, client, table_sizes, baseline):
+    if getattr(scenario, "mysql_only", False) and engine.dialect.name != "mysql":
+        pytest.skip("needs MySQL")
+    with captured_statements() as statements:
+        scenario(client)
+
+    approved = baseline.setdefault(engine.dialect.name, {})
+    failures = []
+    explained = set()
+    for statement, parameters in statements:
+        sql = normalize_sql(statement)
+        if sql in explained or sql.split(" ", 1)[0].upper() not in EXPLAINED:
+            continue
+        explained.add(sql)
+        plan, examined = explain(statement, parameters)
+        if not plan["tables"]:
+            continue
+        entry = approved.get(sql)
+        if QUERY_PLAN_UPDATE:
+            scenarios = sorted(set(entry["scenarios"] if entry else []) | {scenario.__name__})
+            approved[sql] = {"plan": plan, "scenarios": scenarios}
+            continue
+        problems = violations(plan, examined, table_sizes)
+        if problems and (entry is None or entry["plan"] != plan):
+            failures.append(f"{sql}\n    {'; '.join(problems)}\n    plan: {plan}")
+        elif entry is not None and entry["plan"] != plan:
+            warnings.warn(f"Plan changed (still no full scans), approve it with QUERY_PLAN_UPDATE=true: {sql}")
+    assert explained, "the scenario issued no statements"
+    assert not failures, "Unapproved full scans or filesorts:\n" + "\n".join(failures)
@@ -0,0 +1,70 @@
+"""The reconciliation checkpoint only moves past windows whose payments were all registered."""
+import json
+import sys
+
+import pytest
+
+import scripts.reconcile_payments as reconcile
+from main import SessionLocal, register_captured_payment
+
+HOUR = 3600
+
+
+def captured_payment(payment_id, email):
+    return {"id": payment_id, "status": "captured", "email": email,
+            "notes": {"email": email, "first_name": "Recon", "last_name": "Test", "venue": "Mumbai",
+                      "phone_number": "0", "years_of_experience": "5", "dietary_restrictions": "none"}}
+
+
+@pytest.fixture
+def run(monkeypatch, tmp_path):
+    """Run the job over three hourly windows, one captured payment in each"""
+    checkpoint = tmp_path / "checkpoint.json"
+
+    def fetch_window(base_url, window_start, window_end):
+        payment_id = f"pay_recon_{tmp_path.name}_{window_start}"
+        return window_start, window_end, 1, {payment_id: captured_payment(payment_id, f"{payment_id}@example.com")}
+
+    def run_job(failing_window=None):
+        def session():
+            db = SessionLocal()
+            commit = db.commit
+
+            def flaky_commit():
+                if db.info.get("payment_id", "").endswith(f"_{failing_window}"):
+                    raise RuntimeError("database went away")
+                commit()
+
+            db.commit = flaky_commit
+            return db
+
+        def register(db, payment_data):
+            db.info["payment_id"] = payment_data["id"]
+            return register_captured_payment(db, payment_data)
+
+        monkeypatch.setattr(reconcile, "SessionLocal", session)
+        monkeypatch.setattr(reconcile, "register_captured_payment", register)
+        monkeypatch.setattr(reconcile, "fetch_window", fetch_window)
+        monkeypatch.setattr(sys, "argv", [
+            "reconcile_payments", "--from", "0", "--to", str(3 * HOUR - 1), "--window-hours", "1",
+            "--checkpoint", str(checkpoint), "--fetch-workers", "1",
+        ])
+        reconcile.main()
+        return json.loads(checkpoint.read_text())["next_from"] if checkpoint.exists() else None
+
+    return run_job
+
+
+def test_checkpoint_holds_at_window_with_failed_registration(run, capsys):
+    assert run(failing_window=HOUR) == HOUR
+    totals = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert (totals["registered"], totals["failed"], totals["ignored"]) == (2, 1, 0)
+
+    # the resumed run retries the failed window and then moves on
+    assert run() == 3 * HOUR
+    totals = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert (totals["missing"], totals["registered"], totals["failed"]) == (1, 1, 0)
+
+
+def test_checkpoint_advances_when_every_window_registers(run):
+    assert run() == 3 * HOUR
@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import queue
+import random
+import inspect
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+from logging_config import DeferredQueueHandler, request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Tracing configuration
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "5"))
+# Tail sampling: slow and failed requests are always kept, the rest at TRACE_SAMPLE_RATE
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+SERVICE_NAME = os.getenv("SERVICE_NAME", "mmml-backend")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_exporter = None
+_listener = None
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self, trace_id: str) -> Dict[str, Any]:
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.parent_id is None else 1,  # SERVER for the root, INTERNAL otherwise
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    __slots__ = ("trace_id", "request_id", "spans", "error", "dropped_spans")
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.request_id = request_id or self.trace_id
+        self.spans: List[Span] = []
+        self.error = False
+        self.dropped_spans = 0
+
+    def add(self, span: Span):
+        if len(self.spans) < TRACE_MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current request; a no-op outside of a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    current = Span(name, _current_span.get(), attributes)
+    trace.add(current)
+    token = _current_span.set(current.span_id)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        trace.error = True
+        raise
+    else:
+        current.finish()
+    finally:
+        _current_span.reset(token)
+
+
+def traced_task(func):
+    """Wrap a background task so it is recorded as a span of the request that scheduled it"""
+    name = f"background.{func.__name__}"
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+    return sync_wrapper
+
+
+def instrument_engine(engine):
+    """Record a span around every SQL statement executed on the engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        current = Span("db.query", _current_span.get(), {
+            "db.system": engine.dialect.name,
+            "db.statement": statement[:500],
+            "db.executemany": executemany,
+        })
+        trace.add(current)
+        conn.info.setdefault("tracing_spans", []).append(current)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("tracing_spans")
+        if spans:
+            current = spans.pop()
+            current.attributes["db.rows"] = cursor.rowcount
+            current.finish()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("tracing_spans") if conn is not None else None
+        if spans:
+            spans.pop().finish(exception_context.original_exception)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.error = True
+
+
+def _should_keep(trace: Trace, root: Span) -> bool:
+    if trace.error:
+        return True
+    if (root.end_ns - root.start_ns) / 1e6 >= TRACE_SLOW_MS:
+        return True
+    return random.random() < TRACE_SAMPLE_RATE
+
+
+def _export(trace: Trace):
+    if _exporter is None:
+        return
+    record = {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "mmml.tracing"},
+                "spans": [s.to_otlp(trace.trace_id) for s in trace.spans],
+            }],
+        }]
+    }
+    _exporter.info("%s", json.dumps(record))
+
+
+class TracingMiddleware:
+    """Assign a request ID, record the request as the root span and export it with tail sampling"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming_id = headers.get(b"x-request-id")
+        trace = Trace(incoming_id.decode("latin-1")[:64] if incoming_id else None)
+        root = Span(f"{scope['method']} {scope['path']}", None, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+            "request.id": trace.request_id,
+        })
+        trace.add(root)
+
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root.span_id)
+        request_id_token = request_id_var.set(trace.request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                root.attributes["http.status_code"] = status
+                if status >= 500:
+                    trace.error = True
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", trace.request_id.encode("latin-1"))]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # the response is complete; anything after this is background work
+                root.finish()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            trace.error = True
+            if root.end_ns is None:
+                root.finish(e)
+            raise
+        finally:
+            if root.end_ns is None:
+                root.finish()
+            _current_trace.reset(trace_token)
+            _current_span.reset(span_token)
+            request_id_var.reset(request_id_token)
+            if trace.dropped_spans:
+                root.attributes["trace.dropped_spans"] = trace.dropped_spans
+            if _should_keep(trace, root):
+                _export(trace)
+
+
+def setup_tracing():
+    """Start the background writer for the rotating trace file"""
+    global _exporter, _listener
+    if not TRACING_ENABLED or _listener is not None:
+        return
+
+    output = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS)
+    output.setFormatter(logging.Formatter("%(message)s"))
+
+    trace_queue = queue.Queue(maxsize=10000)
+    _exporter = logging.getLogger("mmml.traces")
+    _exporter.propagate = False
+    _exporter.setLevel(logging.INFO)
+    _exporter.handlers = [DeferredQueueHandler(trace_queue)]
+
+    _listener = QueueListener(trace_queue, output)
+    _listener.start()
+
+
+def shutdown_tracing():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,247 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, text
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Group commit for form rows: queue inserts in-process and write them with
+# multi-row INSERTs in one transaction, so MySQL does one commit (one fsync) per
+# batch instead of one per submission.
+WRITE_BUFFER_ENABLED = os.getenv("WRITE_BUFFER_ENABLED", "false").lower() == "true"
+WRITE_BUFFER_MAX_DELAY_MS = float(os.getenv("WRITE_BUFFER_MAX_DELAY_MS", "5"))
+WRITE_BUFFER_MAX_ROWS = int(os.getenv("WRITE_BUFFER_MAX_ROWS", "100"))
+WRITE_BUFFER_REPORT_SECONDS = float(os.getenv("WRITE_BUFFER_REPORT_SECONDS", "60"))
+
+
+class _PendingRow:
+    __slots__ = ("table", "values", "future", "queued_at")
+
+    def __init__(self, table, values: Dict[str, Any], future: asyncio.Future):
+        self.table = table
+        self.values = values
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class WriteBufferStats:
+    """Commit throughput and added latency, cumulative plus the current report window"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.rows = 0
+        self.commits = 0
+        self.failed_rows = 0
+        self.commit_seconds = 0.0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self._window_max_latency = 0.0
+        self._window = (time.time(), 0, 0, 0.0)
+
+    def record(self, rows: int, commit_seconds: float, latencies: List[float]):
+        self.rows += rows
+        self.commits += 1
+        self.commit_seconds += commit_seconds
+        self.latency_seconds += sum(latencies)
+        self.max_latency_seconds = max(self.max_latency_seconds, max(latencies))
+        self._window_max_latency = max(self._window_max_latency, max(latencies))
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {
+            "rows": self.rows,
+            "commits": self.commits,
+            "failed_rows": self.failed_rows,
+            "commits_per_second": round(self.commits / elapsed, 2),
+            "rows_per_commit": round(self.rows / self.commits, 2) if self.commits else None,
+            "avg_commit_ms": round(self.commit_seconds / self.commits * 1000, 2) if self.commits else None,
+            "avg_added_latency_ms": round(self.latency_seconds / self.rows * 1000, 2) if self.rows else None,
+            "max_added_latency_ms": round(self.max_latency_seconds * 1000, 2),
+        }
+
+    def report(self):
+        """Log the throughput since the previous report"""
+        window_start, rows, commits, latency = self._window
+        now = time.time()
+        self._window = (now, self.rows, self.commits, self.latency_seconds)
+        rows, commits, latency = self.rows - rows, self.commits - commits, self.latency_seconds - latency
+        if not commits:
+            return
+        logger.info(
+            "Write buffer: %d rows in %d commits (%.2f commits/s, %.1f rows/commit), "
+            "added latency avg %.1f ms, max %.1f ms",
+            rows, commits, commits / max(now - window_start, 1e-9), rows / commits,
+            latency / rows * 1000, self._window_max_latency * 1000,
+        )
+        self._window_max_latency = 0.0
+
+
+class WriteBuffer:
+    """Batch single-row inserts from concurrent requests into one transaction per flush.
+
+    A flush starts WRITE_BUFFER_MAX_DELAY_MS after the first queued row, or as soon as
+    WRITE_BUFFER_MAX_ROWS are queued. Rows that arrive while a flush is running wait
+    for the next one, so batches grow with the commit latency. Each caller gets its
+    row's primary key once the batch has committed.
+    """
+
+    def __init__(self, engine, max_delay_ms: float, max_rows: int, report_seconds: float):
+        self.engine = engine
+        self.max_delay_seconds = max_delay_ms / 1000
+        self.max_rows = max_rows
+        self.report_seconds = report_seconds
+        self.stats = WriteBufferStats()
+        self._pending: List[_PendingRow] = []
+        self._has_rows = asyncio.Event()
+        self._full = asyncio.Event()
+        self._stopping = False
+        self._task = None
+        self._report_task = None
+        self._id_step: Optional[int] = None
+
+    async def insert(self, model, values: Dict[str, Any]) -> int:
+        """Queue one row for `model` and return its primary key after the batch commits"""
+        if self._task is None or self._stopping:
+            raise RuntimeError("Write buffer is not running")
+        row = _PendingRow(model.__table__, values, asyncio.get_running_loop().create_future())
+        self._pending.append(row)
+        self._has_rows.set()
+        if len(self._pending) >= self.max_rows:
+            self._full.set()
+        return await row.future
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        if self.report_seconds > 0:
+            self._report_task = asyncio.create_task(self._report())
+
+    async def stop(self):
+        """Refuse new rows, then write everything still queued"""
+        self._stopping = True
+        self._has_rows.set()
+        self._full.set()
+        if self._task:
+            await self._task
+            self._task = None
+        if self._report_task:
+            self._report_task.cancel()
+            self._report_task = None
+        self.stats.report()
+
+    async def _run(self):
+        while True:
+            await self._has_rows.wait()
+            if not self._stopping:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush()
+            if self._stopping and not self._pending:
+                return
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            self.stats.report()
+
+    async def _flush(self):
+        rows, self._pending = self._pending, []
+        self._has_rows.clear()
+        self._full.clear()
+        if not rows:
+            return
+
+        started = time.perf_counter()
+        try:
+            with span("db.write_buffer.flush", rows=len(rows)):
+                ids = await asyncio.to_thread(self._write, rows)
+        except Exception as e:
+            logger.warning("Write buffer batch of %d rows failed, retrying row by row: %s", len(rows), e)
+            await self._flush_one_by_one(rows)
+            return
+
+        done = time.perf_counter()
+        self.stats.record(len(rows), done - started, [done - row.queued_at for row in rows])
+        for row, row_id in zip(rows, ids):
+            if not row.future.done():
+                row.future.set_result(row_id)
+
+    async def _flush_one_by_one(self, rows: List[_PendingRow]):
+        # A bad row (e.g. a constraint violation) fails only its own caller
+        for row in rows:
+            started = time.perf_counter()
+            try:
+                (row_id,) = await asyncio.to_thread(self._write, [row])
+            except Exception as e:
+                self.stats.failed_rows += 1
+                if not row.future.done():
+                    row.future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            self.stats.record(1, done - started, [done - row.queued_at])
+            if not row.future.done():
+                row.future.set_result(row_id)
+
+    def _write(self, rows: List[_PendingRow]) -> List[int]:
+        """Insert the rows in one transaction; returns their primary keys in order"""
+        by_table: Dict[Any, List[int]] = {}
+        for index, row in enumerate(rows):
+            by_table.setdefault(row.table, []).append(index)
+
+        ids: List[int] = [0] * len(rows)
+        with self.engine.begin() as conn:
+            for table, indexes in by_table.items():
+                for start in range(0, len(indexes), self.max_rows):
+                    chunk = indexes[start:start + self.max_rows]
+                    chunk_ids = self._insert_many(conn, table, [rows[i].values for i in chunk])
+                    for i, row_id in zip(chunk, chunk_ids):
+                        ids[i] = row_id
+        return ids
+
+    def _insert_many(self, conn, table, values: List[Dict[str, Any]]) -> List[int]:
+        pk = table.primary_key.columns[0]
+        if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+            # SQLite / MariaDB / PostgreSQL: multi-row INSERT ... RETURNING in parameter order
+            result = conn.execute(insert(table).returning(pk, sort_by_parameter_order=True), values)
+            return list(result.scalars())
+
+        # MySQL: one multi-row INSERT. InnoDB reserves the auto-increment values of a
+        # simple insert as one block, and lastrowid is the first row's id.
+        if self._id_step is None:
+            self._id_step = int(conn.execute(text("SELECT @@auto_increment_increment")).scalar())
+        first_id = conn.execute(insert(table).values(values)).lastrowid
+        return [first_id + i * self._id_step for i in range(len(values))]
+
+
+write_buffer = None
+
+
+async def start_write_buffer(engine):
+    """Start the group-commit buffer when WRITE_BUFFER_ENABLED is set"""
+    global write_buffer
+    if WRITE_BUFFER_ENABLED:
+        write_buffer = WriteBuffer(engine, WRITE_BUFFER_MAX_DELAY_MS, WRITE_BUFFER_MAX_ROWS,
+                                   WRITE_BUFFER_REPORT_SECONDS)
+        await write_buffer.start()
+
+
+async def stop_write_buffer():
+    """Write out any queued rows on shutdown"""
+    global write_buffer
+    if write_buffer:
+        buffer, write_buffer = write_buffer, None
+        await buffer.stop()
+
+
+def get_write_buffer():
+    return write_buffer